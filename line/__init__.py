@@ -6,6 +6,9 @@ __email__ = 'brendan@brendanshillingford.com'
 __version__ = '0.1.0'
 
 from .line import LineException, LineClient, LineMessage, LineConversation
+from .clientpool import LineClientPool
+from .templates import MessageTemplate
 
-__all__ = ['LineException', 'LineClient', 'LineMessage', 'LineConversation']
+__all__ = ['LineException', 'LineClient', 'LineMessage', 'LineConversation',
+           'LineClientPool', 'MessageTemplate']
 
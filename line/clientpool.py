@@ -0,0 +1,346 @@
+from threading import Thread, Lock, Event
+import heapq
+import logging
+import time
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from thrift.transport import TTransport
+
+from .downloads import HttpPool
+from .futures import Future
+from .line import LineClient, LineException
+
+
+logger = logging.getLogger('LineClient')
+
+
+class _Account(object):
+    def __init__(self, email, password):
+        self.email = email
+        self.password = password
+        self.future = Future()
+        self.client = None
+        self.state = 'pending'
+        self.polls = 0
+        self.events = 0
+        self.last_poll = None  # time the last long-poll completed
+        self.error = None
+        self.failures = 0  # consecutive long-poll errors
+        self.retry_at = None  # not polled again before this time
+
+
+class PooledHttpTransport(TTransport.TTransportBase):
+    """
+    Thrift transport POSTing each request over a keep-alive connection
+    borrowed from an HttpPool, so that the clients of many accounts share
+    connections. Each request carries its own transport's headers.
+
+    THttpClient instead opens a new connection for every request.
+    """
+
+    def __init__(self, uri, pool):
+        self._uri = uri
+        self._pool = pool
+        self._headers = {}
+        self._request = []
+        self._reply = TTransport.TMemoryBuffer(b'')
+
+    def setCustomHeaders(self, headers):
+        self._headers = dict(headers)
+
+    def isOpen(self):
+        return True
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def read(self, sz):
+        return self._reply.read(sz)
+
+    def write(self, buf):
+        self._request.append(buf)
+
+    def flush(self):
+        body = b''.join(self._request)
+        self._request = []
+        headers = {'Content-Type': 'application/x-thrift',
+                   'Content-Length': str(len(body)),
+                   'User-Agent': 'Python/THttpClient'}
+        headers.update(self._headers)
+        with self._pool.request(self._uri, headers, 'POST', body) as response:
+            self._reply = TTransport.TMemoryBuffer(response.read())
+
+
+class LineClientPool(object):
+    """
+    Runs many accounts in one process.
+
+    Logins (each including the initial contact sync) are staggered by
+    login_interval seconds on a single thread. Logged in accounts wait in a
+    shared queue; each polling thread takes the next account, runs one
+    long_poll for it, dispatches the events and puts the account back. An
+    account is only ever polled by one thread at a time.
+
+    Long-polls are not multiplexed: long_poll blocks its thread until the
+    server has operations for the account or the long-poll times out, so
+    every account polled at once needs a thread of its own, and by default
+    there is one polling thread per account. With a fixed number of
+    threads, fewer than the accounts, accounts take turns: each waits for
+    about (accounts / poll_threads) long-poll timeouts between polls, and
+    its events are delayed as long (see stats()).
+
+    An account whose long-poll fails (e.g. with a network error) is retried
+    after POLL_BACKOFF seconds, doubling with every further failure up to
+    POLL_BACKOFF_MAX; meanwhile the polling threads serve other accounts.
+
+    The accounts' requests share one pool of keep-alive connections.
+
+    Events are passed to handler(client, event) on the polling thread if a
+    handler is given, otherwise queued for events().
+    """
+
+    # delay before polling an account again after a failed long-poll, in
+    # seconds; doubled with each consecutive failure, up to the maximum
+    POLL_BACKOFF = 1.0
+    POLL_BACKOFF_MAX = 60.0
+
+    # put on the ready queue to wake a waiting polling thread
+    _WAKE = object()
+
+    def __init__(self, poll_threads=None, login_interval=1.0, handler=None,
+                 max_queued_events=10000, client_type=None, connections=16,
+                 transport_factory=None):
+        """
+        poll_threads is the number of polling threads, or None for one per
+        account.
+
+        client_type is the class constructed as client_type(email, password,
+        transport_factory=...) for each account; LineClient by default.
+        Unless transport_factory is given, every account's transports are
+        PooledHttpTransports over one HttpPool keeping up to `connections`
+        idle connections.
+        """
+        self._client_type = client_type or LineClient
+        self._poll_threads = poll_threads
+        self._login_interval = login_interval
+        self._handler = handler
+        self._http = HttpPool(connections, timeout=None)
+        self._transport_factory = transport_factory or \
+            (lambda uri: PooledHttpTransport(uri, self._http))
+
+        self._accounts = []
+        self._mutex = Lock()  # for _accounts and _threads
+        self._logins = queue.Queue()
+        self._ready = queue.Queue()
+        # heap of (retry_at, n, account) backing off after errors, under
+        # _mutex; n keeps accounts out of the comparison
+        self._delayed = []
+        self._delayed_count = 0
+        self._events = queue.Queue(max_queued_events)
+        self._stopping = Event()
+        self._threads = []
+        self._started = False
+
+    def add_account(self, email, password):
+        """
+        Schedules an account to be logged in and polled. Returns a Future
+        for its LineClient, completed once it has logged in.
+        """
+        account = _Account(email, password)
+        with self._mutex:
+            self._accounts.append(account)
+            if self._started and self._poll_threads is None:
+                self._start_thread(self._poll_loop)
+        self._logins.put(account)
+        return account.future
+
+    def _start_thread(self, target):
+        # must hold self._mutex
+        thread = Thread(target=target,
+                        name='LineClientPool-{}'.format(len(self._threads)))
+        thread.daemon = True
+        thread.start()
+        self._threads.append(thread)
+
+    def start(self):
+        """Starts the login thread and the polling threads."""
+        with self._mutex:
+            self._started = True
+            poll_threads = self._poll_threads
+            if poll_threads is None:
+                poll_threads = len(self._accounts)
+            self._start_thread(self._login_loop)
+            for i in range(poll_threads):
+                self._start_thread(self._poll_loop)
+
+    def stop(self, wait=True):
+        """
+        Stops logging in and polling. In-progress long-polls are not
+        interrupted; if wait is True, blocks until they return.
+        """
+        self._stopping.set()
+        with self._mutex:
+            self._started = False
+            threads = self._threads[:]
+        self._logins.put(None)
+        for i in range(len(threads) - 1):  # all but the login thread
+            self._ready.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+        self._events.put(None)
+
+    def join(self):
+        """Blocks until the pool's threads have exited, i.e. after stop()."""
+        with self._mutex:
+            threads = self._threads[:]
+        for thread in threads:
+            thread.join()
+
+    def events(self, timeout=None):
+        """
+        Yields (client, event) tuples from all accounts, where event is as
+        yielded by LineClient.long_poll. Stops after timeout seconds without
+        events, or once the pool is stopped and drained.
+        """
+        while True:
+            try:
+                item = self._events.get(timeout=timeout)
+            except queue.Empty:
+                return
+            if item is None:
+                return
+            yield item
+
+    @property
+    def clients(self):
+        with self._mutex:
+            return [a.client for a in self._accounts if a.client is not None]
+
+    def stats(self):
+        """
+        Returns a dict mapping each account's email to a dict with its state
+        ('pending', 'polling', 'waiting', 'backoff' or 'failed'), number of
+        polls and events, and lag: seconds since its last long-poll
+        completed, i.e. how long its new events may have waited for a
+        polling thread.
+        """
+        now = time.time()
+        with self._mutex:
+            accounts = self._accounts[:]
+
+        result = {}
+        for a in accounts:
+            lag = None
+            if a.state == 'polling':
+                lag = 0.0
+            elif a.last_poll is not None:
+                lag = now - a.last_poll
+            result[a.email] = {
+                'state': a.state,
+                'polls': a.polls,
+                'events': a.events,
+                'lag': lag,
+                'error': a.error,
+            }
+        return result
+
+    def _login_loop(self):
+        while not self._stopping.is_set():
+            account = self._logins.get()
+            if account is None:
+                break
+
+            try:
+                account.client = self._client_type(
+                    account.email, account.password,
+                    transport_factory=self._transport_factory)
+            except Exception as e:
+                logger.warning('login failed for %s: %s', account.email, e)
+                account.state = 'failed'
+                account.error = e
+                account.future.set_exception(e)
+            else:
+                account.state = 'waiting'
+                account.last_poll = time.time()
+                account.future.set_result(account.client)
+                self._ready.put(account)
+
+            self._stopping.wait(self._login_interval)
+
+    def _next_account(self):
+        """
+        Returns the next account to poll, or None once stopping, moving
+        accounts whose backoff has expired to the ready queue.
+        """
+        while True:
+            with self._mutex:
+                now = time.time()
+                delayed = self._delayed
+                while delayed and delayed[0][0] <= now:
+                    self._ready.put(heapq.heappop(delayed)[2])
+                timeout = delayed[0][0] - now if delayed else None
+            try:
+                account = self._ready.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            if account is not LineClientPool._WAKE:
+                return account
+
+    def _back_off(self, account):
+        account.failures += 1
+        delay = min(LineClientPool.POLL_BACKOFF_MAX,
+                    LineClientPool.POLL_BACKOFF *
+                    2 ** (account.failures - 1))
+        account.retry_at = time.time() + delay
+        account.state = 'backoff'
+        with self._mutex:
+            self._delayed_count += 1
+            heapq.heappush(self._delayed,
+                           (account.retry_at, self._delayed_count, account))
+        # an idle polling thread may be waiting without a timeout
+        self._ready.put(LineClientPool._WAKE)
+
+    def _poll_loop(self):
+        while not self._stopping.is_set():
+            account = self._next_account()
+            if account is None:
+                break
+
+            account.state = 'polling'
+            try:
+                for event in account.client.long_poll():
+                    account.events += 1
+                    if self._handler is None:
+                        self._events.put((account.client, event))
+                        continue
+                    try:
+                        self._handler(account.client, event)
+                    except Exception:
+                        logger.exception('exception in event handler')
+            except LineException as e:
+                logger.warning('polling failed for %s: %s', account.email, e)
+                account.state = 'failed'
+                account.error = e
+                continue
+            except Exception as e:
+                # e.g. a network error; retried after a backoff
+                logger.warning('long-poll error for %s: %s', account.email, e)
+                account.error = e
+                self._back_off(account)
+                continue
+            else:
+                account.polls += 1
+                account.last_poll = time.time()
+                account.failures = 0
+                account.retry_at = None
+
+            account.state = 'waiting'
+            self._ready.put(account)
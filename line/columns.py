@@ -0,0 +1,66 @@
+from array import array
+
+from .util import INT64, to_bytes
+
+
+class ColumnarHistory(object):
+    """
+    A conversation's messages stored column by column in typed arrays,
+    one row per message in the order they were added:
+
+      created_time  ms since epoch (int64, or double on Python 2)
+      sender        the sender's integer from the client's MidTable, or -1
+      content_type  Line.ContentType (int8)
+      text_offset   start of the UTF-8 text in the text buffer (int64)
+      text_length   length of the UTF-8 text, in bytes (int32)
+
+    The arrays support the buffer protocol, so they can be wrapped without
+    copying, e.g. numpy.frombuffer(columns['sender'], dtype='int32').
+
+    Not thread-safe by itself; LineConversation only uses it while holding
+    its lock.
+    """
+
+    COLUMNS = ('created_time', 'sender', 'content_type', 'text_offset',
+               'text_length')
+
+    def __init__(self):
+        self.created_time = array(INT64)
+        self.sender = array('i')
+        self.content_type = array('b')
+        self.text_offset = array(INT64)
+        self.text_length = array('i')
+        self.text = bytearray()
+
+    def __len__(self):
+        return len(self.created_time)
+
+    def append(self, message):
+        """Adds a row for a LineMessage."""
+        text = to_bytes(message._text or '')
+        self.created_time.append(message._createdTime or 0)
+        self.sender.append(-1 if message._sender is None else message._sender)
+        self.content_type.append(message._type or 0)
+        self.text_offset.append(len(self.text))
+        self.text_length.append(len(text))
+        self.text.extend(text)
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def text_at(self, row):
+        """Returns the text of a row."""
+        start = int(self.text_offset[row])
+        return bytes(self.text[start:start + self.text_length[row]]) \
+            .decode('utf-8')
+
+    def copy(self):
+        """
+        Returns a dict of column name -> copy of the array, plus 'text', a
+        copy of the UTF-8 text buffer.
+        """
+        columns = dict((name, getattr(self, name)[:])
+                       for name in ColumnarHistory.COLUMNS)
+        columns['text'] = bytearray(self.text)
+        return columns
@@ -0,0 +1,300 @@
+from threading import Thread, Lock
+from collections import OrderedDict
+from contextlib import contextmanager
+import hashlib
+import logging
+import os
+import socket
+import tempfile
+
+try:
+    import httplib
+except ImportError:
+    import http.client as httplib
+
+try:
+    from urlparse import urlsplit
+except ImportError:
+    from urllib.parse import urlsplit
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from .futures import Future
+
+
+logger = logging.getLogger('LineClient')
+
+
+class DownloadError(Exception):
+    """An HTTP download failed; status is the HTTP status code, if any."""
+
+    def __init__(self, url, status=None, reason=None):
+        Exception.__init__(self, '{} {} {}'.format(url, status or '',
+                                                   reason or '').strip())
+        self.url = url
+        self.status = status
+
+
+class HttpPool(object):
+    """
+    Keep-alive HTTP(S) connections shared between threads, keeping at most
+    `size` idle connections per host.
+    """
+
+    def __init__(self, size=4, timeout=30):
+        self._size = size
+        self._timeout = timeout
+        self._idle = {}  # (scheme, netloc) -> list of connections
+        self._lock = Lock()
+
+    def _connect(self, scheme, netloc):
+        if scheme == 'https':
+            return httplib.HTTPSConnection(netloc, timeout=self._timeout)
+        return httplib.HTTPConnection(netloc, timeout=self._timeout)
+
+    def _get(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._connect(*key), False
+
+    def _put(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self._size:
+                idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def request(self, url, headers=None, method='GET', body=None):
+        """
+        Context manager yielding the HTTPResponse for a request. The
+        connection goes back to the pool if the body was read completely,
+        and is closed otherwise.
+
+        If a reused connection turns out to have been closed by the server,
+        the request is retried once on a new connection. Requests with a
+        body are only retried if the server cannot have seen them.
+        """
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+
+        conn, reused = self._get(key)
+        sent = False
+        try:
+            conn.request(method, path, body, headers or {})
+            sent = True
+            response = conn.getresponse()
+        except (httplib.HTTPException, socket.error) as e:
+            conn.close()
+            # a closed idle connection fails while sending, or gets no
+            # status line at all
+            stale = not sent or isinstance(e, httplib.BadStatusLine)
+            if not reused or (body is not None and not stale):
+                raise
+            conn = self._connect(*key)
+            try:
+                conn.request(method, path, body, headers or {})
+                response = conn.getresponse()
+            except Exception:
+                conn.close()
+                raise
+
+        try:
+            yield response
+        finally:
+            # even if the caller raised, e.g. after reading an error body
+            if response.isclosed():
+                self._put(key, conn)
+            else:
+                conn.close()
+
+    def fetch(self, url, headers=None):
+        """Returns the body of a successful GET of url."""
+        with self.request(url, headers) as response:
+            body = response.read()
+            if response.status != 200:
+                raise DownloadError(url, response.status, response.reason)
+            return body
+
+
+class DiskCache(object):
+    """
+    Bounded on-disk LRU cache of downloaded files, safe to share between
+    threads and LineClients.
+
+    Each entry is a file in `directory` named by the SHA-1 of its key.
+    Once the files total more than max_bytes, the least recently used are
+    deleted. Entries found in the directory on startup are kept, ordered by
+    modification time.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._lock = Lock()
+        self._entries = OrderedDict()  # file name -> size, oldest first
+        self._bytes = 0
+        self._pending = {}  # file name -> Future of the path, if downloading
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        found = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if len(name) == 40 and os.path.isfile(path):
+                stat = os.stat(path)
+                found.append((stat.st_mtime, name, stat.st_size))
+        for mtime, name, size in sorted(found):
+            self._entries[name] = size
+            self._bytes += size
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def size(self):
+        """Total size of the cached files, in bytes."""
+        with self._lock:
+            return self._bytes
+
+    def _name(self, key):
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Returns the path of the cached file for key, or None."""
+        name = self._name(key)
+        with self._lock:
+            size = self._entries.pop(name, None)
+            if size is None:
+                return None
+            self._entries[name] = size  # now the most recently used
+        path = os.path.join(self._directory, name)
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return path
+
+    def put(self, key, write):
+        """
+        Stores a new entry for key, whose content is written by calling
+        write(f) with a file object, and returns its path.
+        """
+        name = self._name(key)
+        path = os.path.join(self._directory, name)
+        fd, tmp = tempfile.mkstemp(dir=self._directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            size = os.path.getsize(tmp)
+            if os.path.exists(path):
+                os.remove(path)  # os.rename doesn't replace on Windows
+            os.rename(tmp, path)
+        except Exception:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            self._bytes += size - self._entries.pop(name, 0)
+            self._entries[name] = size
+            evicted = []
+            while self._bytes > self._max_bytes and len(self._entries) > 1:
+                old, old_size = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                evicted.append(old)
+        for old in evicted:
+            try:
+                os.remove(os.path.join(self._directory, old))
+            except OSError:
+                pass
+        return path
+
+    def discard(self, key):
+        name = self._name(key)
+        with self._lock:
+            size = self._entries.pop(name, None)
+            if size is None:
+                return
+            self._bytes -= size
+        try:
+            os.remove(os.path.join(self._directory, name))
+        except OSError:
+            pass
+
+    def fetch(self, key, write):
+        """
+        Returns the path for key, calling put(key, write) first if it is not
+        cached. Concurrent fetches of the same key share one download.
+        """
+        path = self.get(key)
+        if path is not None:
+            return path
+
+        name = self._name(key)
+        with self._lock:
+            cached = name in self._entries  # added since get()
+            pending = self._pending.get(name)
+            if pending is None and not cached:
+                future = self._pending[name] = Future()
+        if cached:
+            return self.get(key)
+        if pending is not None:
+            return pending.result()
+
+        try:
+            path = self.put(key, write)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(path)
+            return path
+        finally:
+            with self._lock:
+                del self._pending[name]
+
+
+class WorkerPool(object):
+    """Runs functions on up to `size` daemon threads, started lazily."""
+
+    def __init__(self, size, name):
+        self._size = size
+        self._name = name
+        self._jobs = queue.Queue()
+        self._threads = []
+        self._lock = Lock()
+
+    def submit(self, fn, *args):
+        """Runs fn(*args) on a worker thread; returns a Future."""
+        with self._lock:
+            while len(self._threads) < self._size:
+                thread = Thread(target=self._worker, name='{}-{}'.format(
+                    self._name, len(self._threads)))
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+        future = Future()
+        self._jobs.put((fn, args, future))
+        return future
+
+    def _worker(self):
+        while True:
+            fn, args, future = self._jobs.get()
+            try:
+                result = fn(*args)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
@@ -0,0 +1,145 @@
+from threading import Thread, Lock, local
+from contextlib import contextmanager
+import logging
+import socket
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from thrift.transport.TTransport import TTransportException
+
+from .futures import Future
+
+
+logger = logging.getLogger('LineClient')
+
+
+class RequestExecutor(object):
+    """
+    Runs requests over a fixed number of independent Line.Client instances,
+    each with its own transport and protocol, since a THttpClient cannot be
+    shared between threads.
+
+    Each call checks out one client for its duration, so calls from
+    different threads run in parallel, up to the pool size. Calls nested on
+    a thread that already holds a client reuse it rather than waiting for
+    another one.
+
+    Requests are not pipelined over one connection: although the generated
+    clients write a seqid with every call, LINE's Thrift-over-HTTP endpoint
+    answers one message per POST (as THttpClient frames them), so several
+    calls can't share a request body. Bulk operations get their concurrency
+    from the pool instead, e.g. with submit_many().
+    """
+
+    def __init__(self, client_factory, size=4, initial=None):
+        """
+        client_factory() returns a new (transport, Line.Client) pair; it is
+        called lazily as clients are first needed or after a client's
+        connection failed. initial is an optional already constructed pair
+        to seed the pool with.
+        """
+        self._client_factory = client_factory
+        self._size = size
+        # LIFO, so that sequential calls keep reusing the most recently used
+        # connection, and further ones are only created under concurrency
+        self._idle = queue.LifoQueue()
+        self._local = local()
+
+        for i in range(size - 1):
+            self._idle.put(None)
+        self._idle.put(initial)
+
+        self._jobs = queue.Queue()
+        self._threads = []
+        self._threadmutex = Lock()
+
+    @property
+    def size(self):
+        return self._size
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager yielding a Line.Client for exclusive use by the
+        current thread, blocking while all clients are in use.
+        """
+        held = getattr(self._local, 'client', None)
+        if held is not None:
+            yield held
+            return
+
+        slot = self._idle.get()
+        try:
+            if slot is None:
+                slot = self._client_factory()
+            transport, client = slot
+
+            self._local.client = client
+            try:
+                yield client
+            except (TTransportException, EOFError, IOError, socket.error):
+                # the transport may be left mid-message; don't reuse it
+                slot = None
+                try:
+                    transport.close()
+                except Exception:
+                    pass
+                raise
+            finally:
+                self._local.client = None
+        finally:
+            self._idle.put(slot)
+
+    def call(self, method, *args):
+        """Calls the named Line.Client method on a checked out client."""
+        with self.connection() as client:
+            return getattr(client, method)(*args)
+
+    def submit(self, method, *args):
+        """
+        Like call(), but runs on one of the executor's own threads and
+        returns a Future for the result.
+        """
+        return self.submit_fn(lambda client: getattr(client, method)(*args))
+
+    def submit_many(self, method, args_list):
+        """
+        Submits a call of the named Line.Client method for each tuple of
+        arguments in args_list, e.g.
+            executor.submit_many('getRecentMessages',
+                                 [(group, 20) for group in groups])
+        and returns their Futures, in the same order. The calls run over up
+        to size connections at once.
+        """
+        return [self.submit(method, *args) for args in args_list]
+
+    def submit_fn(self, fn):
+        """Runs fn(client) on an executor thread; returns a Future."""
+        self._start_threads()
+        future = Future()
+        self._jobs.put((fn, future))
+        return future
+
+    def _start_threads(self):
+        with self._threadmutex:
+            while len(self._threads) < self._size:
+                thread = Thread(
+                    target=self._worker,
+                    name='LineExecutor-{}'.format(len(self._threads)))
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker(self):
+        while True:
+            fn, future = self._jobs.get()
+            try:
+                with self.connection() as client:
+                    result = fn(client)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
@@ -0,0 +1,271 @@
+from array import array
+import io
+import json
+import logging
+import os
+import sys
+
+from .columns import ColumnarHistory
+from .mids import MidTable
+from .util import INT64, id_key, to_bytes
+
+
+logger = logging.getLogger('LineClient')
+
+
+def _thrift(message):
+    """Returns a Line.Message for a Line.Message or LineMessage."""
+    to_thrift = getattr(message, '_to_thrift', None)
+    return message if to_thrift is None else to_thrift()
+
+
+def message_record(message):
+    """
+    Returns the JSON-serializable dict exported for a Line.Message or
+    LineMessage. Image previews are left out.
+    """
+    message = _thrift(message)
+    return {'id': message.id, 'from': message.frm, 'to': message.to,
+            'toType': message.toType, 'createdTime': message.createdTime,
+            'contentType': message.contentType, 'text': message.text,
+            'contentMetadata': message.contentMetadata}
+
+
+class _Exporter(object):
+    """
+    Base class of the exporters: writes messages, oldest first, into
+    numbered chunk files in a directory, and keeps a state file recording
+    the last message exported so that an interrupted export can resume.
+
+    Subclasses define _write(message), and close() to write out everything
+    exported so far.
+    """
+
+    SUFFIX = None
+
+    def __init__(self, directory, name='messages', chunk_size=10000):
+        self._directory = directory
+        self._name = name
+        self._chunk_size = chunk_size
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self._state = {'last_id': None, 'chunk': 0, 'offset': 0, 'rows': 0}
+        try:
+            with io.open(self._path('state'), 'rb') as f:
+                self._state.update(json.loads(f.read().decode('utf-8')))
+        except (IOError, OSError):
+            pass
+
+    def _path(self, kind):
+        if kind == 'state':
+            return os.path.join(self._directory, self._name + '.state.json')
+        return os.path.join(self._directory, '{}-{:06d}{}'.format(
+            self._name, self._state['chunk'], self.SUFFIX))
+
+    def _save_state(self):
+        path = self._path('state')
+        with io.open(path + '.tmp', 'wb') as f:
+            f.write(json.dumps(self._state).encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.remove(path)  # os.rename doesn't replace on Windows
+        os.rename(path + '.tmp', path)
+
+    @property
+    def last_id(self):
+        """ID of the last message exported, or None."""
+        return self._state['last_id']
+
+    def export(self, messages):
+        """
+        Writes the given messages (Line.Message or LineMessage, oldest
+        first), skipping any at or before last_id. Returns the number
+        written.
+        """
+        count = 0
+        for message in messages:
+            message_id = message.id
+            last_id = self._state['last_id']
+            if last_id is not None and \
+                    id_key(message_id) <= id_key(last_id):
+                continue
+            self._state['last_id'] = message_id
+            self._write(message)
+            count += 1
+        return count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+class JsonlExporter(_Exporter):
+    """
+    Exports messages as JSON lines (see message_record), up to chunk_size
+    per file ('<name>-000000.jsonl', ...).
+
+    Progress is checkpointed every checkpoint messages and on close(); on
+    resuming, anything written after the last checkpoint is truncated away
+    and exported again.
+    """
+
+    SUFFIX = '.jsonl'
+
+    def __init__(self, directory, name='messages', chunk_size=10000,
+                 checkpoint=1000):
+        _Exporter.__init__(self, directory, name, chunk_size)
+        self._checkpoint = checkpoint
+        self._since_checkpoint = 0
+        self._file = self._open()
+
+    def _open(self):
+        f = io.open(self._path('chunk'), 'ab')
+        f.seek(0, os.SEEK_END)
+        if f.tell() > self._state['offset']:
+            f.truncate(self._state['offset'])
+        return f
+
+    def _write(self, message):
+        line = json.dumps(message_record(message), sort_keys=True) + '\n'
+        self._file.write(line.encode('utf-8'))
+        self._state['rows'] += 1
+        self._since_checkpoint += 1
+
+        if self._state['rows'] >= self._chunk_size:
+            self._save()
+            self._file.close()
+            self._state.update(chunk=self._state['chunk'] + 1, offset=0,
+                               rows=0)
+            self._save_state()
+            self._file = self._open()
+        elif self._since_checkpoint >= self._checkpoint:
+            self._save()
+
+    def _save(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._state['offset'] = self._file.tell()
+        self._save_state()
+        self._since_checkpoint = 0
+
+    def close(self):
+        if self._file is not None:
+            self._save()
+            self._file.close()
+            self._file = None
+
+
+class ColumnarExporter(_Exporter):
+    """
+    Exports messages in columnar chunk files ('<name>-000000.cols', ...) of
+    up to chunk_size messages, each written whole once full (or on close()),
+    so memory use is bounded by one chunk.
+
+    A chunk is one line of JSON header, followed by the raw bytes of each
+    column array in the header's order. The header gives the row count,
+    byte order, the message IDs, the chunk's mids (indexed by the sender
+    and recipient columns, -1 for none) and each column's array typecode
+    and size in bytes. Columns are those of ColumnarHistory (with text
+    offsets relative to the chunk's text buffer), plus recipient and
+    to_type.
+    """
+
+    SUFFIX = '.cols'
+
+    def __init__(self, directory, name='messages', chunk_size=100000):
+        _Exporter.__init__(self, directory, name, chunk_size)
+        self._reset()
+
+    def _reset(self):
+        self._mids = MidTable()
+        self._ids = []
+        self._columns = dict(
+            created_time=array(INT64), sender=array('i'),
+            recipient=array('i'), to_type=array('b'),
+            content_type=array('b'), text_offset=array(INT64),
+            text_length=array('i'))
+        self._text = bytearray()
+
+    def _write(self, message):
+        message = _thrift(message)
+        text = to_bytes(message.text or '')
+        columns = self._columns
+        columns['created_time'].append(message.createdTime or 0)
+        for column, mid in (('sender', message.frm),
+                            ('recipient', message.to)):
+            columns[column].append(-1 if mid is None
+                                   else self._mids.intern(mid))
+        columns['to_type'].append(message.toType or 0)
+        columns['content_type'].append(message.contentType or 0)
+        columns['text_offset'].append(len(self._text))
+        columns['text_length'].append(len(text))
+        self._text.extend(text)
+        self._ids.append(message.id)
+
+        if len(self._ids) >= self._chunk_size:
+            self._flush_chunk()
+
+    def _flush_chunk(self):
+        if not self._ids:
+            return
+
+        names = list(ColumnarHistory.COLUMNS) + ['recipient', 'to_type']
+        arrays = [self._columns[name] for name in names]
+        header = {
+            'rows': len(self._ids),
+            'byteorder': sys.byteorder,
+            'ids': self._ids,
+            'mids': [self._mids.mid(i) for i in range(len(self._mids))],
+            'columns': [[name, a.typecode, len(a) * a.itemsize]
+                        for name, a in zip(names, arrays)] +
+                       [['text', 'B', len(self._text)]],
+        }
+
+        path = self._path('chunk')
+        with io.open(path + '.tmp', 'wb') as f:
+            f.write(json.dumps(header).encode('utf-8') + b'\n')
+            for a in arrays:
+                f.write(a.tobytes() if hasattr(a, 'tobytes')
+                        else a.tostring())
+            f.write(bytes(self._text))
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(path + '.tmp', path)
+
+        self._state.update(chunk=self._state['chunk'] + 1)
+        self._save_state()
+        self._reset()
+
+    def close(self):
+        self._flush_chunk()
+
+
+def read_columnar_chunk(path):
+    """
+    Reads a chunk written by ColumnarExporter; returns (header, columns),
+    columns being a dict of name -> array.array ('text' a bytearray).
+    """
+    with io.open(path, 'rb') as f:
+        header = json.loads(f.readline().decode('utf-8'))
+        columns = {}
+        for name, typecode, size in header['columns']:
+            data = f.read(size)
+            if name == 'text':
+                columns[name] = bytearray(data)
+                continue
+            a = array(typecode)
+            if hasattr(a, 'frombytes'):
+                a.frombytes(data)
+            else:
+                a.fromstring(data)
+            if header['byteorder'] != sys.byteorder:
+                a.byteswap()
+            columns[name] = a
+    return header, columns
@@ -0,0 +1,86 @@
+from threading import Condition, Lock
+import logging
+
+
+logger = logging.getLogger('LineClient')
+
+
+class FutureTimeoutError(Exception):
+    pass
+
+
+class Future(object):
+    """
+    Result of an operation that completes on another thread.
+
+    A small subset of concurrent.futures.Future, which is not available in
+    the Python 2 standard library.
+    """
+
+    def __init__(self):
+        self._cond = Condition(Lock())
+        self._done = False
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def done(self):
+        with self._cond:
+            return self._done
+
+    def _wait(self, timeout):
+        with self._cond:
+            if not self._done:
+                self._cond.wait(timeout)
+            if not self._done:
+                raise FutureTimeoutError()
+
+    def result(self, timeout=None):
+        """
+        Blocks until the operation completes and returns its result, or
+        raises the exception it failed with.
+
+        Raises FutureTimeoutError if timeout (in seconds) expires first.
+        """
+        self._wait(timeout)
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        """Blocks like result(), but returns the exception (or None)."""
+        self._wait(timeout)
+        return self._exception
+
+    def add_done_callback(self, fn):
+        """
+        Calls fn(future) once the future completes; immediately if it
+        already has.
+        """
+        with self._cond:
+            if not self._done:
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def set_result(self, result):
+        self._complete(result, None)
+
+    def set_exception(self, exception):
+        self._complete(None, exception)
+
+    def _complete(self, result, exception):
+        with self._cond:
+            if self._done:
+                raise RuntimeError('future already completed')
+            self._result = result
+            self._exception = exception
+            self._done = True
+            self._cond.notify_all()
+            callbacks, self._callbacks = self._callbacks, []
+
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception:
+                logger.exception('exception in future callback')
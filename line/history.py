@@ -0,0 +1,210 @@
+from .util import id_key
+
+
+class MessagesView(object):
+    """
+    Immutable, newest-first sequence of LineMessages: a view of a
+    conversation's messages as they were at one version, made without
+    copying them.
+
+    Supports len(), iteration and indexing (slices return lists). version
+    is the conversation version the view was taken at; see
+    LineConversation.messages_since.
+    """
+
+    __slots__ = ('_newer', '_newer_start', '_newer_end',
+                 '_older', '_older_start', '_older_end', 'version')
+
+    def __init__(self, newer, newer_start, newer_end,
+                 older, older_start, older_end, version):
+        self._newer = newer
+        self._newer_start = newer_start
+        self._newer_end = newer_end
+        self._older = older
+        self._older_start = older_start
+        self._older_end = older_end
+        self.version = version
+
+    def __len__(self):
+        return (self._newer_end - self._newer_start +
+                self._older_end - self._older_start)
+
+    def __iter__(self):
+        newer = self._newer
+        for i in range(self._newer_end - 1, self._newer_start - 1, -1):
+            yield newer[i]
+        older = self._older
+        for i in range(self._older_start, self._older_end):
+            yield older[i]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('MessagesView index out of range')
+        newer_count = self._newer_end - self._newer_start
+        if index < newer_count:
+            return self._newer[self._newer_end - 1 - index]
+        return self._older[self._older_start + index - newer_count]
+
+    def __bool__(self):
+        return len(self) > 0
+
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        return '<MessagesView of {} messages, version {}>'.format(
+            len(self), self.version)
+
+
+class MessageStore(object):
+    """
+    A conversation's messages, newest first, kept in two append-only lists:
+    messages newer than any before (in the order received), and messages
+    older than any before (e.g. from backfills). Since neither list is ever
+    modified in place, views of them stay valid without copying.
+
+    A message arriving out of order, between stored ones, is inserted in
+    its place by ID into a copy of the list it belongs in, which then
+    replaces it, and recorded in a log of such insertions so that since()
+    still reports it. This is rare: it happens when a message sent from
+    this client is stored before one received just earlier.
+
+    The version identifies the store's contents: an opaque integer that
+    increases with every message added.
+
+    Made for one writer at a time and any number of readers: only the
+    methods that add messages need to be serialized (LineConversation calls
+    them holding its lock). Readers take no lock; they see each list as a
+    prefix of what it will be, and an insertion replaces the lists in a
+    single assignment, so a reader sees either the old or the new ones.
+    """
+
+    def __init__(self):
+        # (newer, older, inserted), replaced as a whole by insert();
+        # inserted is a list of (into newer, index, message)
+        self._lists = ([], [], [])
+
+    @staticmethod
+    def _version(inserted_count, newer_count, older_count):
+        return (inserted_count << 64) | (newer_count << 32) | older_count
+
+    @property
+    def version(self):
+        newer, older, inserted = self._lists
+        return MessageStore._version(len(inserted), len(newer), len(older))
+
+    def __len__(self):
+        newer, older, inserted = self._lists
+        return len(newer) + len(older)
+
+    def newest(self):
+        newer, older, inserted = self._lists
+        newer_count = len(newer)
+        if newer_count:
+            return newer[newer_count - 1]
+        return older[0] if older else None
+
+    def oldest(self):
+        newer, older, inserted = self._lists
+        older_count = len(older)
+        if older_count:
+            return older[older_count - 1]
+        return newer[0] if newer else None
+
+    def add_newer(self, messages):
+        """Adds messages (oldest first) newer than every stored one."""
+        self._lists[0].extend(messages)
+
+    def add_older(self, messages):
+        """Adds messages (most recent first) older than every stored one."""
+        self._lists[1].extend(messages)
+
+    def insert(self, message):
+        """
+        Adds a message in its place by ID, wherever that is. Returns False,
+        adding nothing, if a message with the same ID is already stored.
+        """
+        newer, older, inserted = self._lists
+        key = id_key(message.id)
+
+        # newer is sorted oldest first, older most recent first
+        low, high = 0, len(newer)
+        while low < high:
+            middle = (low + high) // 2
+            if id_key(newer[middle].id) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(newer) and newer[low].id == message.id:
+            return False
+        if low > 0 or not older:
+            self._lists = (newer[:low] + [message] + newer[low:], older,
+                           inserted + [(True, low, message)])
+            return True
+
+        low, high = 0, len(older)
+        while low < high:
+            middle = (low + high) // 2
+            if id_key(older[middle].id) > key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(older) and older[low].id == message.id:
+            return False
+        self._lists = (newer, older[:low] + [message] + older[low:],
+                       inserted + [(False, low, message)])
+        return True
+
+    def view(self, n=-1):
+        """
+        Returns a MessagesView of the newest n messages, or of all of them
+        if n <= 0.
+        """
+        newer, older, inserted = self._lists
+        # counts are read once; anything appended afterwards isn't seen
+        newer_end = len(newer)
+        older_end = len(older)
+        version = MessageStore._version(len(inserted), newer_end, older_end)
+        newer_start = 0
+        if n > 0:
+            newer_start = max(0, newer_end - n)
+            older_end = min(older_end, n - (newer_end - newer_start))
+        return MessagesView(newer, newer_start, newer_end,
+                            older, 0, older_end, version)
+
+    def since(self, version):
+        """
+        Returns a MessagesView of the messages added after the given
+        version, most recent first.
+        """
+        newer, older, inserted = self._lists
+        newer_end = len(newer)
+        older_end = len(older)
+        current = MessageStore._version(len(inserted), newer_end, older_end)
+
+        # the messages added at the ends are those past the counts at that
+        # version, once shifted by the insertions before them since
+        newer_start = (version >> 32) & 0xffffffff
+        older_start = version & 0xffffffff
+        between = []
+        for into_newer, index, message in inserted[version >> 64:]:
+            if into_newer:
+                if index < newer_start:
+                    newer_start += 1
+                    between.append(message)
+            elif index < older_start:
+                older_start += 1
+                between.append(message)
+
+        view = MessagesView(newer, newer_start, newer_end,
+                            older, older_start, older_end, current)
+        if not between:
+            return view
+        # all between the newer and the older messages added
+        between.sort(key=lambda message: id_key(message.id), reverse=True)
+        newer_count = newer_end - newer_start
+        messages = view[:newer_count] + between + view[newer_count:]
+        return MessagesView([], 0, 0, messages, 0, len(messages), current)
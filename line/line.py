@@ -1,6 +1,9 @@
-from threading import Thread, Lock
+from threading import Thread, Timer, Lock, BoundedSemaphore
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
 import logging
+import time
 
 from thrift.transport import TTransport
 from thrift.transport import TSocket
@@ -9,6 +12,21 @@ from thrift.protocol import TCompactProtocol
 from linethrift import Line
 from linethrift.ttypes import *
 
+from .executor import RequestExecutor
+from .metrics import MetricsRegistry, MeteredTransport, NULL_METRICS
+from .tracing import TracedClient, RpcMetricsInterceptor
+from .profiling import StageProfiler, ProfilingInterceptor, NULL_PROFILER
+from .outbound import OutboundScheduler, BroadcastResult
+from .templates import MessageTemplate
+from .util import id_key, is_later
+from .mids import MidTable
+from .columns import ColumnarHistory
+from .history import MessageStore
+from .pictures import default_pictures
+from .stickers import Sticker, default_stickers
+from .downloads import HttpPool, WorkerPool
+from .futures import Future, FutureTimeoutError
+from . import media
 
 logger = logging.getLogger('LineClient')
 
@@ -17,11 +35,40 @@ class LineException(Exception):
     pass
 
 
+def _summarize_op(op, limit):
+    """
+    Describes an operation for logging in at most limit characters, without
+    the recursive repr of its message (which includes image previews).
+    """
+    parts = ['revision={}'.format(op.revision),
+             Line.OperationType._VALUES_TO_NAMES.get(op.type, '<unknown>')]
+    for name in ('param1', 'param2', 'param3'):
+        value = getattr(op, name)
+        if value is not None:
+            parts.append('{}={!r}'.format(name, value[:limit]))
+    msg = op.message
+    if msg is not None:
+        parts.append(
+            'message(id={}, frm={}, to={}, contentType={}, text={} chars)'
+            .format(msg.id, msg.frm, msg.to, msg.contentType,
+                    len(msg.text or '')))
+
+    summary = ' '.join(parts)
+    if len(summary) > limit:
+        summary = summary[:limit] + '...'
+    return summary
+
+
 class LineMessage:
     """Wraps an underlying message and provides additional operations."""
 
     TYPE_TEXT = 0
     TYPE_IMAGE = 1
+    TYPE_VIDEO = 2
+    TYPE_AUDIO = 3
+    TYPE_STICKER = 7
+
+    MEDIA_TYPES = (TYPE_IMAGE, TYPE_VIDEO, TYPE_AUDIO)
 
     def __init__(self, client, message):
         self._client = client
@@ -29,8 +76,12 @@ class LineMessage:
         self._text = message.text
         self._id = message.id
         self._contentPreview = message.contentPreview
-        self._sender = message.frm
-        self._recipient = message.to
+        self._contentMetadata = message.contentMetadata
+        # mids are kept as integers from the client's MidTable
+        self._sender = client._mids.intern(message.frm)
+        self._recipient = client._mids.intern(message.to)
+        self._toType = message.toType
+        self._createdTime = message.createdTime  # ms since epoch
         self._sendTime = datetime.fromtimestamp(
             message.createdTime / 1000)  # local time
 
@@ -44,11 +95,19 @@ class LineMessage:
 
     @property
     def sender(self):
-        return self._client.mid_to_contact(self._sender)
+        return self._client.mid_to_contact(self.sender_mid)
 
     @property
     def recipient(self):
-        return self._client.mid_to_contact(self._recipient)
+        return self._client.mid_to_contact(self.recipient_mid)
+
+    @property
+    def sender_mid(self):
+        return self._client._mids.mid(self._sender)
+
+    @property
+    def recipient_mid(self):
+        return self._client._mids.mid(self._recipient)
 
     @property
     def text(self):
@@ -66,13 +125,87 @@ class LineMessage:
 
         return self._contentPreview
 
+    @property
+    def sticker(self):
+        """
+        The Sticker (package_id, sticker_id, version) of a sticker message,
+        or None for other messages.
+        """
+        if self._type != LineMessage.TYPE_STICKER:
+            return None
+        return Sticker.from_metadata(self._contentMetadata)
+
+    def sticker_image(self):
+        """
+        Returns the PNG image data of a sticker message, through the
+        client's sticker cache (see LineClient.stickers).
+        """
+        sticker = self.sticker
+        if sticker is None:
+            raise LineException("This message is not a sticker.")
+        return self._client.stickers.image(sticker)
+
+    def sticker_path(self):
+        """Like sticker_image, but returns the path of the cached file."""
+        sticker = self.sticker
+        if sticker is None:
+            raise LineException("This message is not a sticker.")
+        return self._client.stickers.path(sticker)
+
+    def _media_url(self):
+        if self._type not in LineMessage.MEDIA_TYPES:
+            raise LineException("This message type does not contain media.")
+        return media.OBJECT_STORAGE_URL.format(self._id)
+
+    def iter_content(self, chunk_size=media.DEFAULT_CHUNK_SIZE):
+        """
+        Yields the full-resolution image, video or audio attached to this
+        message, in chunks of at most chunk_size bytes, without holding the
+        whole file in memory. Interrupted downloads are resumed.
+        """
+        return media.iter_content(self._client._media,
+                                  self._media_url(),
+                                  self._client._media_headers(), chunk_size)
+
+    def download(self, dest, chunk_size=media.DEFAULT_CHUNK_SIZE):
+        """
+        Streams the full-resolution image, video or audio attached to this
+        message to dest, a file object or a path. For a path, the file is
+        written as dest + '.part' and renamed when complete; a download
+        interrupted earlier is resumed from the .part file.
+
+        Returns dest.
+        """
+        return media.download(self._client._media, self._media_url(),
+                              dest, self._client._media_headers(),
+                              chunk_size)
+
+    def _to_thrift(self):
+        """Rebuilds a Line.Message from the fields kept by this wrapper."""
+        return Line.Message(frm=self.sender_mid, to=self.recipient_mid,
+                            toType=self._toType, id=self._id,
+                            createdTime=self._createdTime, text=self._text,
+                            contentType=self._type,
+                            contentPreview=self._contentPreview,
+                            contentMetadata=self._contentMetadata)
+
+    def _chat(self):
+        """The mid of the conversation this message belongs to."""
+        if self._toType in (ToType.GROUP, ToType.ROOM) or \
+                self.sender_mid == self._client._profile.mid:
+            return self.recipient_mid
+        return self.sender_mid
+
     def mark_read(self):
-        """Marks this message as read."""
-        pass  # TODO: implement
+        """
+        Marks this message, and all earlier ones in its conversation, as
+        read. See LineClient.mark_read.
+        """
+        self._client.mark_read(self._chat(), self)
 
     def __str__(self):
         return '<LineMessage (type={}) "{}", sender={}, recipient={}>'.format(
-            self._type, self._text, self._sender, self._recipient)
+            self._type, self._text, self.sender_mid, self.recipient_mid)
 
     __repr__ = __str__
 
@@ -81,41 +214,347 @@ class LineConversation:
     """
     Thread-safe wrapper class that contains a collection of LineMessage objects.
 
-    Updated in real-time by LineClient.
+    Updated in real-time by LineClient. Reading the messages and read state
+    takes no lock, so readers never hold up the thread running long_poll;
+    only changes are serialized.
     """
 
     def __init__(self, client, group):
         self._client = client
-        self._messages = []
+        self._store = MessageStore()
         self._group = group
-        self._lock = Lock()  # mutex for accessing _messages
+        self._lock = Lock()  # serializes changes to _store and read state
+        self._last_read = None  # ID of the latest message the user read
+        # mid -> ID of the latest message they read; replaced, not modified
+        self._read_by = {}
+        self._columns = None  # ColumnarHistory, if enabled
+        self._subscribers = ()  # replaced, not modified, under _lock
+        if LineClient.COLUMNAR_HISTORY:
+            self._columns = ColumnarHistory()
 
     @property
     def group(self):
         return self._group
 
+    def _insert_message(self, message):
+        # called with _lock held
+        store = self._store
+        newest = store.newest()
+        if newest is None or is_later(message.id, newest.id):
+            store.add_newer([message])
+        elif not store.insert(message):
+            # already stored, e.g. by an update() that fetched it first
+            return
+        if self._columns is not None:
+            self._columns.append(message)
+
+    def _split(self, messages):
+        """
+        Returns (start, end) such that messages[:start] (of a list most
+        recent first) are newer than the newest stored message, and
+        messages[end:] older than the oldest.
+        """
+        newest = self._store.newest()
+        oldest = self._store.oldest()
+        newest = newest.id if newest is not None else None
+        oldest = oldest.id if oldest is not None else None
+
+        # both runs are at the ends of the list, since it is sorted
+        start = 0
+        while start < len(messages) and \
+                is_later(messages[start].id, newest):
+            start += 1
+        end = len(messages)
+        if oldest is not None:
+            while end > start and is_later(oldest, messages[end - 1].id):
+                end -= 1
+        return start, end
+
+    def _merge(self, messages):
+        """
+        Merges Line.Messages from the server (most recent first) into the
+        stored ones: those newer than the newest stored message go in
+        front, and those older than the oldest at the end. Only those are
+        wrapped in LineMessages, so the cost is proportional to the number
+        of new messages. Returns the LineMessages added, most recent first.
+        """
+        start, end = self._split(messages)
+        client = self._client
+        wrapped = dict((message.id, LineMessage(client, message))
+                       for message in messages[:start] + messages[end:])
+        if not wrapped:
+            return []
+
+        with self._lock:
+            # long_poll may have added messages in the meantime, e.g. to a
+            # conversation that was empty, so the runs are found again
+            start, end = self._split(messages)
+            newer = [wrapped.get(message.id) or LineMessage(client, message)
+                     for message in messages[:start]]
+            older = [wrapped.get(message.id) or LineMessage(client, message)
+                     for message in messages[end:]]
+            store = self._store
+            store.add_newer(reversed(newer))
+            store.add_older(older)
+            if self._columns is not None:
+                self._columns.extend(reversed(newer))
+                self._columns.extend(older)
+        return newer + older
+
+    def backfill(self, page_size=50, limit=None):
+        """
+        Walks backwards through this conversation's history beyond the
+        stored messages, page_size messages per request, adding each page
+        to the stored messages without discarding any. Yields the list of
+        LineMessages added by each page, most recent first.
+
+        Stops at the start of the history, or once limit messages were
+        added. Requests count towards LineClient.BACKFILL_CONCURRENCY.
+        """
+        client = self._client
+        added_total = 0
+        while limit is None or added_total < limit:
+            count = page_size if limit is None \
+                else min(page_size, limit - added_total)
+            oldest = self._store.oldest()
+            if oldest is not None:
+                oldest = oldest.id
+
+            with client._backfill_slots:
+                if oldest is None:
+                    page = client._executor.call('getRecentMessages',
+                                                 self._group, count)
+                else:
+                    page = client._executor.call('getPreviousMessages',
+                                                 self._group, int(oldest),
+                                                 count)
+
+            added = self._merge(page)
+            added_total += len(added)
+            if added:
+                yield added
+            if len(page) < count or not added:
+                return
+
+    def enable_columns(self):
+        """
+        Starts keeping this conversation's history in columnar form as well
+        (see columns()), beginning with the messages already stored.
+        """
+        with self._lock:
+            if self._columns is None:
+                self._columns = ColumnarHistory()
+                self._columns.extend(reversed(list(self._store.view())))
+
+    def disable_columns(self):
+        with self._lock:
+            self._columns = None
+
+    def columns(self):
+        """
+        Returns this conversation's history as a dict of column name ->
+        array.array (see ColumnarHistory), one row per message, for
+        aggregating without building LineMessages, e.g.
+            collections.Counter(conversation.columns()['sender'])
+        The arrays are copies, made at C speed. Raises LineException unless
+        enable_columns() was called or LineClient.COLUMNAR_HISTORY is set.
+
+        Rows are in the order messages were stored, not sorted by time:
+        newly received messages are appended in order, but so are older
+        ones added by update() or backfill(), and messages received out of
+        order. Sort by created_time where the order matters.
+
+        Senders are integers from the client's mid table; see
+        LineClient.mid_for.
+        """
+        with self._lock:
+            if self._columns is None:
+                raise LineException("Columnar history is not enabled.")
+            return self._columns.copy()
+
     def last_messages(self, n=-1):
         """
         Returns the most recent n messages already stored locally, with 
         the most recent one first.
 
         If n <= 0, returns all messages.
+
+        The result is a MessagesView: an immutable sequence that is not
+        affected by messages added later, made without copying the stored
+        messages. Its version can be passed to messages_since().
         """
-        with self._lock:
-            if n <= 0:
-                return self._messages[:]
-            else:
-                return self._messages[:n]
+        return self._store.view(n)
+
+    def snapshot(self):
+        """
+        Returns an immutable view of all stored messages, most recent
+        first; see last_messages.
+        """
+        return self.last_messages()
+
+    @property
+    def version(self):
+        """
+        Opaque integer identifying the stored messages, which increases
+        whenever messages are added.
+        """
+        return self._store.version
+
+    def messages_since(self, version):
+        """
+        Returns a MessagesView of the messages stored after the given
+        version (from the version property or a MessagesView), most recent
+        first, so that pollers only see what changed.
+
+        Messages added by a backfill are older than those already returned,
+        so they come after any newly received ones.
+        """
+        return self._store.since(version)
+
+    @property
+    def last_read(self):
+        """ID of the latest message marked as read by the user, or None."""
+        return self._last_read
+
+    def unread_messages(self):
+        """
+        Returns the stored messages newer than the last one marked as read,
+        with the most recent one first.
+        """
+        last_read = self._last_read
+        unread = []
+        for message in self._store.view():
+            if not is_later(message.id, last_read):
+                break
+            unread.append(message)
+        return unread
+
+    def read_by(self, mid=None):
+        """
+        Returns the ID of the latest message read by the given mid, or a
+        dict of mid -> message ID for everyone who has sent a read receipt.
+        """
+        if mid is None:
+            return dict(self._read_by)
+        return self._read_by.get(mid)
+
+    def readers(self, message):
+        """Returns the mids known to have read the given LineMessage."""
+        key = id_key(message.id)
+        return [mid for mid, message_id in self._read_by.items()
+                if id_key(message_id) >= key]
+
+    def mark_read(self, message=None):
+        """
+        Marks the conversation as read up to the given LineMessage (or
+        message ID), or up to the latest stored message.
+        """
+        if message is None:
+            message = self._store.newest()
+            if message is None:
+                return
+        self._client.mark_read(self._group, message)
+
+    def export(self, exporter, page_size=200, stored=False):
+        """
+        Writes this conversation's history newer than exporter.last_id to
+        an exporter from the export module, oldest first, and returns how
+        many messages were written.
+
+        The history is paged from the server, page_size messages per
+        request, and exported as received rather than wrapped in
+        LineMessages. Pages are first walked backwards from the most recent
+        message until one reaches exporter.last_id (or the start of the
+        history), keeping only where each page ends; they are then fetched
+        again oldest first and written one at a time, so memory use is
+        bounded by one page. Requests count towards
+        LineClient.BACKFILL_CONCURRENCY.
+
+        If stored is True, exports the locally stored messages instead,
+        without making any requests.
+        """
+        if stored:
+            return exporter.export(reversed(self._store.view()))
+
+        client = self._client
+        last_id = exporter.last_id
+
+        def fetch(end_seq):
+            with client._backfill_slots:
+                if end_seq is None:
+                    return client._executor.call('getRecentMessages',
+                                                 self._group, page_size)
+                return client._executor.call('getPreviousMessages',
+                                             self._group, end_seq, page_size)
+
+        # end_seq of every page newer than the oldest one, most recent first;
+        # the most recent page is refetched by ID rather than as the recent
+        # messages, so that messages arriving meanwhile can't shift it
+        ends = []
+        page = fetch(None)
+        end_seq = int(page[0].id) + 1 if page else None
+        while len(page) >= page_size and is_later(page[-1].id, last_id):
+            ends.append(end_seq)
+            end_seq = int(page[-1].id)
+            page = fetch(end_seq)
+
+        count = exporter.export(reversed(page))
+        for end_seq in reversed(ends):
+            count += exporter.export(reversed(fetch(end_seq)))
+        return count
 
     def update(self, n):
         """
-        Discards the currently saved messages, downloads the 
-        most recent n messages.
+        Downloads the most recent n messages, and adds those not already
+        stored (see LineClient.update_conversation).
 
         Does not return anything.
         """
         self._client.update_conversation(self._group, n)
 
+    def subscribe(self, callback):
+        """
+        Calls callback(type, conversation, arg) for every event in this
+        conversation yielded by LineClient.long_poll (see there), on the
+        thread running long_poll, before the event is yielded. Exceptions
+        raised by the callback are logged and ignored.
+
+        Events are only passed to the subscribers of their conversation.
+        """
+        with self._lock:
+            self._subscribers = self._subscribers + (callback,)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers = tuple(s for s in self._subscribers
+                                      if s != callback)
+
+    def wait_for_message(self, predicate=None, timeout=None):
+        """
+        Blocks until long_poll, running on another thread, receives a
+        message in this conversation for which predicate(message) is true
+        (any message if predicate is None), and returns the LineMessage.
+
+        Raises futures.FutureTimeoutError if timeout (in seconds) expires
+        first, or whatever predicate raised.
+        """
+        future = Future()
+
+        def on_event(event_type, conversation, message):
+            if event_type != LineClient.EVENT_NEW_MESSAGE or future.done():
+                return
+            try:
+                if predicate is None or predicate(message):
+                    future.set_result(message)
+            except Exception as e:
+                future.set_exception(e)
+
+        self.subscribe(on_event)
+        try:
+            return future.result(timeout)
+        finally:
+            self.unsubscribe(on_event)
+
     def send_message(self, text):
         """
         Sends a textual message to this conversation, regardless of what type
@@ -124,6 +563,21 @@ class LineConversation:
         msg = Line.Message(to=self._group, text=text)
         self._client._send_message(self._group, msg)
 
+    def send_template(self, template):
+        """
+        Sends a MessageTemplate (see LineClient.message_template) to this
+        conversation.
+        """
+        self._client.send_template(self._group, template)
+
+    def send_message_async(self, text):
+        """
+        Queues a textual message (or a MessageTemplate) for this
+        conversation on the client's outbound scheduler, and returns a
+        Future for the sent message.
+        """
+        return self._client.send_message_async(self._group, text)
+
 
 class LineContact:
     """Wraps an underlying contact and provides additional operations."""
@@ -131,10 +585,12 @@ class LineContact:
     def __init__(self, client, contact):
         self._client = client
         self._contact = contact
-        self._mid = contact.mid
+        self._mid = client._mids.canonical(contact.mid)
         self._displayName = contact.displayName
         self._statusMessage = contact.statusMessage
-        self._picTmpPath = None  # temporary file path for profile picture
+        self._picturePath = contact.picturePath
+        self._pictureStatus = contact.pictureStatus
+        self._picTmpPath = None  # cached file path for profile picture
 
     @property
     def mid(self):
@@ -150,20 +606,30 @@ class LineContact:
 
     def send_message(self, text):
         msg = Line.Message(to=self._mid, text=text)
-        self._client._send_message(msg)
+        self._client._send_message(self._mid, msg)
+
+    def send_template(self, template):
+        self._client.send_template(self._mid, template)
+
+    def send_message_async(self, text):
+        return self._client.send_message_async(self._mid, text)
 
     def fetch_picture(self):
         """
-        Returns a local tmp file path for the profile picture, or None if
+        Returns a local file path for the profile picture, or None if
         there is no profile picture.
 
-        Lazily retrieved the first time this is called.
+        Lazily retrieved the first time this is called, into the client's
+        picture cache (see LineClient.pictures); later calls are cache hits
+        until the picture changes or is evicted.
         """
-        if self._picTmpPath is None:
-            pass  # TODO: fetch it via the client
-
+        self._picTmpPath = self._client.pictures.fetch(self)
         return self._picTmpPath
 
+    def fetch_picture_async(self):
+        """Like fetch_picture, but returns a Future for the path."""
+        return self._client.pictures.fetch_async(self)
+
     def __str__(self):
         return '<LineContact "{}" ({})>'.format(self._displayName, self._mid)
 
@@ -183,20 +649,103 @@ class LineClient:
 
     DEFAULT_INITIAL_HISTORY = 15
 
-    def __init__(self, email, password):
+    # with DEBUG logging, details of 1 in DEBUG_OP_SAMPLE unhandled
+    # operations are logged, each in at most DEBUG_OP_MAX_CHARS characters
+    DEBUG_OP_SAMPLE = 10
+    DEBUG_OP_MAX_CHARS = 300
+
+    # number of independent /S4 clients used for concurrent requests
+    S4_POOL_SIZE = 4
+
+    # outbound scheduler settings; rates are (tokens per second, burst size)
+    OUTBOUND_WORKERS = 2
+    OUTBOUND_QUEUE_SIZE = 1000
+    OUTBOUND_RATE = (5.0, 10)
+    OUTBOUND_DEST_RATE = (1.0, 5)
+
+    # number of plain text templates cached by message_template
+    TEMPLATE_CACHE_SIZE = 256
+
+    # seconds mark_read waits for further calls before sending receipts
+    RECEIPT_DELAY = 1.0
+
+    # profile picture cache shared by all clients in the process; None for
+    # a directory under the system's temporary directory
+    PICTURE_CACHE_DIR = None
+    PICTURE_CACHE_BYTES = 256 * 1024 * 1024
+
+    # sticker image cache shared by all clients in the process; None for a
+    # directory under the system's temporary directory
+    STICKER_CACHE_DIR = None
+    STICKER_CACHE_BYTES = 256 * 1024 * 1024
+    STICKER_MEMORY_BYTES = 16 * 1024 * 1024
+
+    # whether new conversations keep columnar history (see
+    # LineConversation.columns)
+    COLUMNAR_HISTORY = False
+
+    # maximum number of history pages fetched at once, across all backfills
+    BACKFILL_CONCURRENCY = 2
+
+    # keep-alive connections kept for media downloads
+    MEDIA_POOL_SIZE = 4
+
+    def __init__(self, email, password, transport_factory=None):
+        """
+        Logs in and fetches contacts.
+
+        transport_factory(uri) may be given to construct the transports
+        instead of THttpClient, e.g. to record or replay traffic (see the
+        replay module); the transports must support setCustomHeaders.
+        """
+        self._transport_factory = transport_factory or THttpClient.THttpClient
+        self._metrics = NULL_METRICS
+        self._rpc_metrics = RpcMetricsInterceptor(self)
+        self._interceptors = ()
+        # event type -> tuple of Futures from wait_for; replaced, not
+        # modified, under _waitmutex
+        self._waiters = {}
+        self._waitmutex = Lock()
+        self._profiler = NULL_PROFILER
+        self._rpc_profiling = ProfilingInterceptor(self)
+        self._op_log = None
+        self._unhandled_ops = 0
+        self._authToken = None
+        self._mids = MidTable()
+        self._outbound = None
+        self._outboundmutex = Lock()
+        self._templates = {}
+        self._templatemutex = Lock()
+        self._receipts = {}  # chat mid -> message ID to mark read up to
+        self._receipt_timer = None
+        self._receiptmutex = Lock()
+        self._pictures = None
+        self._stickers = None
+        self._media = HttpPool(LineClient.MEDIA_POOL_SIZE)
+        self._backfill_slots = BoundedSemaphore(
+            LineClient.BACKFILL_CONCURRENCY)
+        self._backfills = WorkerPool(LineClient.BACKFILL_CONCURRENCY,
+                                     'LineBackfill')
+
         self._s4trans, self._s4 = self._getclient("/S4")
         self._p4trans, self._p4 = self._getclient("/P4")
 
+        # group -> LineConversation; read without locking, so it is never
+        # modified: adding a conversation replaces it with an updated copy
         self._conversations = {}
-        self._convmutex = Lock()
+        self._convmutex = Lock()  # serializes adding conversations
 
         self._login(email, password)
 
+        # the login connection seeds the pool; _s4 is not used directly after
+        self._executor = RequestExecutor(lambda: self._getclient("/S4"),
+                                         LineClient.S4_POOL_SIZE,
+                                         initial=(self._s4trans, self._s4))
+
         try:
-            self._rev = self._s4.getLastOpRevision()
+            self._rev = self._executor.call('getLastOpRevision')
             self._mid_to_contacts = None
             self.update_contacts()
-            self._profile = self._s4.getProfile()
         except TalkException as e:
             if e.code == 8:
                 raise LineException("User logged in on another machine.")
@@ -208,6 +757,7 @@ class LineClient:
                 #self.background_thread.start()
 
     EVENT_NEW_MESSAGE = 0
+    EVENT_READ = 1
 
     def long_poll(self):
         """
@@ -221,14 +771,22 @@ class LineClient:
         the type.
 
         For a new message event, arg1 is the LineConversation, and arg2 is
-        the LineMessage. So far, no other events are implemented.
+        the LineMessage. For a read event, arg1 is the LineConversation and
+        arg2 the mid of the reader (the user's own, when read on another
+        device); LineConversation.read_by gives the message read up to.
+        Read events are only reported for conversations already stored.
+
+        Events are also passed to the subscribers of their conversation
+        (see LineConversation.subscribe) and to wait_for callers.
         """
-        OT = Line.OperationType
         p4 = self._p4
+        profiler = self._profiler
 
         logger.debug('began long-polling call')
         try:
-            ops = p4.fetchOperations(self._rev, 50)
+            with profiler.stage('long_poll'):
+                with profiler.stage('fetchOperations'):
+                    ops = p4.fetchOperations(self._rev, 50)
         except EOFError:
             # long-poll timeout
             return
@@ -238,39 +796,172 @@ class LineClient:
             else:
                 return
 
+        self._metrics.observe('line_longpoll_ops', len(ops))
+
+        # checked once per batch so that disabled logging costs nothing per op
+        debug = logger.isEnabledFor(logging.DEBUG)
+        op_log = self._op_log
+
         for op in ops:
+            if op_log is not None:
+                op_log.append((op.revision, op.type))
+
+            with profiler.stage('long_poll'):
+                event = self._handle_op(op, debug, len(ops))
+
+            if event is not None:
+                if event[1]._subscribers or self._waiters:
+                    with profiler.stage('subscribers'):
+                        self._dispatch(event)
+                if profiler.enabled:
+                    start = time.time()
+                    yield event
+                    profiler.record('handler', time.time() - start)
+                else:
+                    yield event
+
+            self._rev = max(op.revision, self._rev)
+
+    def _handle_op(self, op, debug, batch_size):
+        """
+        Applies one operation from long_poll to local state, and returns the
+        event to yield for it, or None.
+        """
+        OT = Line.OperationType
+
+        if debug:
             logger.debug('received operation (type %d, name %s)',
                          op.type,
                          OT._VALUES_TO_NAMES.get(op.type, "<unknown>"))
 
-            if op.type == OT.END_OF_OPERATION:
+        if op.type == OT.END_OF_OPERATION:
+            if debug:
                 logger.debug(
                     'processed operation sequence of length %d from long-poll',
-                    len(ops))
-            elif op.type == OT.SEND_MESSAGE:
-                # message sent
-                conv, message = self._add_to_conversation(op.message.to,
-                                                          op.message)
-                yield (LineClient.EVENT_NEW_MESSAGE,
-                       conv, message)
-            elif op.type == OT.RECEIVE_MESSAGE:
-                # message received
-                conv, message = self._add_to_conversation(op.message.frm,
-                                                          op.message)
-                yield (LineClient.EVENT_NEW_MESSAGE,
-                       conv, message)
-            elif op.type == OT.RECEIVE_MESSAGE_RECEIPT:
-                # TODO: handle this
-                logger.debug('unhandled: received a read receipt: %s',
-                             repr(op))
-            else:
+                    batch_size)
+        elif op.type in (OT.SEND_MESSAGE, OT.RECEIVE_MESSAGE):
+            # message sent or received; stored in its chat: the group or
+            # room, or the other user of a one-on-one chat
+            with self._profiler.stage('add_to_conversation'):
+                conv, message = self._add_to_conversation(None, op.message)
+            return (LineClient.EVENT_NEW_MESSAGE,
+                    conv, message)
+        elif op.type == OT.RECEIVE_MESSAGE_RECEIPT:
+            # one-on-one chat read by the other user: param1 is their mid,
+            # param2 the message ID
+            return self._apply_read(op.param1, op.param1, op.param2)
+        elif op.type == OT.NOTIFIED_READ_MESSAGE:
+            # param1 is the chat, param2 the reader, param3 the message ID
+            return self._apply_read(op.param1, op.param2, op.param3)
+        elif op.type == OT.SEND_CHAT_CHECKED:
+            # marked read by the user on another device
+            return self._apply_read(op.param1, self._profile.mid, op.param2)
+        else:
+            if debug and self._sample_unhandled():
                 logger.debug(
                     'unhandled/unknown operation (type %d, name %s): %s',
                     op.type,
                     OT._VALUES_TO_NAMES.get(op.type, "<unknown>"),
-                    repr(op))
+                    _summarize_op(op, LineClient.DEBUG_OP_MAX_CHARS))
 
-            self._rev = max(op.revision, self._rev)
+        return None
+
+    def _apply_read(self, group, reader, message_id):
+        """
+        Records that reader has read group up to message_id, and returns
+        the event to yield for it, or None if the conversation is unknown.
+        """
+        if not group or not message_id:
+            return None
+
+        conv = self._conversations.get(group)
+        if conv is None:
+            return None
+
+        with self._locked(conv._lock, 'conversation'):
+            if reader == self._profile.mid:
+                if is_later(message_id, conv._last_read):
+                    conv._last_read = message_id
+            elif is_later(message_id, conv._read_by.get(reader)):
+                read_by = dict(conv._read_by)
+                read_by[reader] = message_id
+                conv._read_by = read_by
+        return (LineClient.EVENT_READ, conv, reader)
+
+    def _dispatch(self, event):
+        """
+        Passes an event to the subscribers of its conversation and
+        completes the wait_for calls waiting for its type.
+        """
+        for callback in event[1]._subscribers:
+            try:
+                callback(*event)
+            except Exception:
+                logger.exception('exception in conversation subscriber')
+
+        if event[0] in self._waiters:
+            with self._waitmutex:
+                waiters = dict(self._waiters)
+                futures = waiters.pop(event[0], ())
+                self._waiters = waiters
+            for future in futures:
+                future.set_result(event)
+
+    def wait_for(self, event_type, timeout=None):
+        """
+        Blocks until long_poll, running on another thread, yields an event
+        of the given type (one of LineClient.EVENT_*), and returns it as
+        the (type, arg1, arg2) tuple that long_poll yields.
+
+        Raises futures.FutureTimeoutError if timeout (in seconds) expires
+        first.
+        """
+        future = Future()
+        with self._waitmutex:
+            waiters = dict(self._waiters)
+            waiters[event_type] = waiters.get(event_type, ()) + (future,)
+            self._waiters = waiters
+
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            with self._waitmutex:
+                futures = tuple(f for f in self._waiters.get(event_type, ())
+                                if f is not future)
+                waiters = dict(self._waiters)
+                if futures:
+                    waiters[event_type] = futures
+                else:
+                    waiters.pop(event_type, None)
+                self._waiters = waiters
+            if future.done():
+                # the event arrived just as the wait timed out
+                return future.result()
+            raise
+
+    def _sample_unhandled(self):
+        n = LineClient.DEBUG_OP_SAMPLE
+        self._unhandled_ops += 1
+        return n <= 1 or self._unhandled_ops % n == 1
+
+    def enable_op_log(self, maxlen=10000):
+        """
+        Starts recording a (revision, type) tuple for every operation
+        received by long_poll, keeping the most recent maxlen.
+        """
+        self._op_log = deque(maxlen=maxlen)
+
+    def disable_op_log(self):
+        self._op_log = None
+
+    @property
+    def op_log(self):
+        """
+        List of recorded (revision, type) tuples, oldest first, or None if
+        the operation log is disabled.
+        """
+        op_log = self._op_log
+        return None if op_log is None else list(op_log)
 
     _LINE_APP_ID = 'DESKTOPWIN\t3.2.1.83\tWINDOWS\t5.1.2600-XP-x64'
 
@@ -279,14 +970,15 @@ class LineClient:
         PORT = 443
         uri = "https://{}:{}{}".format(HOST, PORT, path)
 
-        transport = THttpClient.THttpClient(uri)
+        transport = self._transport_factory(uri)
         transport.setCustomHeaders(
             {
                 'X-Line-Application': LineClient._LINE_APP_ID,
-                'X-Line-Access': 'x'})
+                'X-Line-Access': self._authToken or 'x'})
 
-        protocol = TCompactProtocol.TCompactProtocol(transport)
-        client = Line.Client(protocol)
+        protocol = TCompactProtocol.TCompactProtocol(
+            MeteredTransport(transport, self, path))
+        client = TracedClient(protocol, owner=self)
         transport.open()
 
         logger.debug(
@@ -313,27 +1005,177 @@ class LineClient:
             raise LineException(
                 "Login returned error code {}".format(result.type))
 
+        self._authToken = result.authToken
         for transport in (self._s4trans, self._p4trans):
             transport.setCustomHeaders({
                 'X-Line-Application': LineClient._LINE_APP_ID,
                 'X-Line-Access': result.authToken})
 
+    @contextmanager
+    def _locked(self, lock, name):
+        """
+        Acquires lock, recording the wait when metrics or profiling are
+        enabled.
+        """
+        if self._metrics.enabled or self._profiler.enabled:
+            start = time.time()
+            lock.acquire()
+            waited = time.time() - start
+            self._metrics.observe('line_lock_wait_seconds', waited, lock=name)
+            self._profiler.record('wait:' + name, waited)
+        else:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            lock.release()
+
+    @property
+    def metrics(self):
+        """The MetricsRegistry in use, or None if metrics are disabled."""
+        return self._metrics if self._metrics.enabled else None
+
+    def enable_metrics(self, registry=None):
+        """
+        Starts recording RPC latencies, transport bytes, long-poll batch
+        sizes, conversation counts and lock waits into registry (a new
+        MetricsRegistry if None), which is returned. Several clients may
+        share one registry.
+
+        Can be called at any time; use disable_metrics() to stop.
+        """
+        if registry is None:
+            registry = MetricsRegistry()
+
+        registry.describe('line_rpc_seconds', 'histogram',
+                          'Duration of LINE RPCs by method and status.')
+        registry.describe('line_transport_bytes_in', 'counter',
+                          'Bytes read per transport.')
+        registry.describe('line_transport_bytes_out', 'counter',
+                          'Bytes written per transport.')
+        registry.describe('line_longpoll_ops', 'histogram',
+                          'Operations per fetchOperations batch.',
+                          buckets=(0, 1, 2, 5, 10, 20, 50))
+        registry.describe('line_conversations', 'gauge',
+                          'Conversations held locally.')
+        registry.describe('line_lock_wait_seconds', 'histogram',
+                          'Time spent waiting for conversation locks.',
+                          buckets=(0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0))
+        registry.set('line_conversations', len(self._conversations))
+
+        self._metrics = registry
+        if self._rpc_metrics not in self._interceptors:
+            self.add_interceptor(self._rpc_metrics)
+        return registry
+
+    def disable_metrics(self):
+        self.remove_interceptor(self._rpc_metrics)
+        self._metrics = NULL_METRICS
+
+    @property
+    def profiler(self):
+        """The StageProfiler in use, or None if profiling is disabled."""
+        return self._profiler if self._profiler.enabled else None
+
+    def enable_profiling(self, profiler=None):
+        """
+        Starts timing each stage of the ingest pipeline into profiler (a new
+        StageProfiler if None), which is returned: the fetchOperations call
+        (split into encode, network and decode), applying each operation
+        (building LineMessages, waiting for _convmutex and conversation
+        locks, fetching history), and the time the consumer of long_poll
+        spends handling each event.
+
+        Can be switched on and off at any time, e.g. from another thread.
+        """
+        if profiler is None:
+            profiler = StageProfiler()
+        self._profiler = profiler
+        if self._rpc_profiling not in self._interceptors:
+            self.add_interceptor(self._rpc_profiling)
+        return profiler
+
+    def disable_profiling(self):
+        self.remove_interceptor(self._rpc_profiling)
+        self._profiler = NULL_PROFILER
+
+    def add_interceptor(self, interceptor):
+        """
+        Adds a tracing.Interceptor to be called around every RPC made by this
+        client, on any of its connections. Takes effect immediately.
+        """
+        self._interceptors = self._interceptors + (interceptor,)
+
+    def remove_interceptor(self, interceptor):
+        self._interceptors = tuple(i for i in self._interceptors
+                                   if i is not interceptor)
+
+    @property
+    def pictures(self):
+        """
+        The ProfilePictures used by LineContact.fetch_picture; by default
+        one shared process-wide, using LineClient.PICTURE_CACHE_*.
+        """
+        if self._pictures is None:
+            self._pictures = default_pictures(LineClient.PICTURE_CACHE_DIR,
+                                              LineClient.PICTURE_CACHE_BYTES)
+        return self._pictures
+
+    def use_pictures(self, pictures):
+        """
+        Makes this client use the given ProfilePictures, e.g. one with its
+        own DiskCache.
+        """
+        self._pictures = pictures
+
+    @property
+    def stickers(self):
+        """
+        The StickerCache used by LineMessage.sticker_image; by default one
+        shared process-wide, using LineClient.STICKER_*.
+        """
+        if self._stickers is None:
+            self._stickers = default_stickers(LineClient.STICKER_CACHE_DIR,
+                                              LineClient.STICKER_CACHE_BYTES,
+                                              LineClient.STICKER_MEMORY_BYTES)
+        return self._stickers
+
+    def use_stickers(self, stickers):
+        """Makes this client use the given StickerCache."""
+        self._stickers = stickers
+
+    def _media_headers(self):
+        return {'X-Line-Application': LineClient._LINE_APP_ID,
+                'X-Line-Access': self._authToken}
+
+    def prefetch_pictures(self, contacts=None):
+        """
+        Starts downloading the profile pictures of the given LineContacts
+        (by default, all contacts) in the background. Returns a dict of
+        mid -> Future of the local path (None if the contact has no
+        picture).
+        """
+        if contacts is None:
+            contacts = self.contacts
+        return self.pictures.prefetch(contacts)
+
     def find_contact(self, name):
         return [contact for contact in self._mid_to_contacts.values() if
                 name.lower() in contact.display_name.lower()]
 
     def update_contacts(self):
-        contact_mids = self._s4.getAllContactIds()
-        contacts = self._s4.getContacts(contact_mids)
+        contact_mids = self._executor.call('getAllContactIds')
+        contacts = self._executor.call('getContacts', contact_mids)
         self._mid_to_contacts = dict(
-            [(contact.mid, LineContact(self, contact)) for contact in contacts])
+            (contact.mid, contact) for contact in
+            [LineContact(self, contact) for contact in contacts])
         logger.debug(
             "Updated contacts; now %d contacts excluding user's own profile",
             len(contacts))
 
-        self._profile = self._s4.getProfile()
-        self._mid_to_contacts[self._profile.mid] = LineContact(self,
-                                                               self._profile)
+        self._profile = self._executor.call('getProfile')
+        myself = LineContact(self, self._profile)
+        self._mid_to_contacts[myself.mid] = myself
 
     @property
     def myself(self):
@@ -349,60 +1191,321 @@ class LineClient:
     def mid_to_contact(self, mid):
         return self._mid_to_contacts[mid]
 
+    def mid_for(self, i):
+        """
+        Returns the mid for an integer in LineConversation.columns(), or
+        None for -1.
+        """
+        return None if i < 0 else self._mids.mid(i)
+
     def conversation(self, group):
         """
         Given a group ID or LineContact, retrieve the corresponding LineConversation.
         """
-        with self._convmutex:
-            if isinstance(group, LineContact):
-                group = group.mid
-            return self._conversations[group]
+        if isinstance(group, LineContact):
+            group = group.mid
+        return self._conversations[group]
+
+    def _new_conversation(self, group):
+        """
+        Adds a LineConversation for group unless another thread just did,
+        and returns (conversation, whether it was added).
+        """
+        with self._locked(self._convmutex, 'convmutex'):
+            conv = self._conversations.get(group)
+            if conv is not None:
+                return conv, False
+            group = self._mids.canonical(group)
+            conv = LineConversation(self, group)
+            # readers see either the old dict or the new one, never a
+            # partly updated one; conversations are added rarely enough
+            # that copying is cheap
+            conversations = dict(self._conversations)
+            conversations[group] = conv
+            self._conversations = conversations
+            self._metrics.set('line_conversations', len(conversations))
+        return conv, True
 
     def update_conversation(self, group,
                             initial_history=DEFAULT_INITIAL_HISTORY):
+        """
+        Fetches the most recent initial_history messages of a conversation
+        (group ID or LineContact), creating the LineConversation if needed,
+        and merges those not stored yet into it; stored messages are kept.
+
+        The request is made without holding any lock, and only new messages
+        are wrapped and inserted, so refreshing an active conversation
+        costs in proportion to the number of new messages.
+        """
         if isinstance(group, LineContact):
             group = group.mid
 
-        with self._convmutex:
-            conv = self._conversations.get(group)
-            if conv is None:
-                conv = self._conversations[group] = LineConversation(self,
-                                                                     group)
-
-            with conv._lock:
-                if initial_history > 0:
-                    self._conversations[group]._messages = \
-                        [LineMessage(self, msg)
-                         for msg in
-                         self._s4.getRecentMessages(
-                             group,
-                             initial_history)]
-                else:
-                    self._conversations[group]._messages = []
+        conv = self._conversations.get(group)
+        if conv is None:
+            conv, _ = self._new_conversation(group)
+            group = conv.group
 
-    def _add_to_conversation(self, group, message):
-        assert isinstance(group, str)
+        if initial_history > 0:
+            conv._merge(self._executor.call('getRecentMessages', group,
+                                            initial_history))
 
-        if not isinstance(message, LineMessage):
-            message = LineMessage(self, message)
+    def backfill(self, groups, page_size=50, limit=None):
+        """
+        Backfills the history of several conversations (group IDs or
+        LineContacts) in the background, as LineConversation.backfill does
+        for one, with at most LineClient.BACKFILL_CONCURRENCY requests in
+        flight across all backfills.
 
-        with self._convmutex:
-            conv = self._conversations.get(group)
-            if conv is None:
-                conv = LineConversation(self, group)
-                with conv._lock:
-                    self._conversations[group] = conv
-                    self._conversations[group]._messages = \
-                        [LineMessage(self, msg) for msg in
-                         self._s4.getRecentMessages(group, 20)]
-            else:
-                with conv._lock:
-                    self._conversations[group]._messages.insert(0, message)
+        Returns a dict of group ID -> Future of the number of messages
+        added.
+        """
+        def run(conv):
+            return sum(len(page) for page in conv.backfill(page_size, limit))
+
+        futures = {}
+        for group in groups:
+            if isinstance(group, LineContact):
+                group = group.mid
+            if group in futures:
+                continue
+            if group not in self._conversations:
+                self.update_conversation(group, 0)
+            futures[group] = self._backfills.submit(
+                run, self.conversation(group))
+        return futures
+
+    def _add_to_conversation(self, group, message):
+        """
+        Stores a Line.Message or LineMessage in the conversation with the
+        given mid, or in the one it belongs to if group is None. Returns
+        (LineConversation, LineMessage).
+        """
+        if not isinstance(message, LineMessage):
+            with self._profiler.stage('LineMessage'):
+                message = LineMessage(self, message)
+        if group is None:
+            group = message._chat()
+        assert isinstance(group, str)
 
+        # the lock is only contended while another thread merges history
+        # into the conversation; readers don't take it
+        conv = self._conversations.get(group)
+        if conv is not None:
+            with self._locked(conv._lock, 'conversation'):
+                conv._insert_message(message)
+            return conv, message
+
+        conv, added = self._new_conversation(group)
+        if added:
+            # the recent messages include this one
+            conv._merge(self._executor.call('getRecentMessages', conv.group,
+                                            20))
+        else:
+            with self._locked(conv._lock, 'conversation'):
+                conv._insert_message(message)
         return conv, message
 
     def _send_message(self, group, msg, seq=0):
         # sendMessage returns a Line.Message object
-        result = self._s4.sendMessage(seq, msg)
+        result = self._executor.call('sendMessage', seq, msg)
         self._add_to_conversation(group, result)
+        return result
+
+    def mark_read(self, group, message):
+        """
+        Marks a conversation (group ID or LineContact) as read up to and
+        including the given LineMessage or message ID.
+
+        Receipts are coalesced: calls within LineClient.RECEIPT_DELAY
+        seconds of each other result in a single receipt per conversation,
+        for the latest message marked, sent over the outbound scheduler.
+        Marking a message at or before one already marked does nothing.
+        """
+        if isinstance(group, LineContact):
+            group = group.mid
+        if isinstance(message, LineMessage):
+            message = message.id
+
+        conv = self._conversations.get(group)
+        if conv is not None:
+            with self._locked(conv._lock, 'conversation'):
+                if not is_later(message, conv._last_read):
+                    return
+                conv._last_read = message
+
+        with self._receiptmutex:
+            if is_later(message, self._receipts.get(group)):
+                self._receipts[group] = message
+            if self._receipt_timer is None:
+                self._receipt_timer = Timer(LineClient.RECEIPT_DELAY,
+                                            self.flush_receipts)
+                self._receipt_timer.daemon = True
+                self._receipt_timer.start()
+
+    def flush_receipts(self):
+        """
+        Queues the pending read receipts on the outbound scheduler now,
+        rather than after LineClient.RECEIPT_DELAY. Returns a dict of
+        conversation mid -> Future.
+        """
+        with self._receiptmutex:
+            receipts, self._receipts = self._receipts, {}
+            if self._receipt_timer is not None:
+                self._receipt_timer.cancel()
+                self._receipt_timer = None
+
+        return dict(
+            (group, self.outbound.submit(
+                group,
+                lambda client, group=group, message_id=message_id:
+                    client.sendChatChecked(0, group, message_id),
+                idempotent=True))
+            for group, message_id in receipts.items())
+
+    def message_template(self, text=None, **fields):
+        """
+        Returns a MessageTemplate for sending the same message repeatedly,
+        e.g. a canned reply, without serializing it again for every send.
+
+        Templates for plain text messages are cached, so this can be called
+        with the same text on every send.
+        """
+        if fields:
+            return MessageTemplate(text, **fields)
+
+        with self._templatemutex:
+            template = self._templates.get(text)
+            if template is None:
+                if len(self._templates) >= LineClient.TEMPLATE_CACHE_SIZE:
+                    self._templates.clear()
+                template = self._templates[text] = MessageTemplate(text)
+            return template
+
+    def send_template(self, group, template, seq=0):
+        """
+        Sends a MessageTemplate to a group ID or LineContact, and returns
+        the sent Line.Message.
+
+        Only the recipient and seq are encoded per send.
+        """
+        if isinstance(group, LineContact):
+            group = group.mid
+
+        with self._executor.connection() as client:
+            result = template.send(client, group, seq)
+        self._add_to_conversation(group, result)
+        return result
+
+    @property
+    def executor(self):
+        """
+        The RequestExecutor holding this client's /S4 connections, e.g. for
+        running several requests in parallel with executor.submit().
+        """
+        return self._executor
+
+    @property
+    def outbound(self):
+        """
+        The OutboundScheduler used by send_message_async, started on first
+        use with the LineClient.OUTBOUND_* settings.
+        """
+        with self._outboundmutex:
+            if self._outbound is None:
+                self._outbound = OutboundScheduler(
+                    self._executor,
+                    workers=LineClient.OUTBOUND_WORKERS,
+                    maxsize=LineClient.OUTBOUND_QUEUE_SIZE,
+                    rate=LineClient.OUTBOUND_RATE,
+                    dest_rate=LineClient.OUTBOUND_DEST_RATE)
+            return self._outbound
+
+    def send_message_async(self, group, text, seq=0):
+        """
+        Queues a textual message (or a MessageTemplate) to a group ID or
+        LineContact without blocking on the network, subject to the outbound
+        rate limits, and retried when the server reports a transient error.
+        The sent message is added to the conversation once sent; a failure
+        doing so is logged and does not resend it.
+
+        Returns a Future whose result is the sent Line.Message. Blocks only
+        while the outbound queue is full.
+        """
+        if isinstance(group, LineContact):
+            group = group.mid
+
+        def on_sent(result):
+            self._add_to_conversation(group, result)
+
+        if isinstance(text, MessageTemplate):
+            template = text
+            return self.outbound.submit(
+                group, lambda client: template.send(client, group, seq),
+                on_sent=on_sent)
+
+        msg = Line.Message(to=group, text=text)
+        return self.outbound.submit(
+            group, lambda client: client.sendMessage(seq, msg),
+            on_sent=on_sent)
+
+    def broadcast(self, text, recipients, timeout=None):
+        """
+        Sends the same textual message (or MessageTemplate) to each of
+        recipients (group IDs or LineContacts), concurrently over the
+        outbound scheduler's connections and subject to its rate limits.
+
+        The message is serialized once; only the recipient is spliced in per
+        send. Sent messages are not added to local conversations here; they
+        arrive through long_poll like any other sent message.
+
+        Blocks until every send has completed or failed, or timeout (in
+        seconds) expires, and returns a BroadcastResult. Recipients whose
+        send had not completed by the timeout map to a FutureTimeoutError.
+        """
+        template = text if isinstance(text, MessageTemplate) \
+            else MessageTemplate(text)
+        latencies = {}
+
+        def send(client, mid):
+            start = time.time()
+            try:
+                return template.send(client, mid)
+            finally:
+                latencies[mid] = time.time() - start
+
+        start = time.time()
+        futures = {}
+        for mid in recipients:
+            if isinstance(mid, LineContact):
+                mid = mid.mid
+            if mid not in futures:
+                futures[mid] = self.outbound.submit(
+                    mid, lambda client, mid=mid: send(client, mid))
+
+        deadline = None if timeout is None else start + timeout
+        results = {}
+        for mid, future in futures.items():
+            remaining = None
+            if deadline is not None:
+                remaining = max(0, deadline - time.time())
+            try:
+                results[mid] = future.result(remaining)
+            except Exception as e:
+                results[mid] = e
+
+        return BroadcastResult(results, latencies, time.time() - start)
+
+    def shutdown_outbound(self, wait=True):
+        """
+        Stops the outbound scheduler, if started. Pending read receipts are
+        queued first, and still sent. If wait is True, blocks until already
+        queued messages have been sent.
+        """
+        # also cancels the receipt timer, which would otherwise start a new
+        # scheduler when it fires
+        self.flush_receipts()
+        with self._outboundmutex:
+            outbound, self._outbound = self._outbound, None
+        if outbound is not None:
+            outbound.shutdown(wait)
 
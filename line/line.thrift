@@ -370,4 +370,14 @@ service Line {
     Message sendMessage(1: i32 seq, 2: Message message) throws (1: TalkException e);
 
     Contact findAndAddContactsByMid(1: i32 reqSeq, 2: string mid) throws (1: TalkException e);
+
+    // Marks a chat as read up to and including lastMessageId (consumer is
+    // the chat's mid)
+    void sendChatChecked(1: i32 seq, 2: string consumer, 3: string lastMessageId)
+        throws (1: TalkException e);
+
+    // Gets up to messagesCount messages of a chat preceding the message
+    // whose ID is endSeq, most recent first
+    list<Message> getPreviousMessages(2: string messageBoxId, 3: i64 endSeq,
+        4: i32 messagesCount) throws (1: TalkException e);
 }
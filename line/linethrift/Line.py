@@ -100,6 +100,24 @@ class Iface(object):
     """
     pass
 
+  def sendChatChecked(self, seq, consumer, lastMessageId):
+    """
+    Parameters:
+     - seq
+     - consumer
+     - lastMessageId
+    """
+    pass
+
+  def getPreviousMessages(self, messageBoxId, endSeq, messagesCount):
+    """
+    Parameters:
+     - messageBoxId
+     - endSeq
+     - messagesCount
+    """
+    pass
+
 
 class Client(Iface):
   def __init__(self, iprot, oprot=None):
@@ -521,6 +539,76 @@ class Client(Iface):
       raise result.e
     raise TApplicationException(TApplicationException.MISSING_RESULT, "findAndAddContactsByMid failed: unknown result");
 
+  def sendChatChecked(self, seq, consumer, lastMessageId):
+    """
+    Parameters:
+     - seq
+     - consumer
+     - lastMessageId
+    """
+    self.send_sendChatChecked(seq, consumer, lastMessageId)
+    self.recv_sendChatChecked()
+
+  def send_sendChatChecked(self, seq, consumer, lastMessageId):
+    self._oprot.writeMessageBegin('sendChatChecked', TMessageType.CALL, self._seqid)
+    args = sendChatChecked_args()
+    args.seq = seq
+    args.consumer = consumer
+    args.lastMessageId = lastMessageId
+    args.write(self._oprot)
+    self._oprot.writeMessageEnd()
+    self._oprot.trans.flush()
+
+  def recv_sendChatChecked(self):
+    (fname, mtype, rseqid) = self._iprot.readMessageBegin()
+    if mtype == TMessageType.EXCEPTION:
+      x = TApplicationException()
+      x.read(self._iprot)
+      self._iprot.readMessageEnd()
+      raise x
+    result = sendChatChecked_result()
+    result.read(self._iprot)
+    self._iprot.readMessageEnd()
+    if result.e is not None:
+      raise result.e
+    return
+
+  def getPreviousMessages(self, messageBoxId, endSeq, messagesCount):
+    """
+    Parameters:
+     - messageBoxId
+     - endSeq
+     - messagesCount
+    """
+    self.send_getPreviousMessages(messageBoxId, endSeq, messagesCount)
+    return self.recv_getPreviousMessages()
+
+  def send_getPreviousMessages(self, messageBoxId, endSeq, messagesCount):
+    self._oprot.writeMessageBegin('getPreviousMessages', TMessageType.CALL, self._seqid)
+    args = getPreviousMessages_args()
+    args.messageBoxId = messageBoxId
+    args.endSeq = endSeq
+    args.messagesCount = messagesCount
+    args.write(self._oprot)
+    self._oprot.writeMessageEnd()
+    self._oprot.trans.flush()
+
+  def recv_getPreviousMessages(self):
+    (fname, mtype, rseqid) = self._iprot.readMessageBegin()
+    if mtype == TMessageType.EXCEPTION:
+      x = TApplicationException()
+      x.read(self._iprot)
+      self._iprot.readMessageEnd()
+      raise x
+    result = getPreviousMessages_result()
+    result.read(self._iprot)
+    self._iprot.readMessageEnd()
+    if result.success is not None:
+      return result.success
+    if result.e is not None:
+      raise result.e
+    raise TApplicationException(TApplicationException.MISSING_RESULT, "getPreviousMessages failed: unknown result");
+
 
 class Processor(Iface, TProcessor):
   def __init__(self, handler):
@@ -539,6 +627,8 @@ class Processor(Iface, TProcessor):
     self._processMap["getLastOpRevision"] = Processor.process_getLastOpRevision
     self._processMap["sendMessage"] = Processor.process_sendMessage
     self._processMap["findAndAddContactsByMid"] = Processor.process_findAndAddContactsByMid
+    self._processMap["sendChatChecked"] = Processor.process_sendChatChecked
+    self._processMap["getPreviousMessages"] = Processor.process_getPreviousMessages
 
   def process(self, iprot, oprot):
     (name, type, seqid) = iprot.readMessageBegin()
@@ -737,6 +827,34 @@ class Processor(Iface, TProcessor):
     oprot.writeMessageEnd()
     oprot.trans.flush()
 
+  def process_sendChatChecked(self, seqid, iprot, oprot):
+    args = sendChatChecked_args()
+    args.read(iprot)
+    iprot.readMessageEnd()
+    result = sendChatChecked_result()
+    try:
+      self._handler.sendChatChecked(args.seq, args.consumer, args.lastMessageId)
+    except TalkException, e:
+      result.e = e
+    oprot.writeMessageBegin("sendChatChecked", TMessageType.REPLY, seqid)
+    result.write(oprot)
+    oprot.writeMessageEnd()
+    oprot.trans.flush()
+
+  def process_getPreviousMessages(self, seqid, iprot, oprot):
+    args = getPreviousMessages_args()
+    args.read(iprot)
+    iprot.readMessageEnd()
+    result = getPreviousMessages_result()
+    try:
+      result.success = self._handler.getPreviousMessages(args.messageBoxId, args.endSeq, args.messagesCount)
+    except TalkException, e:
+      result.e = e
+    oprot.writeMessageBegin("getPreviousMessages", TMessageType.REPLY, seqid)
+    result.write(oprot)
+    oprot.writeMessageEnd()
+    oprot.trans.flush()
+
 
 # HELPER FUNCTIONS AND STRUCTURES
 
@@ -2576,6 +2694,317 @@ class findAndAddContactsByMid_result(object):
     return
 
 
+  def __repr__(self):
+    L = ['%s=%r' % (key, value)
+      for key, value in self.__dict__.iteritems()]
+    return '%s(%s)' % (self.__class__.__name__, ', '.join(L))
+
+  def __eq__(self, other):
+    return isinstance(other, self.__class__) and self.__dict__ == other.__dict__
+
+  def __ne__(self, other):
+    return not (self == other)
+
+class sendChatChecked_args(object):
+  """
+  Attributes:
+   - seq
+   - consumer
+   - lastMessageId
+  """
+
+  thrift_spec = (
+    None, # 0
+    (1, TType.I32, 'seq', None, None, ), # 1
+    (2, TType.STRING, 'consumer', None, None, ), # 2
+    (3, TType.STRING, 'lastMessageId', None, None, ), # 3
+  )
+
+  def __init__(self, seq=None, consumer=None, lastMessageId=None,):
+    self.seq = seq
+    self.consumer = consumer
+    self.lastMessageId = lastMessageId
+
+  def read(self, iprot):
+    if iprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and isinstance(iprot.trans, TTransport.CReadableTransport) and self.thrift_spec is not None and fastbinary is not None:
+      fastbinary.decode_binary(self, iprot.trans, (self.__class__, self.thrift_spec))
+      return
+    iprot.readStructBegin()
+    while True:
+      (fname, ftype, fid) = iprot.readFieldBegin()
+      if ftype == TType.STOP:
+        break
+      if fid == 1:
+        if ftype == TType.I32:
+          self.seq = iprot.readI32();
+        else:
+          iprot.skip(ftype)
+      elif fid == 2:
+        if ftype == TType.STRING:
+          self.consumer = iprot.readString();
+        else:
+          iprot.skip(ftype)
+      elif fid == 3:
+        if ftype == TType.STRING:
+          self.lastMessageId = iprot.readString();
+        else:
+          iprot.skip(ftype)
+      else:
+        iprot.skip(ftype)
+      iprot.readFieldEnd()
+    iprot.readStructEnd()
+
+  def write(self, oprot):
+    if oprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and self.thrift_spec is not None and fastbinary is not None:
+      oprot.trans.write(fastbinary.encode_binary(self, (self.__class__, self.thrift_spec)))
+      return
+    oprot.writeStructBegin('sendChatChecked_args')
+    if self.seq is not None:
+      oprot.writeFieldBegin('seq', TType.I32, 1)
+      oprot.writeI32(self.seq)
+      oprot.writeFieldEnd()
+    if self.consumer is not None:
+      oprot.writeFieldBegin('consumer', TType.STRING, 2)
+      oprot.writeString(self.consumer)
+      oprot.writeFieldEnd()
+    if self.lastMessageId is not None:
+      oprot.writeFieldBegin('lastMessageId', TType.STRING, 3)
+      oprot.writeString(self.lastMessageId)
+      oprot.writeFieldEnd()
+    oprot.writeFieldStop()
+    oprot.writeStructEnd()
+
+  def validate(self):
+    return
+
+
+  def __repr__(self):
+    L = ['%s=%r' % (key, value)
+      for key, value in self.__dict__.iteritems()]
+    return '%s(%s)' % (self.__class__.__name__, ', '.join(L))
+
+  def __eq__(self, other):
+    return isinstance(other, self.__class__) and self.__dict__ == other.__dict__
+
+  def __ne__(self, other):
+    return not (self == other)
+
+class sendChatChecked_result(object):
+  """
+  Attributes:
+   - e
+  """
+
+  thrift_spec = (
+    None, # 0
+    (1, TType.STRUCT, 'e', (TalkException, TalkException.thrift_spec), None, ), # 1
+  )
+
+  def __init__(self, e=None,):
+    self.e = e
+
+  def read(self, iprot):
+    if iprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and isinstance(iprot.trans, TTransport.CReadableTransport) and self.thrift_spec is not None and fastbinary is not None:
+      fastbinary.decode_binary(self, iprot.trans, (self.__class__, self.thrift_spec))
+      return
+    iprot.readStructBegin()
+    while True:
+      (fname, ftype, fid) = iprot.readFieldBegin()
+      if ftype == TType.STOP:
+        break
+      if fid == 1:
+        if ftype == TType.STRUCT:
+          self.e = TalkException()
+          self.e.read(iprot)
+        else:
+          iprot.skip(ftype)
+      else:
+        iprot.skip(ftype)
+      iprot.readFieldEnd()
+    iprot.readStructEnd()
+
+  def write(self, oprot):
+    if oprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and self.thrift_spec is not None and fastbinary is not None:
+      oprot.trans.write(fastbinary.encode_binary(self, (self.__class__, self.thrift_spec)))
+      return
+    oprot.writeStructBegin('sendChatChecked_result')
+    if self.e is not None:
+      oprot.writeFieldBegin('e', TType.STRUCT, 1)
+      self.e.write(oprot)
+      oprot.writeFieldEnd()
+    oprot.writeFieldStop()
+    oprot.writeStructEnd()
+
+  def validate(self):
+    return
+
+
+  def __repr__(self):
+    L = ['%s=%r' % (key, value)
+      for key, value in self.__dict__.iteritems()]
+    return '%s(%s)' % (self.__class__.__name__, ', '.join(L))
+
+  def __eq__(self, other):
+    return isinstance(other, self.__class__) and self.__dict__ == other.__dict__
+
+  def __ne__(self, other):
+    return not (self == other)
+
+class getPreviousMessages_args(object):
+  """
+  Attributes:
+   - messageBoxId
+   - endSeq
+   - messagesCount
+  """
+
+  thrift_spec = (
+    None, # 0
+    None, # 1
+    (2, TType.STRING, 'messageBoxId', None, None, ), # 2
+    (3, TType.I64, 'endSeq', None, None, ), # 3
+    (4, TType.I32, 'messagesCount', None, None, ), # 4
+  )
+
+  def __init__(self, messageBoxId=None, endSeq=None, messagesCount=None,):
+    self.messageBoxId = messageBoxId
+    self.endSeq = endSeq
+    self.messagesCount = messagesCount
+
+  def read(self, iprot):
+    if iprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and isinstance(iprot.trans, TTransport.CReadableTransport) and self.thrift_spec is not None and fastbinary is not None:
+      fastbinary.decode_binary(self, iprot.trans, (self.__class__, self.thrift_spec))
+      return
+    iprot.readStructBegin()
+    while True:
+      (fname, ftype, fid) = iprot.readFieldBegin()
+      if ftype == TType.STOP:
+        break
+      if fid == 2:
+        if ftype == TType.STRING:
+          self.messageBoxId = iprot.readString();
+        else:
+          iprot.skip(ftype)
+      elif fid == 3:
+        if ftype == TType.I64:
+          self.endSeq = iprot.readI64();
+        else:
+          iprot.skip(ftype)
+      elif fid == 4:
+        if ftype == TType.I32:
+          self.messagesCount = iprot.readI32();
+        else:
+          iprot.skip(ftype)
+      else:
+        iprot.skip(ftype)
+      iprot.readFieldEnd()
+    iprot.readStructEnd()
+
+  def write(self, oprot):
+    if oprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and self.thrift_spec is not None and fastbinary is not None:
+      oprot.trans.write(fastbinary.encode_binary(self, (self.__class__, self.thrift_spec)))
+      return
+    oprot.writeStructBegin('getPreviousMessages_args')
+    if self.messageBoxId is not None:
+      oprot.writeFieldBegin('messageBoxId', TType.STRING, 2)
+      oprot.writeString(self.messageBoxId)
+      oprot.writeFieldEnd()
+    if self.endSeq is not None:
+      oprot.writeFieldBegin('endSeq', TType.I64, 3)
+      oprot.writeI64(self.endSeq)
+      oprot.writeFieldEnd()
+    if self.messagesCount is not None:
+      oprot.writeFieldBegin('messagesCount', TType.I32, 4)
+      oprot.writeI32(self.messagesCount)
+      oprot.writeFieldEnd()
+    oprot.writeFieldStop()
+    oprot.writeStructEnd()
+
+  def validate(self):
+    return
+
+
+  def __repr__(self):
+    L = ['%s=%r' % (key, value)
+      for key, value in self.__dict__.iteritems()]
+    return '%s(%s)' % (self.__class__.__name__, ', '.join(L))
+
+  def __eq__(self, other):
+    return isinstance(other, self.__class__) and self.__dict__ == other.__dict__
+
+  def __ne__(self, other):
+    return not (self == other)
+
+class getPreviousMessages_result(object):
+  """
+  Attributes:
+   - success
+   - e
+  """
+
+  thrift_spec = (
+    (0, TType.LIST, 'success', (TType.STRUCT,(Message, Message.thrift_spec)), None, ), # 0
+    (1, TType.STRUCT, 'e', (TalkException, TalkException.thrift_spec), None, ), # 1
+  )
+
+  def __init__(self, success=None, e=None,):
+    self.success = success
+    self.e = e
+
+  def read(self, iprot):
+    if iprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and isinstance(iprot.trans, TTransport.CReadableTransport) and self.thrift_spec is not None and fastbinary is not None:
+      fastbinary.decode_binary(self, iprot.trans, (self.__class__, self.thrift_spec))
+      return
+    iprot.readStructBegin()
+    while True:
+      (fname, ftype, fid) = iprot.readFieldBegin()
+      if ftype == TType.STOP:
+        break
+      if fid == 0:
+        if ftype == TType.LIST:
+          self.success = []
+          (_etype126, _size123) = iprot.readListBegin()
+          for _i127 in xrange(_size123):
+            _elem128 = Message()
+            _elem128.read(iprot)
+            self.success.append(_elem128)
+          iprot.readListEnd()
+        else:
+          iprot.skip(ftype)
+      elif fid == 1:
+        if ftype == TType.STRUCT:
+          self.e = TalkException()
+          self.e.read(iprot)
+        else:
+          iprot.skip(ftype)
+      else:
+        iprot.skip(ftype)
+      iprot.readFieldEnd()
+    iprot.readStructEnd()
+
+  def write(self, oprot):
+    if oprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and self.thrift_spec is not None and fastbinary is not None:
+      oprot.trans.write(fastbinary.encode_binary(self, (self.__class__, self.thrift_spec)))
+      return
+    oprot.writeStructBegin('getPreviousMessages_result')
+    if self.success is not None:
+      oprot.writeFieldBegin('success', TType.LIST, 0)
+      oprot.writeListBegin(TType.STRUCT, len(self.success))
+      for iter129 in self.success:
+        iter129.write(oprot)
+      oprot.writeListEnd()
+      oprot.writeFieldEnd()
+    if self.e is not None:
+      oprot.writeFieldBegin('e', TType.STRUCT, 1)
+      self.e.write(oprot)
+      oprot.writeFieldEnd()
+    oprot.writeFieldStop()
+    oprot.writeStructEnd()
+
+  def validate(self):
+    return
+
+
   def __repr__(self):
     L = ['%s=%r' % (key, value)
       for key, value in self.__dict__.iteritems()]
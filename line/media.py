@@ -0,0 +1,95 @@
+import logging
+import os
+import socket
+
+from .downloads import DownloadError, httplib
+
+
+logger = logging.getLogger('LineClient')
+
+
+OBJECT_STORAGE_URL = 'https://os.line.naver.jp/os/m/{}'
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def iter_content(pool, url, headers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 offset=0, retries=3):
+    """
+    Yields the body of url, from byte offset on, in chunks of at most
+    chunk_size bytes, using connections from an HttpPool.
+
+    If the connection fails or the body ends early, the download resumes
+    where it stopped with a Range request, up to `retries` times.
+    """
+    while True:
+        request_headers = dict(headers or {})
+        if offset:
+            request_headers['Range'] = 'bytes={}-'.format(offset)
+
+        expected = None
+        try:
+            with pool.request(url, request_headers) as response:
+                if response.status == 200:
+                    skip = offset  # the server ignored the range
+                elif response.status == 206:
+                    skip = 0
+                else:
+                    response.read()
+                    raise DownloadError(url, response.status,
+                                        response.reason)
+
+                length = response.getheader('content-length')
+                if length is not None:
+                    expected = offset + int(length) - skip
+
+                while True:
+                    chunk = response.read(chunk_size)
+                    if not chunk:
+                        break
+                    if skip:
+                        dropped = min(skip, len(chunk))
+                        chunk = chunk[dropped:]
+                        skip -= dropped
+                        if not chunk:
+                            continue
+                    offset += len(chunk)
+                    yield chunk
+        except (httplib.HTTPException, socket.error) as e:
+            if retries <= 0:
+                raise
+            logger.debug('download of %s failed at byte %d (%s); resuming',
+                         url, offset, e)
+            retries -= 1
+            continue
+
+        if expected is None or offset >= expected:
+            return
+        if retries <= 0:
+            raise DownloadError(url, reason='body ended at byte {} of {}'
+                                .format(offset, expected))
+        retries -= 1
+
+
+def download(pool, url, dest, headers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Streams the body of url to dest, a file object or a path.
+
+    For a path, data goes to dest + '.part' first, which is renamed to dest
+    once complete; an existing .part file (e.g. from an interrupted run) is
+    resumed rather than downloaded again.
+    """
+    if hasattr(dest, 'write'):
+        for chunk in iter_content(pool, url, headers, chunk_size):
+            dest.write(chunk)
+        return dest
+
+    partial = dest + '.part'
+    offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+    with open(partial, 'ab') as f:
+        for chunk in iter_content(pool, url, headers, chunk_size, offset):
+            f.write(chunk)
+    if os.path.exists(dest):
+        os.remove(dest)  # os.rename doesn't replace on Windows
+    os.rename(partial, dest)
+    return dest
@@ -0,0 +1,303 @@
+from threading import Thread, Lock
+import bisect
+import logging
+import time
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from thrift.transport import TTransport
+
+
+logger = logging.getLogger('LineClient')
+
+
+# seconds; suits RPC latencies from sub-millisecond up to long-poll timeouts
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Family(object):
+    def __init__(self, kind, help, buckets):
+        self.kind = kind
+        self.help = help
+        self.buckets = buckets
+        self.values = {}  # sorted label items tuple -> value or _Histogram
+
+
+class NullMetrics(object):
+    """Metrics sink that discards everything; the default for LineClient."""
+
+    enabled = False
+
+    def describe(self, name, kind, help='', buckets=None):
+        pass
+
+    def inc(self, name, value=1, **labels):
+        pass
+
+    def set(self, name, value, **labels):
+        pass
+
+    def observe(self, name, value, **labels):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+class MetricsRegistry(object):
+    """
+    Thread-safe collection of counters, gauges and histograms, each
+    identified by a name and a set of labels.
+
+    Metrics are created on first use (as a counter for inc(), gauge for
+    set(), histogram with DEFAULT_BUCKETS for observe()) unless declared
+    beforehand with describe().
+
+    Callbacks added with add_callback(fn) are called as
+    fn(name, labels, value) for every update, e.g. to forward to statsd.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self._lock = Lock()
+        self._families = {}
+        self._order = []
+        self._callbacks = []
+
+    def describe(self, name, kind, help='', buckets=None):
+        """
+        Declares a metric. kind is 'counter', 'gauge' or 'histogram';
+        buckets are the histogram's upper bounds.
+        """
+        with self._lock:
+            self._family(name, kind, help, buckets)
+
+    def add_callback(self, fn):
+        with self._lock:
+            self._callbacks = self._callbacks + [fn]
+
+    def remove_callback(self, fn):
+        with self._lock:
+            self._callbacks = [f for f in self._callbacks if f is not fn]
+
+    def _family(self, name, kind, help='', buckets=None):
+        # must hold self._lock
+        family = self._families.get(name)
+        if family is None:
+            if kind == 'histogram':
+                buckets = tuple(sorted(buckets or DEFAULT_BUCKETS))
+            family = self._families[name] = _Family(kind, help, buckets)
+            self._order.append(name)
+        elif help and not family.help:
+            family.help = help
+        return family
+
+    def _update(self, name, kind, value, labels, op):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._family(name, kind)
+            values = family.values
+            if family.kind == 'histogram':
+                hist = values.get(key)
+                if hist is None:
+                    hist = values[key] = _Histogram(family.buckets)
+                hist.observe(value)
+            elif op == 'inc':
+                values[key] = values.get(key, 0) + value
+            else:
+                values[key] = value
+            callbacks = self._callbacks
+
+        for fn in callbacks:
+            try:
+                fn(name, labels, value)
+            except Exception:
+                logger.exception('exception in metrics callback')
+
+    def inc(self, name, value=1, **labels):
+        self._update(name, 'counter', value, labels, 'inc')
+
+    def set(self, name, value, **labels):
+        self._update(name, 'gauge', value, labels, 'set')
+
+    def observe(self, name, value, **labels):
+        self._update(name, 'histogram', value, labels, 'observe')
+
+    def snapshot(self):
+        """
+        Returns {name: {labels tuple: value}}, where histogram values are
+        dicts with 'buckets', 'counts', 'sum' and 'count'.
+        """
+        result = {}
+        with self._lock:
+            for name in self._order:
+                family = self._families[name]
+                values = {}
+                for key, value in family.values.items():
+                    if family.kind == 'histogram':
+                        value = {'buckets': value.buckets,
+                                 'counts': value.counts[:],
+                                 'sum': value.sum,
+                                 'count': value.count}
+                    values[key] = value
+                result[name] = values
+        return result
+
+    def render_prometheus(self):
+        """Returns all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name in self._order:
+                family = self._families[name]
+                if family.help:
+                    lines.append('# HELP {} {}'.format(name, family.help))
+                lines.append('# TYPE {} {}'.format(name, family.kind))
+
+                for key in sorted(family.values):
+                    value = family.values[key]
+                    if family.kind != 'histogram':
+                        lines.append('{}{} {}'.format(
+                            name, _format_labels(key), _format_value(value)))
+                        continue
+
+                    cumulative = 0
+                    bounds = [_format_value(b) for b in value.buckets]
+                    for bound, count in zip(bounds + ['+Inf'], value.counts):
+                        cumulative += count
+                        lines.append('{}_bucket{} {}'.format(
+                            name, _format_labels(key + (('le', bound),)),
+                            cumulative))
+                    lines.append('{}_sum{} {}'.format(
+                        name, _format_labels(key), _format_value(value.sum)))
+                    lines.append('{}_count{} {}'.format(
+                        name, _format_labels(key), value.count))
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(items):
+    if not items:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+        for k, v in items) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def serve_prometheus(registry, port, host=''):
+    """
+    Serves registry.render_prometheus() over HTTP on a daemon thread, for
+    scraping by Prometheus. Returns the HTTPServer; call its shutdown()
+    method to stop it.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = registry.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type',
+                             'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug('metrics endpoint: ' + format, *args)
+
+    server = HTTPServer((host, port), Handler)
+    thread = Thread(target=server.serve_forever, name='LineMetrics')
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+class MeteredTransport(TTransport.TTransportBase):
+    """
+    Wraps a transport, counting bytes read and written into the metrics of
+    its owner (anything with a _metrics attribute, looked up on each flush
+    so metrics can be switched on and off at runtime).
+
+    Counts are reported on flush(), i.e. once per request: bytes written
+    for this request, and bytes read since the last flush (the previous
+    response).
+
+    Running totals are also kept in bytes_in and bytes_out, and, while
+    timed is set, the time spent blocked in read() and flush() in
+    read_seconds and flush_seconds; TracedClient uses these to split a call
+    into network and (de)serialization time.
+    """
+
+    def __init__(self, transport, owner, name):
+        self._trans = transport
+        self._owner = owner
+        self._name = name
+        self.bytes_in = self.bytes_out = 0
+        self._reported_in = self._reported_out = 0
+        self.timed = False
+        self.read_seconds = self.flush_seconds = 0.0
+
+    def isOpen(self):
+        return self._trans.isOpen()
+
+    def open(self):
+        return self._trans.open()
+
+    def close(self):
+        self._report()
+        return self._trans.close()
+
+    def read(self, sz):
+        if self.timed:
+            start = time.time()
+            data = self._trans.read(sz)
+            self.read_seconds += time.time() - start
+        else:
+            data = self._trans.read(sz)
+        self.bytes_in += len(data)
+        return data
+
+    def write(self, buf):
+        self.bytes_out += len(buf)
+        self._trans.write(buf)
+
+    def flush(self):
+        self._report()
+        if self.timed:
+            start = time.time()
+            self._trans.flush()
+            self.flush_seconds += time.time() - start
+        else:
+            self._trans.flush()
+
+    def _report(self):
+        metrics = self._owner._metrics
+        if metrics.enabled:
+            if self.bytes_in > self._reported_in:
+                metrics.inc('line_transport_bytes_in',
+                            self.bytes_in - self._reported_in,
+                            transport=self._name)
+            if self.bytes_out > self._reported_out:
+                metrics.inc('line_transport_bytes_out',
+                            self.bytes_out - self._reported_out,
+                            transport=self._name)
+        self._reported_in = self.bytes_in
+        self._reported_out = self.bytes_out
@@ -0,0 +1,42 @@
+from threading import Lock
+
+
+class MidTable(object):
+    """
+    Maps mids (user, group and room IDs) to small integers and back, so that
+    each distinct mid is stored once however many messages refer to it.
+
+    Lookups of known mids take no lock; only adding a new mid does.
+    """
+
+    def __init__(self):
+        self._ids = {}  # mid -> int
+        self._mids = []  # int -> mid
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._mids)
+
+    def intern(self, mid):
+        """Returns the integer for mid (None for None), adding it if new."""
+        if mid is None:
+            return None
+        i = self._ids.get(mid)
+        if i is None:
+            with self._lock:
+                i = self._ids.get(mid)
+                if i is None:
+                    i = len(self._mids)
+                    self._mids.append(mid)
+                    self._ids[mid] = i
+        return i
+
+    def mid(self, i):
+        """Returns the mid for an integer from intern() (None for None)."""
+        if i is None:
+            return None
+        return self._mids[i]
+
+    def canonical(self, mid):
+        """Returns the stored copy of mid, adding it if new."""
+        return self.mid(self.intern(mid))
@@ -0,0 +1,319 @@
+from threading import Thread, Condition, Lock
+import heapq
+import itertools
+import logging
+import random
+import time
+
+from thrift.transport.TTransport import TTransportException
+from linethrift.ttypes import TalkException, TalkExceptionCode
+
+from .futures import Future
+
+
+logger = logging.getLogger('LineClient')
+
+
+class OutboundQueueFull(Exception):
+    pass
+
+
+class TokenBucket(object):
+    """
+    Token-bucket rate limiter: allows bursts of up to `burst` calls, refilled
+    at `rate` tokens per second.
+
+    Not thread-safe by itself; OutboundScheduler only uses it while holding
+    its own lock.
+    """
+
+    def __init__(self, rate, burst):
+        self._rate = float(rate)
+        self._burst = float(burst)
+        self._tokens = float(burst)
+        self._last = time.time()
+
+    def _refill(self, now):
+        self._tokens = min(self._burst,
+                           self._tokens + (now - self._last) * self._rate)
+        self._last = now
+
+    def delay(self, now):
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill(now)
+        if self._tokens >= 1:
+            return 0
+        return (1 - self._tokens) / self._rate
+
+    def take(self):
+        self._tokens -= 1
+
+    def full(self, now):
+        """True if the bucket has refilled completely, i.e. is like new."""
+        self._refill(now)
+        return self._tokens >= self._burst
+
+
+class _Job(object):
+    def __init__(self, dest, fn, future, idempotent, on_sent):
+        self.dest = dest
+        self.fn = fn
+        self.future = future
+        self.idempotent = idempotent
+        self.on_sent = on_sent
+        self.attempts = 0
+
+
+class OutboundScheduler(object):
+    """
+    Sends queued requests from a small pool of worker threads.
+
+    Each request runs on a client checked out from a RequestExecutor, so
+    workers never share a connection.
+
+    Requests are rate-limited by one token bucket for the whole account and
+    one per destination. Requests failing with a transient TalkException
+    code are retried with exponential backoff. Transport errors are only
+    retried for idempotent requests, since the server may have processed a
+    request whose reply was lost, e.g. a sendMessage, which would then be
+    sent twice.
+    """
+
+    # TalkException codes worth retrying; everything else fails the future
+    TRANSIENT_CODES = frozenset([
+        TalkExceptionCode.DB_FAILED,
+        TalkExceptionCode.EXCESSIVE_ACCESS,
+        TalkExceptionCode.NOT_READY,
+        TalkExceptionCode.SYSTEM_ERROR,
+        TalkExceptionCode.INTERNAL_ERROR,
+        TalkExceptionCode.MAINTENANCE_ERROR,
+    ])
+
+    # per-destination buckets are pruned once there are more than this many
+    BUCKET_PRUNE_SIZE = 1024
+
+    def __init__(self, executor, workers=2, maxsize=1000,
+                 rate=(5.0, 10), dest_rate=(1.0, 5),
+                 max_retries=5, backoff=0.5, max_backoff=30.0):
+        self._executor = executor
+        self._maxsize = maxsize
+        self._dest_rate = dest_rate
+        self._max_retries = max_retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+
+        self._lock = Lock()
+        self._ready = Condition(self._lock)  # signalled when a job is queued
+        self._not_full = Condition(self._lock)
+        self._heap = []  # (ready time, tiebreak, job)
+        self._counter = itertools.count()
+        self._pending = 0  # queued or being retried
+        self._closed = False
+
+        self._account_bucket = TokenBucket(*rate)
+        self._dest_buckets = {}
+        self._prune_at = OutboundScheduler.BUCKET_PRUNE_SIZE
+
+        self._threads = []
+        for i in range(workers):
+            thread = Thread(target=self._worker,
+                            name='LineOutbound-{}'.format(i))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    @property
+    def pending(self):
+        """Number of requests queued, waiting to be retried or in flight."""
+        with self._lock:
+            return self._pending
+
+    def submit(self, dest, fn, block=True, timeout=None, idempotent=False,
+               on_sent=None):
+        """
+        Queues fn(client) to be called on a worker thread, where client is a
+        Line.Client owned by that worker. dest is the destination mid used
+        for per-destination rate limiting. fn should make a single request,
+        since all of fn is retried.
+
+        If idempotent is True, fn is also retried on transport errors. Once
+        fn has succeeded, on_sent(result), if given, is called on the worker
+        thread before the future completes, e.g. to store a sent message;
+        exceptions from it are logged and do not cause a retry.
+
+        Returns a Future for the return value of fn. If the queue is full,
+        blocks until there is room, or raises OutboundQueueFull if block is
+        False or timeout (in seconds) expires.
+        """
+        future = Future()
+        job = _Job(dest, fn, future, idempotent, on_sent)
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('scheduler has been shut down')
+            if self._pending >= self._maxsize:
+                if not block:
+                    raise OutboundQueueFull()
+                deadline = None if timeout is None else time.time() + timeout
+                while self._pending >= self._maxsize:
+                    remaining = None
+                    if deadline is not None:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            raise OutboundQueueFull()
+                    self._not_full.wait(remaining)
+
+            self._pending += 1
+            self._push(time.time(), job)
+
+        return future
+
+    def shutdown(self, wait=True):
+        """
+        Stops accepting requests. Queued requests are still sent; if wait is
+        True, blocks until they have been.
+        """
+        with self._lock:
+            self._closed = True
+            self._ready.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _push(self, when, job):
+        # must hold self._lock
+        heapq.heappush(self._heap, (when, next(self._counter), job))
+        self._ready.notify()
+
+    def _next_job(self):
+        """
+        Blocks until a job is due and both rate limits allow it, then takes
+        the tokens and returns it. Returns None once shut down and drained.
+        """
+        with self._lock:
+            while True:
+                if not self._heap:
+                    if self._closed and self._pending == 0:
+                        self._ready.notify_all()
+                        return None
+                    self._ready.wait()
+                    continue
+
+                now = time.time()
+                when, _, job = self._heap[0]
+                if when > now:
+                    self._ready.wait(when - now)
+                    continue
+
+                bucket = self._dest_buckets.get(job.dest)
+                if bucket is None:
+                    if len(self._dest_buckets) >= self._prune_at:
+                        self._prune_buckets(now)
+                    bucket = self._dest_buckets[job.dest] = \
+                        TokenBucket(*self._dest_rate)
+
+                delay = max(bucket.delay(now),
+                            self._account_bucket.delay(now))
+                if delay > 0:
+                    # defer it; other destinations may still be sendable
+                    heapq.heapreplace(self._heap,
+                                      (now + delay, next(self._counter), job))
+                    continue
+
+                heapq.heappop(self._heap)
+                bucket.take()
+                self._account_bucket.take()
+                return job
+
+    def _prune_buckets(self, now):
+        # must hold self._lock; a full bucket behaves like a new one, so
+        # dropping it changes nothing
+        self._dest_buckets = dict(
+            (dest, bucket) for dest, bucket in self._dest_buckets.items()
+            if not bucket.full(now))
+        self._prune_at = max(OutboundScheduler.BUCKET_PRUNE_SIZE,
+                             2 * len(self._dest_buckets))
+
+    def _finish(self):
+        with self._lock:
+            self._pending -= 1
+            self._not_full.notify()
+            if self._closed and self._pending == 0:
+                self._ready.notify_all()
+
+    def _is_transient(self, e, idempotent):
+        if isinstance(e, TalkException):
+            return e.code in OutboundScheduler.TRANSIENT_CODES
+        return idempotent and \
+            isinstance(e, (TTransportException, EOFError, IOError))
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                break
+
+            try:
+                with self._executor.connection() as client:
+                    result = job.fn(client)
+            except Exception as e:
+                if not self._is_transient(e, job.idempotent):
+                    self._finish()
+                    job.future.set_exception(e)
+                    continue
+
+                job.attempts += 1
+                if job.attempts > self._max_retries:
+                    self._finish()
+                    job.future.set_exception(e)
+                    continue
+
+                delay = min(self._max_backoff,
+                            self._backoff * 2 ** (job.attempts - 1))
+                delay *= random.uniform(0.5, 1.0)
+                logger.debug(
+                    'outbound request to %s failed (%s); retry %d in %.2fs',
+                    job.dest, e, job.attempts, delay)
+                with self._lock:
+                    self._push(time.time() + delay, job)
+            else:
+                if job.on_sent is not None:
+                    try:
+                        job.on_sent(result)
+                    except Exception:
+                        logger.exception('exception after outbound request '
+                                         'to %s', job.dest)
+                self._finish()
+                job.future.set_result(result)
+
+
+class BroadcastResult(object):
+    """
+    Aggregated outcome of LineClient.broadcast.
+
+    results maps each recipient mid to the sent Line.Message, or to the
+    exception the send failed with; latencies maps each mid to the seconds
+    spent sending it (excluding time queued). elapsed is the wall time of
+    the whole broadcast.
+    """
+
+    def __init__(self, results, latencies, elapsed):
+        self.results = results
+        self.latencies = latencies
+        self.elapsed = elapsed
+
+    @property
+    def sent(self):
+        return [mid for mid, r in self.results.items()
+                if not isinstance(r, Exception)]
+
+    @property
+    def failed(self):
+        return dict((mid, r) for mid, r in self.results.items()
+                    if isinstance(r, Exception))
+
+    def __str__(self):
+        return '<BroadcastResult sent={}, failed={}, elapsed={:.3f}s>'.format(
+            len(self.sent), len(self.failed), self.elapsed)
+
+    __repr__ = __str__
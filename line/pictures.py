@@ -0,0 +1,88 @@
+from threading import Lock
+import os
+import tempfile
+
+from .downloads import DiskCache, HttpPool, WorkerPool, DownloadError
+
+
+PROFILE_URL = 'http://dl.profile.line.naver.jp'
+
+DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(),
+                                 'python-line-pictures')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class ProfilePictures(object):
+    """
+    Downloads contacts' profile pictures into a DiskCache.
+
+    Entries are keyed on the contact's mid and pictureStatus, which changes
+    whenever the picture does, so a new picture is downloaded again and the
+    old one ages out of the cache. Concurrent requests for the same picture
+    share one download.
+    """
+
+    def __init__(self, cache, pool=None, workers=4):
+        self._cache = cache
+        self._pool = pool or HttpPool(workers)
+        self._workers = WorkerPool(workers, 'LinePictures')
+
+    @property
+    def cache(self):
+        return self._cache
+
+    def fetch(self, contact):
+        """
+        Returns the local path of a LineContact's profile picture,
+        downloading it if needed, or None if the contact has none.
+        """
+        picture_path = contact._picturePath
+        if not picture_path:
+            return None
+
+        url = PROFILE_URL + picture_path
+
+        def write(f):
+            with self._pool.request(url) as response:
+                if response.status != 200:
+                    response.read()
+                    raise DownloadError(url, response.status,
+                                        response.reason)
+                while True:
+                    chunk = response.read(64 * 1024)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+
+        return self._cache.fetch(
+            'picture:{}:{}'.format(contact.mid, contact._pictureStatus),
+            write)
+
+    def fetch_async(self, contact):
+        """Like fetch(), but on a worker thread; returns a Future."""
+        return self._workers.submit(self.fetch, contact)
+
+    def prefetch(self, contacts):
+        """
+        Starts fetching the pictures of the given LineContacts on the worker
+        threads. Returns a dict of mid -> Future of the path.
+        """
+        return dict((contact.mid, self.fetch_async(contact))
+                    for contact in contacts)
+
+
+_default = None
+_default_lock = Lock()
+
+
+def default_pictures(directory=None, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Returns the ProfilePictures shared by every LineClient in the process,
+    created with the given settings on the first call.
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ProfilePictures(
+                DiskCache(directory or DEFAULT_DIRECTORY, max_bytes))
+        return _default
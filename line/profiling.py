@@ -0,0 +1,177 @@
+from threading import Lock, local
+import time
+
+from .tracing import Interceptor
+
+
+class _NullStage(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class NullProfiler(object):
+    """Profiler that records nothing; the default for LineClient."""
+
+    enabled = False
+
+    def stage(self, name):
+        return _NULL_STAGE
+
+    def in_stage(self):
+        return False
+
+    def record(self, path, seconds):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class _Stage(object):
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._stack = self._profiler._stack()
+        self._stack.append(self._name)
+        self._start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.time() - self._start
+        self._profiler._add(tuple(self._stack), elapsed)
+        self._stack.pop()
+        return False
+
+
+class StageProfiler(object):
+    """
+    Aggregates wall time spent in nested, named stages.
+
+    Stages are entered with `with profiler.stage(name):`; nesting is
+    tracked per thread, so each measurement is keyed by its full path, e.g.
+    ('long_poll', 'add_to_conversation', 'LineMessage'). Durations measured
+    elsewhere can be added with record().
+
+    Results are available as a per-stage table (report()) or in the folded
+    stack format read by flamegraph.pl and speedscope (folded()).
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self._lock = Lock()
+        self._local = local()
+        self._stats = {}  # path -> [count, total seconds, max seconds]
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _add(self, path, seconds):
+        with self._lock:
+            stats = self._stats.get(path)
+            if stats is None:
+                self._stats[path] = [1, seconds, seconds]
+            else:
+                stats[0] += 1
+                stats[1] += seconds
+                if seconds > stats[2]:
+                    stats[2] = seconds
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def in_stage(self):
+        return bool(self._stack())
+
+    def record(self, path, seconds):
+        """
+        Adds a measurement for path (a stage name or tuple of names),
+        relative to the calling thread's current stage.
+        """
+        if not isinstance(path, tuple):
+            path = (path,)
+        self._add(tuple(self._stack()) + path, seconds)
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def stats(self):
+        """
+        Returns {path: (count, total, self, max)} where self is the total
+        minus the time accounted to child stages.
+        """
+        with self._lock:
+            stats = dict((path, list(s)) for path, s in self._stats.items())
+
+        children = {}
+        for path, (count, total, maximum) in stats.items():
+            if len(path) > 1:
+                children[path[:-1]] = children.get(path[:-1], 0) + total
+
+        return dict(
+            (path, (count, total, max(0.0, total - children.get(path, 0)),
+                    maximum))
+            for path, (count, total, maximum) in stats.items())
+
+    def report(self):
+        """Returns a table of stages, indented by nesting, as a string."""
+        lines = ['{:<48} {:>9} {:>11} {:>11} {:>11} {:>11}'.format(
+            'stage', 'count', 'total ms', 'self ms', 'mean ms', 'max ms')]
+        for path, (count, total, own, maximum) in sorted(self.stats().items()):
+            lines.append('{:<48} {:>9} {:>11.2f} {:>11.2f} {:>11.3f} {:>11.3f}'
+                         .format('  ' * (len(path) - 1) + path[-1], count,
+                                 total * 1e3, own * 1e3,
+                                 total * 1e3 / count, maximum * 1e3))
+        return '\n'.join(lines)
+
+    def folded(self):
+        """
+        Returns the self time of every stage in the folded stack format
+        ('a;b;c <microseconds>' per line), for flame graph tools.
+        """
+        return '\n'.join(
+            '{} {}'.format(';'.join(path), int(own * 1e6))
+            for path, (count, total, own, maximum)
+            in sorted(self.stats().items()))
+
+
+class ProfilingInterceptor(Interceptor):
+    """
+    Records each RPC's encode, network and decode time into the profiler of
+    its owner (anything with a _profiler attribute), under the calling
+    thread's current stage, or under 'rpc:<method>' outside any stage.
+
+    The profiler is taken when the call starts, so a call in flight while
+    profiling is switched on or off is recorded into the profiler in use
+    when it started, if any.
+    """
+
+    def __init__(self, owner):
+        self._owner = owner
+
+    def before(self, call):
+        call.context[self] = self._owner._profiler
+
+    def after(self, call):
+        profiler = call.context.pop(self, None)
+        if profiler is None or not profiler.enabled:
+            return
+        prefix = () if profiler.in_stage() else ('rpc:' + call.method,)
+        if call.network_time is None:
+            profiler.record(prefix + ('rpc',), call.duration)
+            return
+        profiler.record(prefix + ('encode',), call.encode_time)
+        profiler.record(prefix + ('network',), call.network_time)
+        profiler.record(prefix + ('decode',), call.decode_time)
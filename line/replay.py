@@ -0,0 +1,254 @@
+from threading import Lock
+from collections import deque
+import io
+import logging
+import struct
+import time
+
+from thrift.transport import TTransport
+
+
+logger = logging.getLogger('LineClient')
+
+
+# record header: request time, method name length, reply length
+_HEADER = struct.Struct('!dHI')
+
+
+def _method_name(request):
+    """Extracts the method name from a TCompactProtocol call message."""
+    request = bytearray(request[:300])
+    pos = 2  # protocol id, version and type
+    for skip in range(2):  # seqid, then the name length
+        value = shift = 0
+        while True:
+            byte = request[pos]
+            pos += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+    return bytes(request[pos:pos + value]).decode('utf-8')
+
+
+def read_records(path):
+    """Yields (time, method, reply bytes) records from a recording."""
+    with io.open(path, 'rb') as f:
+        while True:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            timestamp, method_len, reply_len = _HEADER.unpack(header)
+            method = f.read(method_len).decode('utf-8')
+            yield timestamp, method, f.read(reply_len)
+
+
+class Recorder(object):
+    """
+    Appends the raw TCompactProtocol replies received by LineClient to a
+    file, one record per RPC: a fixed header (request time, lengths), the
+    method name, then the reply bytes.
+
+    Only methods in `methods` are recorded, or all if None. Replaying into a
+    LineClient needs at least the calls made while constructing it
+    (loginWithIdentityCredentialForCertificate, getLastOpRevision,
+    getAllContactIds, getContacts and getProfile). Recordings contain the
+    session's auth token and message contents.
+
+    Use as LineClient(email, password,
+                      transport_factory=recorder.transport_factory).
+    """
+
+    def __init__(self, path, methods=None):
+        self._file = io.open(path, 'ab')
+        self._methods = None if methods is None else frozenset(methods)
+        self._lock = Lock()
+        self._transports = []
+
+    def transport_factory(self, uri):
+        from thrift.transport import THttpClient
+        return RecordingTransport(THttpClient.THttpClient(uri), self)
+
+    def _register(self, transport):
+        with self._lock:
+            self._transports.append(transport)
+
+    def wants(self, method):
+        return self._methods is None or method in self._methods
+
+    def append(self, timestamp, method, reply):
+        name = method.encode('utf-8')
+        with self._lock:
+            self._file.write(_HEADER.pack(timestamp, len(name), len(reply)))
+            self._file.write(name)
+            self._file.write(reply)
+            self._file.flush()
+
+    def close(self):
+        """
+        Writes out the last reply read by each transport (normally written
+        when the transport's next request starts) and closes the file.
+        """
+        with self._lock:
+            transports, self._transports = self._transports, []
+        for transport in transports:
+            transport._finish_reply()
+        with self._lock:
+            self._file.close()
+
+
+class RecordingTransport(TTransport.TTransportBase):
+    """
+    Wraps a THttpClient, passing each reply read through it to a Recorder
+    once the next request starts (or the transport is closed).
+    """
+
+    def __init__(self, transport, recorder):
+        self._trans = transport
+        self._recorder = recorder
+        self._request = []
+        self._reply = None  # list of chunks, if recording a reply
+        self._method = None
+        self._time = None
+        recorder._register(self)
+
+    def setCustomHeaders(self, headers):
+        self._trans.setCustomHeaders(headers)
+
+    def isOpen(self):
+        return self._trans.isOpen()
+
+    def open(self):
+        return self._trans.open()
+
+    def close(self):
+        self._finish_reply()
+        return self._trans.close()
+
+    def _finish_reply(self):
+        if self._reply is not None:
+            self._recorder.append(self._time, self._method,
+                                  b''.join(self._reply))
+            self._reply = None
+
+    def read(self, sz):
+        data = self._trans.read(sz)
+        if self._reply is not None:
+            self._reply.append(data)
+        return data
+
+    def write(self, buf):
+        if not self._request:
+            self._finish_reply()
+        self._request.append(buf)
+        self._trans.write(buf)
+
+    def flush(self):
+        request = b''.join(self._request)
+        self._request = []
+        self._finish_reply()
+
+        self._method = _method_name(request) if request else None
+        self._time = time.time()
+        if self._method is not None and self._recorder.wants(self._method):
+            self._reply = []
+        self._trans.flush()
+
+
+class ReplayLog(object):
+    """
+    A loaded recording, served per method in recorded order to any number
+    of ReplayTransports.
+
+    Replies are paced by their recorded request times: at the recorded
+    rate if speed is 1, proportionally faster for larger values, or as fast
+    as possible if speed is None.
+
+    Use as LineClient(email, password,
+                      transport_factory=log.transport_factory).
+    """
+
+    def __init__(self, path, speed=1.0):
+        self._replies = {}  # method -> deque of (time, reply)
+        self._speed = speed
+        self._lock = Lock()
+        self._first = None
+        self._started = None
+
+        records = {}
+        for timestamp, method, reply in read_records(path):
+            records.setdefault(method, []).append((timestamp, reply))
+
+        # replies are written when complete, so restore request order
+        for method, replies in records.items():
+            replies.sort(key=lambda record: record[0])
+            self._replies[method] = deque(replies)
+            if self._first is None or replies[0][0] < self._first:
+                self._first = replies[0][0]
+
+    def transport_factory(self, uri):
+        return ReplayTransport(self)
+
+    @property
+    def exhausted(self):
+        """True once every recorded reply has been served."""
+        with self._lock:
+            return not any(self._replies.values())
+
+    def remaining(self, method):
+        with self._lock:
+            return len(self._replies.get(method, ()))
+
+    def next_reply(self, method):
+        """
+        Returns the next recorded reply to method, after waiting until it is
+        due. Raises EOFError if there is none, which LineClient.long_poll
+        treats like a long-poll timeout.
+        """
+        with self._lock:
+            replies = self._replies.get(method)
+            if not replies:
+                raise EOFError('no recorded reply left for ' + method)
+            timestamp, reply = replies.popleft()
+            if self._started is None:
+                self._started = time.time()
+
+        if self._speed:
+            delay = self._started + (timestamp - self._first) / self._speed \
+                - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        return reply
+
+
+class ReplayTransport(TTransport.TTransportBase):
+    """Transport answering each request with the next recorded reply."""
+
+    def __init__(self, log):
+        self._log = log
+        self._request = []
+        self._reply = TTransport.TMemoryBuffer(b'')
+
+    def setCustomHeaders(self, headers):
+        pass
+
+    def isOpen(self):
+        return True
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def read(self, sz):
+        return self._reply.read(sz)
+
+    def write(self, buf):
+        self._request.append(buf)
+
+    def flush(self):
+        request = b''.join(self._request)
+        self._request = []
+        self._reply = TTransport.TMemoryBuffer(
+            self._log.next_reply(_method_name(request)))
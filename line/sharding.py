@@ -0,0 +1,180 @@
+from threading import Thread, Lock
+import logging
+import multiprocessing
+import struct
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from thrift.transport import TTransport
+from thrift.protocol import TCompactProtocol
+from linethrift import Line
+
+from .clientpool import LineClientPool
+from .line import LineClient
+from .util import to_bytes
+
+
+logger = logging.getLogger('LineClient')
+
+
+# record header: event type, then lengths of account email and group id
+_HEADER = struct.Struct('!BHH')
+
+
+def encode_event(email, event):
+    """
+    Encodes a (type, conversation, arg) event from LineClient.long_poll as
+    a compact record: a small header, the account email and group id, then
+    for a new message event the message as TCompactProtocol bytes, or for a
+    read event the reader's mid.
+    """
+    type, conv, arg = event
+    email, group = to_bytes(email), to_bytes(conv.group)
+
+    if type == LineClient.EVENT_READ:
+        payload = to_bytes(arg)
+    else:
+        buf = TTransport.TMemoryBuffer()
+        arg._to_thrift().write(TCompactProtocol.TCompactProtocol(buf))
+        payload = buf.getvalue()
+    return b''.join((_HEADER.pack(type, len(email), len(group)),
+                     email, group, payload))
+
+
+def decode_event(record, decode_message=True):
+    """
+    Inverse of encode_event: returns (email, type, group, arg). For a new
+    message event, arg is a Line.Message, or its raw TCompactProtocol bytes
+    if decode_message is False; for a read event, it is the reader's mid.
+    """
+    type, email_len, group_len = _HEADER.unpack_from(record)
+    pos = _HEADER.size
+    email = record[pos:pos + email_len].decode('utf-8')
+    pos += email_len
+    group = record[pos:pos + group_len].decode('utf-8')
+    pos += group_len
+
+    arg = record[pos:]
+    if type == LineClient.EVENT_READ:
+        arg = arg.decode('utf-8')
+    elif decode_message:
+        buf = TTransport.TMemoryBuffer(arg)
+        arg = Line.Message()
+        arg.read(TCompactProtocol.TCompactProtocol(buf))
+    return email, type, group, arg
+
+
+def _shard_main(accounts, conn, handler, poll_threads, login_interval):
+    """Entry point of a shard's worker process."""
+    emails = {}  # LineClient -> account email
+    sendmutex = Lock()  # poll threads share the pipe
+
+    def registrar(email):
+        def done(future):
+            if future.exception() is None:
+                emails[future.result()] = email
+        return done
+
+    def on_event(client, event):
+        if handler is not None:
+            try:
+                handler(client, event)
+            except Exception:
+                logger.exception('exception in shard event handler')
+        record = encode_event(emails[client], event)
+        with sendmutex:
+            conn.send_bytes(record)
+
+    pool = LineClientPool(poll_threads, login_interval, on_event)
+    for email, password in accounts:
+        pool.add_account(email, password).add_done_callback(registrar(email))
+    pool.start()
+    pool.join()
+
+
+class ShardedRunner(object):
+    """
+    Spreads accounts over several worker processes, so that decoding
+    fetchOperations replies, building LineMessages and running handlers is
+    not limited to one core by the GIL.
+
+    Each worker process runs a LineClientPool for its share of the
+    accounts. If a handler is given, it is called as handler(client, event)
+    in the worker process that owns the account; it must be picklable (a
+    module-level function). Every event is also sent to the coordinating
+    process over a pipe as a compact record (see encode_event), and can be
+    consumed there with events().
+    """
+
+    def __init__(self, accounts, processes=None, handler=None,
+                 poll_threads=None, login_interval=1.0):
+        """accounts is a list of (email, password) pairs."""
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        processes = max(1, min(processes, len(accounts)))
+
+        self._records = queue.Queue()
+        self._processes = []
+        self._readers = []
+        for i in range(processes):
+            reader, writer = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(
+                target=_shard_main,
+                args=(accounts[i::processes], writer, handler,
+                      poll_threads, login_interval),
+                name='LineShard-{}'.format(i))
+            process.daemon = True
+            self._processes.append((process, reader, writer))
+
+    def start(self):
+        for process, reader, writer in self._processes:
+            process.start()
+            writer.close()  # only the child writes
+
+            thread = Thread(target=self._read_loop, args=(reader,))
+            thread.daemon = True
+            thread.start()
+            self._readers.append(thread)
+
+    def stop(self):
+        """Terminates the worker processes."""
+        for process, reader, writer in self._processes:
+            process.terminate()
+        for process, reader, writer in self._processes:
+            process.join()
+
+    def records(self, timeout=None):
+        """
+        Yields raw event records from all shards as they arrive. Stops after
+        timeout seconds without records, or once every shard has exited.
+        """
+        live = len(self._readers)
+        while live:
+            try:
+                record = self._records.get(timeout=timeout)
+            except queue.Empty:
+                return
+            if record is None:
+                live -= 1
+                continue
+            yield record
+
+    def events(self, timeout=None, decode_message=True):
+        """
+        Yields (email, type, group, arg) tuples from all shards; see
+        decode_event.
+        """
+        for record in self.records(timeout):
+            yield decode_event(record, decode_message)
+
+    def _read_loop(self, reader):
+        try:
+            while True:
+                self._records.put(reader.recv_bytes())
+        except (EOFError, IOError):
+            pass
+        finally:
+            self._records.put(None)
@@ -0,0 +1,117 @@
+from threading import Lock
+from collections import OrderedDict, namedtuple
+import io
+import os
+import tempfile
+
+from .downloads import DiskCache, HttpPool
+
+
+STICKER_URL = ('http://dl.stickershop.line.naver.jp'
+               '/products/{}/{}/{}/{}/PC/stickers/{}.png')
+
+DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(),
+                                 'python-line-stickers')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MEMORY_BYTES = 16 * 1024 * 1024
+
+
+class Sticker(namedtuple('Sticker', 'package_id sticker_id version')):
+    """Identifies a sticker image; taken from a message's contentMetadata."""
+
+    __slots__ = ()
+
+    @classmethod
+    def from_metadata(cls, metadata):
+        """Returns the Sticker described by contentMetadata, or None."""
+        if not metadata or 'STKID' not in metadata:
+            return None
+        return cls(metadata.get('STKPKGID'), metadata['STKID'],
+                   int(metadata.get('STKVER') or 0))
+
+    @property
+    def url(self):
+        version = self.version
+        return STICKER_URL.format(version // 1000000, version // 1000,
+                                  version % 1000, self.package_id,
+                                  self.sticker_id)
+
+    @property
+    def key(self):
+        return 'sticker:{}:{}:{}'.format(self.package_id, self.sticker_id,
+                                         self.version)
+
+
+class StickerCache(object):
+    """
+    Sticker images, downloaded once into a DiskCache and kept in a bounded
+    in-memory LRU of up to memory_bytes.
+
+    A sticker's package, ID and version identify its image, which never
+    changes, so entries don't need invalidating. Concurrent requests for
+    the same sticker share one download.
+    """
+
+    def __init__(self, cache, memory_bytes=DEFAULT_MEMORY_BYTES, pool=None):
+        self._cache = cache
+        self._pool = pool or HttpPool()
+        self._memory_bytes = memory_bytes
+        self._memory = OrderedDict()  # key -> image data, oldest first
+        self._memory_used = 0
+        self._lock = Lock()
+
+    @property
+    def cache(self):
+        return self._cache
+
+    def path(self, sticker):
+        """
+        Returns the local path of a Sticker's image, downloading it first
+        if needed.
+        """
+        url = sticker.url
+
+        def write(f):
+            f.write(self._pool.fetch(url))
+
+        return self._cache.fetch(sticker.key, write)
+
+    def image(self, sticker):
+        """Returns a Sticker's PNG image data."""
+        key = sticker.key
+        with self._lock:
+            data = self._memory.pop(key, None)
+            if data is not None:
+                self._memory[key] = data  # now the most recently used
+                return data
+
+        with io.open(self.path(sticker), 'rb') as f:
+            data = f.read()
+
+        with self._lock:
+            if key not in self._memory:
+                self._memory[key] = data
+                self._memory_used += len(data)
+            while self._memory_used > self._memory_bytes and self._memory:
+                old_key, old = self._memory.popitem(last=False)
+                self._memory_used -= len(old)
+        return data
+
+
+_default = None
+_default_lock = Lock()
+
+
+def default_stickers(directory=None, max_bytes=DEFAULT_MAX_BYTES,
+                     memory_bytes=DEFAULT_MEMORY_BYTES):
+    """
+    Returns the StickerCache shared by every LineClient in the process,
+    created with the given settings on the first call.
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = StickerCache(
+                DiskCache(directory or DEFAULT_DIRECTORY, max_bytes),
+                memory_bytes)
+        return _default
@@ -0,0 +1,305 @@
+import random
+import time
+
+from thrift.Thrift import TMessageType
+from thrift.transport import TTransport
+from thrift.protocol import TCompactProtocol
+from linethrift import Line
+
+from .replay import _method_name
+
+
+OT = Line.OperationType
+
+DEFAULT_MIX = {
+    OT.RECEIVE_MESSAGE: 0.6,
+    OT.SEND_MESSAGE: 0.15,
+    OT.RECEIVE_MESSAGE_RECEIPT: 0.12,
+    OT.NOTIFIED_READ_MESSAGE: 0.08,
+    OT.NOTIFIED_UPDATE_GROUP: 0.03,
+    OT.NOTIFIED_INVITE_INTO_GROUP: 0.02,
+}
+
+_WORDS = ('ok', 'yes', 'no', 'lol', 'see', 'you', 'tomorrow', 'meeting',
+          'at', 'the', 'station', 'thanks', 'where', 'are', 'we', 'going',
+          'dinner', 'tonight', 'sounds', 'good', 'photo', 'haha', 'wait',
+          'coming', 'now', 'sorry', 'late', 'train', 'again', 'what', 'time')
+
+
+def _mid(rng, prefix):
+    return prefix + '%032x' % rng.getrandbits(128)
+
+
+class OperationGenerator(object):
+    """
+    Seeded generator of realistic fetchOperations batches, for pushing
+    large volumes of operations through LineClient.long_poll.
+
+    The account has `contacts` contacts and `groups` groups. Operation
+    types are drawn from `mix` (type -> weight, DEFAULT_MIX by default).
+    A message carries text of text_length characters, or with probability
+    image_ratio an image preview of image_size bytes. Batches hold
+    batch_size operations. With probability burst_probability a batch is
+    instead a burst of burst_size messages in a single group.
+    Sizes are (min, max) ranges.
+    """
+
+    def __init__(self, seed=0, contacts=100, groups=10, mix=None,
+                 text_length=(1, 120), image_ratio=0.05,
+                 image_size=(2000, 20000), batch_size=(1, 20),
+                 burst_probability=0.05, burst_size=(50, 500),
+                 start_revision=1, start_time=None):
+        self._rng = rng = random.Random(seed)
+        self._mix = sorted((mix or DEFAULT_MIX).items())
+        self._total_weight = float(sum(w for t, w in self._mix))
+        self._text_length = text_length
+        self._image_ratio = image_ratio
+        self._image_size = image_size
+        self._batch_size = batch_size
+        self._burst_probability = burst_probability
+        self._burst_size = burst_size
+
+        self.me = _mid(rng, 'u')
+        self.contact_mids = [_mid(rng, 'u') for i in range(contacts)]
+        self.group_mids = [_mid(rng, 'c') for i in range(groups)]
+
+        self.revision = start_revision
+        self._time = int((start_time or time.time()) * 1000)
+        self._message_id = rng.randint(10 ** 12, 10 ** 13)
+        self._recent_ids = []  # for receipts
+
+        # image previews are slices of one seeded block of random bytes
+        self._noise = bytes(bytearray(
+            rng.getrandbits(8) for i in range(image_size[1])))
+
+    def contacts(self):
+        """Returns a Line.Contact for each contact."""
+        return [Line.Contact(mid=mid, displayName='contact {}'.format(i),
+                             statusMessage='', pictureStatus='0')
+                for i, mid in enumerate(self.contact_mids)]
+
+    def profile(self):
+        return Line.Profile(mid=self.me, displayName='me', statusMessage='')
+
+    def _text(self):
+        length = self._rng.randint(*self._text_length)
+        words = []
+        while sum(len(w) + 1 for w in words) < length:
+            words.append(self._rng.choice(_WORDS))
+        return ' '.join(words)[:length]
+
+    def message(self, frm=None, to=None):
+        """
+        Returns a new Line.Message, sent to or from the user (or in a random
+        group) unless frm and to are given.
+        """
+        rng = self._rng
+        if frm is None and to is None:
+            if self.group_mids and rng.random() < 0.5:
+                frm, to = rng.choice(self.contact_mids), \
+                    rng.choice(self.group_mids)
+            else:
+                frm, to = rng.choice(self.contact_mids), self.me
+
+        self._message_id += 1
+        self._time += rng.randint(0, 2000)
+        to_type = Line.ToType.GROUP if to in self.group_mids else \
+            Line.ToType.USER
+        msg = Line.Message(frm=frm, to=to, toType=to_type,
+                           id=str(self._message_id),
+                           createdTime=self._time, deliveredTime=self._time)
+
+        if rng.random() < self._image_ratio:
+            size = rng.randint(*self._image_size)
+            offset = rng.randint(0, len(self._noise) - size)
+            msg.contentType = Line.ContentType.IMAGE
+            msg.hasContent = True
+            msg.contentPreview = self._noise[offset:offset + size]
+        else:
+            msg.contentType = Line.ContentType.NONE
+            msg.text = self._text()
+
+        self._recent_ids = (self._recent_ids + [(to, msg.id)])[-100:]
+        return msg
+
+    def operation(self, type=None):
+        """Returns a new Line.Operation, of a random type if not given."""
+        rng = self._rng
+        if type is None:
+            pick = rng.random() * self._total_weight
+            for type, weight in self._mix:
+                pick -= weight
+                if pick < 0:
+                    break
+
+        self.revision += 1
+        op = Line.Operation(revision=self.revision, createdTime=self._time,
+                            type=type)
+
+        if type == OT.RECEIVE_MESSAGE:
+            op.message = self.message()
+        elif type == OT.SEND_MESSAGE:
+            to = rng.choice(self.contact_mids + self.group_mids)
+            op.message = self.message(frm=self.me, to=to)
+        elif type in (OT.RECEIVE_MESSAGE_RECEIPT, OT.NOTIFIED_READ_MESSAGE):
+            # receipts refer to a message, so stay bare until there is one
+            if self._recent_ids:
+                chat, message_id = rng.choice(self._recent_ids)
+                if type == OT.RECEIVE_MESSAGE_RECEIPT:
+                    op.param1 = rng.choice(self.contact_mids)
+                    op.param2 = message_id
+                else:
+                    op.param1 = chat
+                    op.param2 = rng.choice(self.contact_mids)
+                    op.param3 = message_id
+        elif self.group_mids:
+            op.param1 = rng.choice(self.group_mids)
+            op.param2 = rng.choice(self.contact_mids)
+        return op
+
+    def batch(self):
+        """Returns the next list of operations for one fetchOperations."""
+        rng = self._rng
+        if self.group_mids and rng.random() < self._burst_probability:
+            group = rng.choice(self.group_mids)
+            ops = []
+            for i in range(rng.randint(*self._burst_size)):
+                self.revision += 1
+                ops.append(Line.Operation(
+                    revision=self.revision, createdTime=self._time,
+                    type=OT.RECEIVE_MESSAGE,
+                    message=self.message(rng.choice(self.contact_mids),
+                                         group)))
+            return ops
+
+        return [self.operation()
+                for i in range(rng.randint(*self._batch_size))]
+
+    def serialized_batches(self, n):
+        """Returns n batches as serialized fetchOperations replies."""
+        return [serialize_reply('fetchOperations', self.batch())
+                for i in range(n)]
+
+
+def serialize_reply(method, success, seqid=0):
+    """Encodes a successful reply to method with TCompactProtocol."""
+    buf = TTransport.TMemoryBuffer()
+    protocol = TCompactProtocol.TCompactProtocol(buf)
+    protocol.writeMessageBegin(method, TMessageType.REPLY, seqid)
+    getattr(Line, method + '_result')(success=success).write(protocol)
+    protocol.writeMessageEnd()
+    return buf.getvalue()
+
+
+class SyntheticService(object):
+    """
+    In-process stand-in for the LINE servers, backed by an
+    OperationGenerator: logins succeed, contacts and history come from the
+    generator, and sent messages are echoed back.
+
+    fetchOperations replies come from `batches`, a list of pre-serialized
+    replies (see OperationGenerator.serialized_batches), so that encoding
+    them does not count against the client being measured. Once those run
+    out, fetchOperations behaves like a long-poll timeout.
+    """
+
+    def __init__(self, generator, batches=(), history=1000):
+        self.generator = generator
+        self.batches = list(batches)
+        self._next = 0
+        # getPreviousMessages serves message IDs down to this one
+        self._first_id = generator._message_id - history
+
+    def transport_factory(self, uri):
+        return SyntheticTransport(self)
+
+    def next_batch(self):
+        if self._next >= len(self.batches):
+            raise EOFError('no synthetic batches left')
+        self._next += 1
+        return self.batches[self._next - 1]
+
+    def loginWithIdentityCredentialForCertificate(self, *args):
+        return Line.LoginResult(authToken='synthetic', type=1)
+
+    def getProfile(self):
+        return self.generator.profile()
+
+    def getAllContactIds(self):
+        return list(self.generator.contact_mids)
+
+    def getContacts(self, ids):
+        ids = set(ids)
+        return [c for c in self.generator.contacts() if c.mid in ids]
+
+    def getLastOpRevision(self):
+        return self.generator.revision
+
+    def getRecentMessages(self, gid, count):
+        gen = self.generator
+        return [gen.message(gen._rng.choice(gen.contact_mids), gid)
+                for i in range(count)][::-1]
+
+    def getPreviousMessages(self, gid, end_seq, count):
+        gen = self.generator
+        messages = []
+        for message_id in range(end_seq - 1,
+                                max(end_seq - 1 - count, self._first_id), -1):
+            message = gen.message(gen._rng.choice(gen.contact_mids), gid)
+            message.id = str(message_id)
+            message.createdTime = message.deliveredTime = \
+                gen._time - (gen._message_id - message_id) * 1000
+            messages.append(message)
+        return messages
+
+    def sendMessage(self, seq, message):
+        gen = self.generator
+        sent = gen.message(gen.me, message.to)
+        sent.text = message.text
+        return sent
+
+    def sendChatChecked(self, seq, consumer, lastMessageId):
+        pass
+
+
+class SyntheticTransport(TTransport.TTransportBase):
+    """Transport answering requests from a SyntheticService in-process."""
+
+    def __init__(self, service):
+        self._service = service
+        self._processor = Line.Processor(service)
+        self._request = []
+        self._reply = TTransport.TMemoryBuffer(b'')
+
+    def setCustomHeaders(self, headers):
+        pass
+
+    def isOpen(self):
+        return True
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def read(self, sz):
+        return self._reply.read(sz)
+
+    def write(self, buf):
+        self._request.append(buf)
+
+    def flush(self):
+        request = b''.join(self._request)
+        self._request = []
+
+        if _method_name(request) == 'fetchOperations':
+            reply = self._service.next_batch()
+        else:
+            out = TTransport.TMemoryBuffer()
+            self._processor.process(
+                TCompactProtocol.TCompactProtocol(
+                    TTransport.TMemoryBuffer(request)),
+                TCompactProtocol.TCompactProtocol(out))
+            reply = out.getvalue()
+        self._reply = TTransport.TMemoryBuffer(reply)
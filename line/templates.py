@@ -0,0 +1,105 @@
+from thrift.Thrift import TMessageType
+from thrift.transport import TTransport
+from thrift.protocol import TCompactProtocol
+from linethrift import Line
+
+from .util import to_bytes
+
+
+def _varint(n):
+    out = bytearray()
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _zigzag32(n):
+    return ((n << 1) ^ (n >> 31)) & 0xffffffff
+
+
+_TCP = TCompactProtocol.TCompactProtocol
+_CALL_HEAD = bytes(bytearray([
+    _TCP.PROTOCOL_ID,
+    _TCP.VERSION | (TMessageType.CALL << _TCP.TYPE_SHIFT_AMOUNT)]))
+_METHOD_NAME = _varint(len(b'sendMessage')) + b'sendMessage'
+
+# compact protocol field headers, i.e. (field id delta << 4) | type
+_SEQ_FIELD = b'\x15'  # sendMessage_args.seq: delta 1, i32
+_MESSAGE_FIELD = b'\x1c'  # sendMessage_args.message: delta 1, struct
+_TO_FIELD = b'\x28'  # Message.to: delta 2 (frm unset), binary
+_STOP = b'\x00'
+
+
+class MessageTemplate(object):
+    """
+    A sendMessage call serialized once, with everything except the
+    recipient and seq already encoded with TCompactProtocol.
+
+    Encoding a call for a recipient only concatenates a few byte strings
+    rather than running the generic Message.write.
+    """
+
+    def __init__(self, text=None, **fields):
+        """
+        text and fields are those of Line.Message; 'to' and 'frm' are not
+        allowed since the recipient is spliced in per call.
+        """
+        if 'to' in fields or 'frm' in fields:
+            raise ValueError("templates cannot set 'to' or 'frm'")
+
+        self._message = Line.Message(text=text, **fields)
+
+        # Serialize with a placeholder recipient, and keep only what follows
+        # the 'to' field (including the struct's stop byte).
+        placeholder = '?'
+        msg = Line.Message(to=placeholder, text=text, **fields)
+        buf = TTransport.TMemoryBuffer()
+        msg.write(TCompactProtocol.TCompactProtocol(buf))
+        encoded = buf.getvalue()
+
+        head = _TO_FIELD + _varint(1) + to_bytes(placeholder)
+        assert encoded.startswith(head)
+        self._tail = encoded[len(head):] + _STOP  # + stop of the args struct
+
+    @property
+    def text(self):
+        return self._message.text
+
+    def message(self, to):
+        """Returns an equivalent Line.Message addressed to the given mid."""
+        msg = Line.Message(**self._message.__dict__)
+        msg.to = to
+        return msg
+
+    def encode(self, to, seq=0, seqid=0):
+        """Returns the serialized sendMessage call for the given recipient."""
+        to = to_bytes(to)
+        return b''.join((
+            _CALL_HEAD, _varint(seqid & 0xffffffff), _METHOD_NAME,
+            _SEQ_FIELD, _varint(_zigzag32(seq)),
+            _MESSAGE_FIELD, _TO_FIELD, _varint(len(to)), to,
+            self._tail))
+
+    def send(self, client, to, seq=0):
+        """
+        Sends the message to the given mid using a Line.Client, and returns
+        the Line.Message returned by the server.
+
+        With a TracedClient, interceptors see the call as a sendMessage of
+        the equivalent Line.Message.
+        """
+        def write(client, *args):
+            trans = client._oprot.trans
+            trans.write(self.encode(to, seq, client._seqid))
+            trans.flush()
+
+        owner = getattr(client, '_owner', None)
+        interceptors = owner._interceptors if owner is not None else ()
+        if not interceptors:
+            write(client)
+            return client.recv_sendMessage()
+        return client._call_intercepted(
+            'sendMessage', write, Line.Client.recv_sendMessage,
+            (seq, self.message(to)), interceptors)
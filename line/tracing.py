@@ -0,0 +1,186 @@
+import logging
+import random
+import time
+
+from linethrift import Line
+
+from .metrics import MeteredTransport
+
+
+logger = logging.getLogger('LineClient')
+
+
+class RpcCall(object):
+    """
+    Describes one Line.Client call, as passed to Interceptor.before and
+    Interceptor.after.
+
+    Times are from time.time(); durations are in seconds. When the client's
+    transport is a MeteredTransport, the call is split into encode_time
+    (serializing the request), network_time (sending it and blocking on
+    reads of the reply) and decode_time (deserializing the reply), and the
+    request and reply sizes are filled in; otherwise those are None.
+
+    context is a dict interceptors may use to carry their own state (e.g. a
+    tracing span) from before() to after().
+    """
+
+    def __init__(self, method, args):
+        self.method = method
+        self.args = args
+        self.start = None
+        self.end = None
+        self.encode_time = None
+        self.network_time = None
+        self.decode_time = None
+        self.bytes_out = None
+        self.bytes_in = None
+        self.result = None
+        self.exception = None
+        self.context = {}
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def __str__(self):
+        return '<RpcCall {} ({:.3f}s{})>'.format(
+            self.method, self.duration if self.end else 0,
+            ', failed' if self.exception is not None else '')
+
+    __repr__ = __str__
+
+
+class Interceptor(object):
+    """
+    Base class for hooks around every Line.Client call made through a
+    TracedClient.
+
+    before(call) runs before the request is serialized; raising from it
+    aborts the call with that exception (e.g. for a circuit breaker).
+    after(call) runs once the call has completed or failed; exceptions
+    raised from it are logged and ignored.
+    """
+
+    def before(self, call):
+        pass
+
+    def after(self, call):
+        pass
+
+
+class SamplingInterceptor(Interceptor):
+    """Passes only a random fraction `rate` of calls on to interceptor."""
+
+    def __init__(self, interceptor, rate):
+        self._interceptor = interceptor
+        self._rate = rate
+
+    def before(self, call):
+        if random.random() < self._rate:
+            call.context[self] = True
+            self._interceptor.before(call)
+
+    def after(self, call):
+        if call.context.pop(self, False):
+            self._interceptor.after(call)
+
+
+class RpcMetricsInterceptor(Interceptor):
+    """
+    Records line_rpc_seconds{method, status} into the metrics of its owner
+    (anything with a _metrics attribute, e.g. a LineClient).
+    """
+
+    def __init__(self, owner):
+        self._owner = owner
+
+    def after(self, call):
+        if call.exception is None:
+            status = 'ok'
+        elif isinstance(call.exception, EOFError):
+            status = 'timeout'  # e.g. a long-poll with no operations
+        else:
+            status = 'error'
+        self._owner._metrics.observe('line_rpc_seconds', call.duration,
+                                     method=call.method, status=status)
+
+
+def _traced(name):
+    send = getattr(Line.Client, 'send_' + name)
+    recv = getattr(Line.Client, 'recv_' + name)
+
+    def method(self, *args):
+        interceptors = self._owner._interceptors
+        if not interceptors:
+            send(self, *args)
+            return recv(self)
+        return self._call_intercepted(name, send, recv, args, interceptors)
+
+    method.__name__ = name
+    method.__doc__ = getattr(Line.Client, name).__doc__
+    return method
+
+
+class TracedClient(Line.Client):
+    """
+    Line.Client that reports every call to the interceptors of its owner
+    (anything with an _interceptors sequence, looked up per call so that
+    interceptors can be added and removed at runtime).
+
+    With no interceptors, calls cost one attribute lookup more than with
+    the generated client.
+    """
+
+    def __init__(self, iprot, oprot=None, owner=None):
+        Line.Client.__init__(self, iprot, oprot)
+        self._owner = owner
+
+    def _call_intercepted(self, name, send, recv, args, interceptors):
+        call = RpcCall(name, args)
+        for interceptor in interceptors:
+            interceptor.before(call)
+
+        trans = self._oprot.trans
+        metered = isinstance(trans, MeteredTransport)
+        if metered:
+            trans.timed = True
+            bytes_in, bytes_out = trans.bytes_in, trans.bytes_out
+            read_seconds, flush_seconds = \
+                trans.read_seconds, trans.flush_seconds
+
+        call.start = time.time()
+        sent = None
+        try:
+            send(self, *args)
+            sent = time.time()
+            call.result = recv(self)
+        except Exception as e:
+            call.exception = e
+            raise
+        finally:
+            call.end = time.time()
+            if sent is None:
+                sent = call.end
+            if metered:
+                trans.timed = False
+                flushing = trans.flush_seconds - flush_seconds
+                reading = trans.read_seconds - read_seconds
+                call.network_time = flushing + reading
+                call.encode_time = sent - call.start - flushing
+                call.decode_time = call.end - sent - reading
+                call.bytes_in = trans.bytes_in - bytes_in
+                call.bytes_out = trans.bytes_out - bytes_out
+
+            for interceptor in interceptors:
+                try:
+                    interceptor.after(call)
+                except Exception:
+                    logger.exception('exception in RPC interceptor')
+
+        return call.result
+
+
+for _name in [n for n in vars(Line.Iface) if not n.startswith('_')]:
+    setattr(TracedClient, _name, _traced(_name))
+del _name
@@ -0,0 +1,25 @@
+from array import array
+
+
+try:
+    array('q')
+    INT64 = 'q'
+except ValueError:
+    INT64 = 'd'  # Python 2's array has no 64-bit integers; exact to 2**53
+
+
+def to_bytes(s):
+    """Returns s encoded as UTF-8, unless it already is bytes."""
+    if not isinstance(s, bytes):
+        s = s.encode('utf-8')
+    return s
+
+
+def id_key(message_id):
+    """Ordering key for message IDs, which are increasing decimal strings."""
+    return (len(message_id), message_id)
+
+
+def is_later(message_id, than):
+    """True if message_id comes after than, or than is None."""
+    return than is None or id_key(message_id) > id_key(than)
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+"""
+helpers
+----------------------------------
+
+Fixtures shared by the tests.
+"""
+
+from line.synthetic import SyntheticService
+
+
+class FixedHistoryService(SyntheticService):
+    """
+    SyntheticService serving a fixed history (a list of Line.Messages,
+    oldest first) that tests may extend, and counting the history pages
+    requested from it.
+    """
+
+    def __init__(self, generator, history):
+        SyntheticService.__init__(self, generator)
+        self.history = history
+        self.pages = 0
+
+    def getRecentMessages(self, gid, count):
+        self.pages += 1
+        return self.history[:-count - 1:-1]
+
+    def getPreviousMessages(self, gid, end_seq, count):
+        self.pages += 1
+        older = [m for m in self.history if int(m.id) < end_seq]
+        return older[:-count - 1:-1]
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_clientpool
+----------------------------------
+
+Tests for `clientpool` module.
+"""
+
+import socket
+import threading
+import time
+import unittest
+
+from line.clientpool import LineClientPool
+from line.line import LineClient
+from line.synthetic import OperationGenerator, SyntheticService
+
+
+def _wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class UnreachableClient(object):
+    """Client type whose long-polls fail as if the server was unreachable."""
+
+    def __init__(self, email, password, transport_factory=None):
+        self.polls = 0
+
+    def long_poll(self):
+        self.polls += 1
+        raise socket.error('connection refused')
+
+
+class TestLineClientPool(unittest.TestCase):
+
+    def setUp(self):
+        self._backoff = (LineClientPool.POLL_BACKOFF,
+                         LineClientPool.POLL_BACKOFF_MAX)
+
+    def tearDown(self):
+        LineClientPool.POLL_BACKOFF, LineClientPool.POLL_BACKOFF_MAX = \
+            self._backoff
+
+    def test_polls_accounts_on_fixed_threads(self):
+        services = {}
+        for i in range(4):
+            generator = OperationGenerator(seed=i, image_ratio=0,
+                                           burst_probability=0)
+            services['user{}'.format(i)] = SyntheticService(
+                generator, generator.serialized_batches(5))
+
+        def client_type(email, password, transport_factory):
+            return LineClient(email, password,
+                              transport_factory=services[email]
+                              .transport_factory)
+
+        received = {}
+        lock = threading.Lock()
+
+        def handler(client, event):
+            with lock:
+                received[client] = received.get(client, 0) + 1
+
+        pool = LineClientPool(poll_threads=2, login_interval=0,
+                              handler=handler, client_type=client_type)
+        futures = [pool.add_account(email, 'password')
+                   for email in sorted(services)]
+        pool.start()
+        try:
+            clients = [future.result(5) for future in futures]
+            self.assertTrue(_wait_until(lambda: all(
+                s._next == len(s.batches) for s in services.values())))
+        finally:
+            pool.stop()
+
+        self.assertEqual(len(pool._threads), 3)
+        stats = pool.stats()
+        for email, client in zip(sorted(services), clients):
+            self.assertGreater(received.get(client, 0), 0)
+            self.assertEqual(stats[email]['events'], received[client])
+            self.assertGreaterEqual(stats[email]['polls'], 5)
+
+    def test_failing_account_backs_off(self):
+        LineClientPool.POLL_BACKOFF = 0.05
+        LineClientPool.POLL_BACKOFF_MAX = 0.2
+        pool = LineClientPool(poll_threads=1, login_interval=0,
+                              client_type=UnreachableClient)
+        future = pool.add_account('user', 'password')
+        pool.start()
+        try:
+            client = future.result(5)
+            time.sleep(0.5)
+        finally:
+            pool.stop()
+
+        # 0.05 + 0.1 + 0.2 + 0.2 s of backoff fit in 0.5 s
+        self.assertGreaterEqual(client.polls, 2)
+        self.assertLessEqual(client.polls, 6)
+        stats = pool.stats()['user']
+        self.assertEqual(stats['state'], 'backoff')
+        self.assertIsInstance(stats['error'], socket.error)
+
+    def test_backoff_does_not_hold_up_other_accounts(self):
+        LineClientPool.POLL_BACKOFF = 10.0
+        generator = OperationGenerator(seed=1, image_ratio=0,
+                                       burst_probability=0)
+        service = SyntheticService(generator, generator.serialized_batches(3))
+
+        def client_type(email, password, transport_factory):
+            if email == 'down':
+                return UnreachableClient(email, password)
+            return LineClient(email, password,
+                              transport_factory=service.transport_factory)
+
+        pool = LineClientPool(poll_threads=1, login_interval=0,
+                              client_type=client_type)
+        pool.add_account('down', 'password')
+        pool.add_account('up', 'password')
+        pool.start()
+        try:
+            self.assertTrue(_wait_until(
+                lambda: service._next == len(service.batches)))
+        finally:
+            pool.stop()
+        self.assertEqual(pool.stats()['down']['state'], 'backoff')
+
+    def test_failed_login(self):
+        def client_type(email, password, transport_factory):
+            raise ValueError('bad credentials')
+
+        pool = LineClientPool(login_interval=0, client_type=client_type)
+        future = pool.add_account('user', 'password')
+        pool.start()
+        try:
+            self.assertIsInstance(future.exception(5), ValueError)
+        finally:
+            pool.stop()
+        self.assertEqual(pool.stats()['user']['state'], 'failed')
+
+
+if __name__ == '__main__':
+    unittest.main()
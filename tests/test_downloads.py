@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_downloads
+----------------------------------
+
+Tests for `downloads` module.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from line.downloads import DiskCache
+
+
+class Writer(object):
+    """write(f) callable writing `size` bytes, counting its calls."""
+
+    def __init__(self, size, delay=0, error=None):
+        self.size = size
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, f):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        f.write(b'x' * self.size)
+
+
+class TestDiskCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def files(self):
+        return sorted(name for name in os.listdir(self.directory)
+                      if not name.endswith('.part'))
+
+    def test_put_and_get(self):
+        cache = DiskCache(self.directory, 1000)
+        self.assertIsNone(cache.get('a'))
+        path = cache.put('a', Writer(10))
+        self.assertEqual(cache.get('a'), path)
+        self.assertEqual(os.path.getsize(path), 10)
+        self.assertEqual(cache.size, 10)
+
+    def test_replacing_entry_keeps_size(self):
+        cache = DiskCache(self.directory, 1000)
+        cache.put('a', Writer(10))
+        cache.put('a', Writer(30))
+        self.assertEqual(cache.size, 30)
+        self.assertEqual(len(self.files()), 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = DiskCache(self.directory, 100)
+        for key in 'abc':
+            cache.put(key, Writer(40))
+        # 'a' went over the limit once 'c' was added
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.size, 80)
+
+        cache.get('b')
+        cache.put('d', Writer(40))
+        self.assertIsNotNone(cache.get('b'))
+        self.assertIsNone(cache.get('c'))
+        self.assertEqual(cache.size, 80)
+        self.assertEqual(len(self.files()), 2)
+
+    def test_keeps_entry_larger_than_limit(self):
+        cache = DiskCache(self.directory, 100)
+        cache.put('a', Writer(10))
+        path = cache.put('big', Writer(500))
+        self.assertEqual(cache.get('big'), path)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.size, 500)
+
+    def test_discard(self):
+        cache = DiskCache(self.directory, 1000)
+        path = cache.put('a', Writer(10))
+        cache.discard('a')
+        cache.discard('missing')
+        self.assertIsNone(cache.get('a'))
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(cache.size, 0)
+
+    def test_failed_write_leaves_nothing(self):
+        cache = DiskCache(self.directory, 1000)
+        self.assertRaises(IOError, cache.put, 'a', Writer(10, error=IOError()))
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertEqual(cache.size, 0)
+
+    def test_rebuilds_index_from_disk(self):
+        cache = DiskCache(self.directory, 100)
+        paths = dict((key, cache.put(key, Writer(30))) for key in 'abc')
+        now = time.time()
+        for i, key in enumerate('cab'):  # 'c' least recently used
+            os.utime(paths[key], (now + i, now + i))
+        with open(os.path.join(self.directory, 'stray.part'), 'wb') as f:
+            f.write(b'x' * 50)
+
+        reopened = DiskCache(self.directory, 100)
+        self.assertEqual(reopened.size, 90)
+        self.assertEqual(reopened.get('a'), paths['a'])
+        reopened.put('d', Writer(30))
+        self.assertIsNone(reopened.get('c'))
+        self.assertIsNotNone(reopened.get('b'))
+
+    def test_concurrent_fetches_share_one_write(self):
+        cache = DiskCache(self.directory, 1000)
+        writer = Writer(10, delay=0.1)
+        paths = []
+
+        def fetch():
+            paths.append(cache.fetch('a', writer))
+
+        threads = [threading.Thread(target=fetch) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(writer.calls, 1)
+        self.assertEqual(len(paths), 5)
+        self.assertEqual(len(set(paths)), 1)
+        self.assertEqual(cache.fetch('a', writer), paths[0])
+        self.assertEqual(writer.calls, 1)
+
+    def test_failed_fetch_is_retried(self):
+        cache = DiskCache(self.directory, 1000)
+        self.assertRaises(IOError, cache.fetch, 'a',
+                          Writer(10, error=IOError()))
+        writer = Writer(10)
+        self.assertIsNotNone(cache.fetch('a', writer))
+        self.assertEqual(writer.calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
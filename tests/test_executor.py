@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_executor
+----------------------------------
+
+Tests for `executor` module.
+"""
+
+import threading
+import unittest
+
+from line.executor import RequestExecutor
+
+
+class FakeTransport(object):
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClient(object):
+    def __init__(self, n):
+        self.n = n
+
+    def whoami(self):
+        return self.n
+
+    def echo(self, *args):
+        return args
+
+
+class Factory(object):
+    """Client factory numbering the (transport, client) pairs it creates."""
+
+    def __init__(self):
+        self.created = []
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            pair = (FakeTransport(), FakeClient(len(self.created)))
+            self.created.append(pair)
+            return pair
+
+
+class TestRequestExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = Factory()
+        self.executor = RequestExecutor(self.factory, size=2)
+
+    def test_sequential_calls_reuse_one_connection(self):
+        for i in range(5):
+            self.assertEqual(self.executor.call('whoami'), 0)
+        self.assertEqual(len(self.factory.created), 1)
+
+    def test_initial_connection_is_used_first(self):
+        initial = (FakeTransport(), FakeClient('initial'))
+        executor = RequestExecutor(self.factory, size=2, initial=initial)
+        self.assertEqual(executor.call('whoami'), 'initial')
+        self.assertEqual(self.factory.created, [])
+
+    def test_nested_checkout_reuses_held_client(self):
+        with self.executor.connection() as outer:
+            with self.executor.connection() as inner:
+                self.assertIs(inner, outer)
+            self.assertEqual(self.executor.call('whoami'), outer.n)
+        self.assertEqual(len(self.factory.created), 1)
+
+    def test_concurrent_checkouts_get_distinct_clients(self):
+        with self.executor.connection() as first:
+            result = []
+            thread = threading.Thread(
+                target=lambda: result.append(self.executor.call('whoami')))
+            thread.start()
+            thread.join(5)
+            self.assertEqual(result, [1])
+            self.assertNotEqual(first.n, 1)
+
+    def test_transport_error_discards_connection(self):
+        with self.assertRaises(EOFError):
+            with self.executor.connection():
+                raise EOFError()
+        transport, client = self.factory.created[0]
+        self.assertTrue(transport.closed)
+
+        self.assertEqual(self.executor.call('whoami'), 1)
+        self.assertEqual(len(self.factory.created), 2)
+
+    def test_other_errors_keep_connection(self):
+        with self.assertRaises(ValueError):
+            with self.executor.connection():
+                raise ValueError()
+        transport, client = self.factory.created[0]
+        self.assertFalse(transport.closed)
+        self.assertEqual(self.executor.call('whoami'), 0)
+
+    def test_submit(self):
+        futures = [self.executor.submit('whoami') for i in range(10)]
+        for future in futures:
+            self.assertIn(future.result(5), (0, 1))
+        self.assertLessEqual(len(self.factory.created), 2)
+
+    def test_submit_many(self):
+        args_list = [(i, 'x') for i in range(10)]
+        futures = self.executor.submit_many('echo', args_list)
+        self.assertEqual([future.result(5) for future in futures], args_list)
+        self.assertLessEqual(len(self.factory.created), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_export
+----------------------------------
+
+Tests for `export` module.
+"""
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from line.export import JsonlExporter, ColumnarExporter, read_columnar_chunk
+from line.line import LineClient
+from line.synthetic import OperationGenerator
+
+from tests.helpers import FixedHistoryService
+
+
+def _read_ids(directory, name='messages'):
+    ids = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.startswith(name + '-') and filename.endswith('.jsonl'):
+            with io.open(os.path.join(directory, filename), 'rb') as f:
+                ids.extend(json.loads(line.decode('utf-8'))['id']
+                           for line in f)
+    return ids
+
+
+class ExportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.generator = OperationGenerator(seed=1, image_ratio=0)
+        self.group = self.generator.group_mids[0]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def messages(self, n):
+        generator = self.generator
+        return [generator.message(generator.contact_mids[i % 5], self.group)
+                for i in range(n)]
+
+
+class TestJsonlExporter(ExportTestCase):
+
+    def test_chunks(self):
+        messages = self.messages(25)
+        with JsonlExporter(self.directory, chunk_size=10) as exporter:
+            self.assertEqual(exporter.export(messages), 25)
+        self.assertEqual(
+            sorted(f for f in os.listdir(self.directory)
+                   if f.endswith('.jsonl')),
+            ['messages-000000.jsonl', 'messages-000001.jsonl',
+             'messages-000002.jsonl'])
+        self.assertEqual(_read_ids(self.directory), [m.id for m in messages])
+
+    def test_skips_exported(self):
+        messages = self.messages(10)
+        with JsonlExporter(self.directory) as exporter:
+            exporter.export(messages[:6])
+        with JsonlExporter(self.directory) as exporter:
+            self.assertEqual(exporter.last_id, messages[5].id)
+            self.assertEqual(exporter.export(messages), 4)
+        self.assertEqual(_read_ids(self.directory), [m.id for m in messages])
+
+    def test_resume_truncates_after_checkpoint(self):
+        messages = self.messages(25)
+        exporter = JsonlExporter(self.directory, checkpoint=10)
+        exporter.export(messages)
+        exporter._file.flush()
+        # interrupted: the last 5 messages were written but not checkpointed
+        self.assertEqual(len(_read_ids(self.directory)), 25)
+
+        with JsonlExporter(self.directory, checkpoint=10) as resumed:
+            self.assertEqual(resumed.last_id, messages[19].id)
+            self.assertEqual(len(_read_ids(self.directory)), 20)
+            self.assertEqual(resumed.export(messages), 5)
+        exporter._file.close()
+        self.assertEqual(_read_ids(self.directory), [m.id for m in messages])
+
+
+class TestColumnarExporter(ExportTestCase):
+
+    def test_round_trip(self):
+        messages = self.messages(25)
+        with ColumnarExporter(self.directory, chunk_size=10) as exporter:
+            exporter.export(messages[:15])
+        with ColumnarExporter(self.directory, chunk_size=10) as exporter:
+            self.assertEqual(exporter.last_id, messages[14].id)
+            self.assertEqual(exporter.export(messages), 10)
+
+        exported = []
+        for chunk in range(3):
+            header, columns = read_columnar_chunk(os.path.join(
+                self.directory, 'messages-{:06d}.cols'.format(chunk)))
+            for i, message_id in enumerate(header['ids']):
+                start = columns['text_offset'][i]
+                text = columns['text'][start:start +
+                                       columns['text_length'][i]]
+                exported.append((
+                    message_id, header['mids'][columns['sender'][i]],
+                    int(columns['created_time'][i]),
+                    bytes(text).decode('utf-8')))
+        self.assertEqual(exported,
+                         [(m.id, m.frm, m.createdTime, m.text or u'')
+                          for m in messages])
+
+
+class TestConversationExport(ExportTestCase):
+
+    def setUp(self):
+        ExportTestCase.setUp(self)
+        self.service = FixedHistoryService(self.generator,
+                                           self.messages(300))
+        self.client = LineClient(
+            'user', 'password',
+            transport_factory=self.service.transport_factory)
+        self.client.update_conversation(self.group, 5)
+        self.conversation = self.client.conversation(self.group)
+
+    def export(self, **kwargs):
+        with JsonlExporter(self.directory) as exporter:
+            return self.conversation.export(exporter, **kwargs)
+
+    def test_exports_whole_history_oldest_first(self):
+        self.service.pages = 0
+        count = self.export(page_size=40)
+        ids = _read_ids(self.directory)
+        self.assertEqual(count, 300)
+        self.assertEqual(ids, [m.id for m in self.service.history])
+        # walked backwards in 8 pages, the 7 newer ones fetched again
+        self.assertEqual(self.service.pages, 8 + 7)
+
+    def test_resume_stops_at_last_exported(self):
+        self.export(page_size=40)
+        self.service.history.extend(self.messages(50))
+        self.service.pages = 0
+        self.assertEqual(self.export(page_size=40), 50)
+
+        self.assertEqual(self.service.pages, 2 + 1)
+        self.assertEqual(_read_ids(self.directory),
+                         [m.id for m in self.service.history])
+
+    def test_stored(self):
+        self.assertEqual(self.export(stored=True), 5)
+        self.assertEqual(
+            _read_ids(self.directory),
+            [m.id for m in reversed(self.conversation.last_messages())])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_history
+----------------------------------
+
+Tests for `history` module.
+"""
+
+import unittest
+
+from line.history import MessageStore
+
+
+class Message(object):
+    def __init__(self, id):
+        self.id = id
+
+    def __repr__(self):
+        return '<Message {}>'.format(self.id)
+
+
+def _messages(*ids):
+    return [Message(str(i)) for i in ids]
+
+
+def _ids(messages):
+    return [int(m.id) for m in messages]
+
+
+class TestMessagesView(unittest.TestCase):
+
+    def setUp(self):
+        self.store = MessageStore()
+        self.store.add_newer(_messages(13, 14, 15))
+        self.store.add_older(_messages(12, 11, 10))
+
+    def test_iteration(self):
+        view = self.store.view()
+        self.assertEqual(len(view), 6)
+        self.assertEqual(_ids(view), [15, 14, 13, 12, 11, 10])
+        self.assertEqual(_ids(reversed(view)), [10, 11, 12, 13, 14, 15])
+
+    def test_indexing(self):
+        view = self.store.view()
+        self.assertEqual(_ids(view[i] for i in range(6)),
+                         [15, 14, 13, 12, 11, 10])
+        self.assertEqual(int(view[-1].id), 10)
+        self.assertEqual(int(view[-4].id), 13)
+        self.assertRaises(IndexError, lambda: view[6])
+        self.assertRaises(IndexError, lambda: view[-7])
+
+    def test_slices(self):
+        view = self.store.view()
+        self.assertEqual(_ids(view[1:4]), [14, 13, 12])
+        self.assertEqual(_ids(view[::2]), [15, 13, 11])
+        self.assertEqual(_ids(view[-2:]), [11, 10])
+        self.assertEqual(view[10:], [])
+
+    def test_newest_n(self):
+        self.assertEqual(_ids(self.store.view(2)), [15, 14])
+        self.assertEqual(_ids(self.store.view(4)), [15, 14, 13, 12])
+        self.assertEqual(len(self.store.view(100)), 6)
+
+    def test_bool(self):
+        self.assertFalse(MessageStore().view())
+        self.assertTrue(self.store.view())
+
+    def test_unaffected_by_later_messages(self):
+        view = self.store.view()
+        self.store.add_newer(_messages(16))
+        self.store.add_older(_messages(9))
+        self.assertEqual(_ids(view), [15, 14, 13, 12, 11, 10])
+        self.assertEqual(int(view[-1].id), 10)
+        self.assertEqual(len(self.store.view()), 8)
+
+
+class TestMessageStore(unittest.TestCase):
+
+    def test_newest_and_oldest(self):
+        store = MessageStore()
+        self.assertIsNone(store.newest())
+        self.assertIsNone(store.oldest())
+
+        store.add_older(_messages(5, 4))
+        self.assertEqual((store.newest().id, store.oldest().id), ('5', '4'))
+        store.add_newer(_messages(6))
+        self.assertEqual((store.newest().id, store.oldest().id), ('6', '4'))
+
+    def test_version_increases(self):
+        store = MessageStore()
+        versions = [store.version]
+        for add, ids in ((store.add_newer, (1,)), (store.add_older, (0,)),
+                         (store.add_newer, (2, 3))):
+            add(_messages(*ids))
+            versions.append(store.version)
+        self.assertEqual(versions, sorted(set(versions)))
+        self.assertEqual(store.view().version, store.version)
+
+    def test_since(self):
+        store = MessageStore()
+        store.add_newer(_messages(10, 11))
+        version = store.version
+        self.assertEqual(list(store.since(version)), [])
+
+        store.add_newer(_messages(12, 13))
+        store.add_older(_messages(9, 8))
+        delta = store.since(version)
+        # newly received first, then those added by a backfill
+        self.assertEqual(_ids(delta), [13, 12, 9, 8])
+        self.assertEqual(delta.version, store.version)
+        self.assertEqual(_ids(store.since(delta.version)), [])
+
+        store.add_newer(_messages(14))
+        self.assertEqual(_ids(store.since(delta.version)), [14])
+        self.assertEqual(_ids(store.since(0)), [14, 13, 12, 11, 10, 9, 8])
+
+
+class TestInsert(unittest.TestCase):
+
+    def setUp(self):
+        self.store = MessageStore()
+        self.store.add_newer(_messages(20, 22, 24))
+        self.store.add_older(_messages(18, 16))
+
+    def test_in_place(self):
+        for message_id in (23, 19, 17, 21, 15, 25):
+            self.assertTrue(self.store.insert(Message(str(message_id))))
+        self.assertEqual(_ids(self.store.view()), list(range(25, 14, -1)))
+        self.assertEqual((self.store.newest().id, self.store.oldest().id),
+                         ('25', '15'))
+
+    def test_duplicates(self):
+        for message_id in (24, 20, 18, 16):
+            self.assertFalse(self.store.insert(Message(str(message_id))))
+        self.assertEqual(len(self.store), 5)
+
+    def test_views_unaffected(self):
+        view = self.store.view()
+        version = self.store.version
+        self.store.insert(Message('21'))
+        self.store.insert(Message('17'))
+        self.assertEqual(_ids(view), [24, 22, 20, 18, 16])
+        self.assertGreater(self.store.version, version)
+
+    def test_since(self):
+        version = self.store.version
+        self.store.add_newer(_messages(26))
+        self.store.insert(Message('23'))
+        self.store.insert(Message('25'))
+        self.store.add_older(_messages(14))
+        self.store.insert(Message('17'))
+        self.assertEqual(_ids(self.store.since(version)),
+                         [26, 25, 23, 17, 14])
+
+        later = self.store.version
+        self.store.insert(Message('19'))
+        self.assertEqual(_ids(self.store.since(later)), [19])
+        self.assertEqual(_ids(self.store.since(0)),
+                         _ids(self.store.view()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,21 +8,311 @@ test_line
 Tests for `line` module.
 """
 
+import threading
+import time
 import unittest
 
-from line import line
+from line.futures import FutureTimeoutError
+from line.line import Line, LineClient, LineMessage
+from line.synthetic import OperationGenerator, SyntheticService
 
+from tests.helpers import FixedHistoryService
 
-class TestLine(unittest.TestCase):
 
-    def setUp(self):
-        pass
+class RecordingService(SyntheticService):
+    """SyntheticService remembering the read receipts sent to it."""
+
+    def __init__(self, *args, **kwargs):
+        SyntheticService.__init__(self, *args, **kwargs)
+        self.receipts = []
+
+    def sendChatChecked(self, seq, consumer, lastMessageId):
+        self.receipts.append((consumer, lastMessageId))
+
+
+class InjectingLock(object):
+    """Lock running action() the first time it is about to be acquired."""
+
+    def __init__(self, lock, action):
+        self._lock = lock
+        self._action = action
+
+    def __enter__(self):
+        action, self._action = self._action, None
+        if action is not None:
+            action()
+        return self._lock.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self._lock.__exit__(*exc_info)
 
-    def test_something(self):
-        pass
+
+def synthetic_client(batches=0, history=1000, service_type=SyntheticService):
+    generator = OperationGenerator(seed=1, image_ratio=0)
+    service = service_type(generator, generator.serialized_batches(batches),
+                           history)
+    client = LineClient('user', 'password',
+                        transport_factory=service.transport_factory)
+    return generator, service, client
+
+
+class TestReadReceipts(unittest.TestCase):
+
+    def setUp(self):
+        self.generator, self.service, self.client = synthetic_client(
+            service_type=RecordingService)
+        self.group = self.generator.group_mids[0]
+        self.client.update_conversation(self.group, 5)
+        self.conversation = self.client.conversation(self.group)
 
     def tearDown(self):
-        pass
+        self.client.shutdown_outbound()
+
+    def test_mark_read_coalesces(self):
+        messages = self.conversation.last_messages()
+        self.client.mark_read(self.group, messages[-1])
+        self.client.mark_read(self.group, messages[0])
+        self.client.mark_read(self.group, messages[1])
+        self.assertEqual(self.conversation.last_read, messages[0].id)
+
+        for future in self.client.flush_receipts().values():
+            future.result(5)
+        self.assertEqual(self.service.receipts,
+                         [(self.group, messages[0].id)])
+
+    def test_shutdown_sends_receipts_and_cancels_timer(self):
+        self.conversation.mark_read()
+        self.assertIsNotNone(self.client._receipt_timer)
+
+        self.client.shutdown_outbound(wait=False)
+        self.assertIsNone(self.client._receipt_timer)
+        self.assertIsNone(self.client._outbound)
+
+        deadline = time.time() + 5
+        while not self.service.receipts and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(self.service.receipts), 1)
+
+
+class TestConversationHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.generator = OperationGenerator(seed=1, image_ratio=0)
+        self.group = self.generator.group_mids[0]
+        self.history = self.messages(30)
+        self.service = FixedHistoryService(self.generator, self.history)
+        self.client = LineClient(
+            'user', 'password',
+            transport_factory=self.service.transport_factory)
+
+    def messages(self, n):
+        generator = self.generator
+        return [generator.message(generator.contact_mids[0], self.group)
+                for i in range(n)]
+
+    def stored_ids(self):
+        return [m.id for m in self.client.conversation(self.group)
+                .last_messages()]
+
+    def expected_ids(self, messages):
+        return [m.id for m in reversed(messages)]
+
+    def test_update_merges_new_messages(self):
+        self.client.update_conversation(self.group, 5)
+        self.history.extend(self.messages(3))
+        self.client.update_conversation(self.group, 5)
+        self.assertEqual(self.stored_ids(),
+                         self.expected_ids(self.history[-8:]))
+
+    def test_long_poll_insert_after_update(self):
+        # update() fetched the messages before long_poll delivered them
+        self.client.update_conversation(self.group, 5)
+        for message in self.history[-2:]:
+            self.client._add_to_conversation(self.group, message)
+        self.assertEqual(self.stored_ids(),
+                         self.expected_ids(self.history[-5:]))
+
+        newer = self.messages(1)
+        self.client._add_to_conversation(self.group, newer[0])
+        self.assertEqual(self.stored_ids(),
+                         self.expected_ids(self.history[-5:] + newer))
+
+    def test_out_of_order_arrival(self):
+        # a message sent from here is stored before one received earlier
+        self.client.update_conversation(self.group, 5)
+        conversation = self.client.conversation(self.group)
+        conversation.enable_columns()
+        seen = conversation.last_messages()
+        received, sent = self.messages(2)
+        self.client._add_to_conversation(self.group, sent)
+        self.client._add_to_conversation(self.group, received)
+
+        expected = self.expected_ids(self.history[-5:] + [received, sent])
+        self.assertEqual(self.stored_ids(), expected)
+        self.assertEqual([m.id for m in conversation.messages_since(
+            seen.version)], expected[:2])
+        self.assertEqual(len(conversation.columns()['sender']), 7)
+        self.assertEqual(len(seen), 5)
+
+        self.client._add_to_conversation(self.group, received)
+        self.assertEqual(self.stored_ids(), expected)
+
+    def test_long_poll_insert_during_merge(self):
+        self.client.update_conversation(self.group, 0)
+        conversation = self.client.conversation(self.group)
+        received = self.messages(1)
+        # delivered after the merge found the conversation empty
+        conversation._lock = InjectingLock(
+            conversation._lock, lambda: conversation._insert_message(
+                LineMessage(self.client, received[0])))
+        added = conversation._merge(self.history[:-11:-1])
+        self.assertEqual(len(added), 10)
+        self.assertEqual(self.stored_ids(),
+                         self.expected_ids(self.history[-10:] + received))
+
+    def test_update_after_long_poll_insert(self):
+        self.client.update_conversation(self.group, 5)
+        self.history.extend(self.messages(2))
+        for message in self.history[-2:]:
+            self.client._add_to_conversation(self.group, message)
+        self.client.update_conversation(self.group, 5)
+        self.assertEqual(self.stored_ids(),
+                         self.expected_ids(self.history[-7:]))
+
+    def test_backfill(self):
+        self.client.update_conversation(self.group, 5)
+        conversation = self.client.conversation(self.group)
+        pages = list(conversation.backfill(page_size=10))
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(self.stored_ids(), self.expected_ids(self.history))
+
+    def test_backfill_limit_and_newer_messages(self):
+        self.client.update_conversation(self.group, 5)
+        conversation = self.client.conversation(self.group)
+        pages = list(conversation.backfill(page_size=10, limit=12))
+        self.assertEqual([len(page) for page in pages], [10, 2])
+
+        newer = self.messages(1)
+        self.client._add_to_conversation(self.group, newer[0])
+        self.assertEqual(self.stored_ids(),
+                         self.expected_ids(self.history[-17:] + newer))
+
+    def test_messages_since(self):
+        self.client.update_conversation(self.group, 5)
+        conversation = self.client.conversation(self.group)
+        seen = conversation.last_messages()
+        self.assertEqual(list(conversation.messages_since(seen.version)), [])
+
+        newer = self.messages(2)
+        for message in newer:
+            self.client._add_to_conversation(self.group, message)
+        list(conversation.backfill(page_size=3, limit=3))
+        self.assertEqual(
+            [m.id for m in conversation.messages_since(seen.version)],
+            self.expected_ids(self.history[-8:-5] + newer))
+        self.assertEqual(len(seen), 5)
+
+
+class TestEvents(unittest.TestCase):
+
+    def setUp(self):
+        self.generator = OperationGenerator(
+            seed=1, image_ratio=0, burst_probability=0,
+            mix={Line.OperationType.RECEIVE_MESSAGE: 1})
+        self.service = SyntheticService(
+            self.generator, self.generator.serialized_batches(10))
+        self.client = LineClient(
+            'user', 'password',
+            transport_factory=self.service.transport_factory)
+        self.group = self.generator.group_mids[0]
+        self.client.update_conversation(self.group, 0)
+        self.conversation = self.client.conversation(self.group)
+
+    def poll_all(self):
+        events = []
+        while self.service._next < len(self.service.batches):
+            events.extend(self.client.long_poll())
+        return events
+
+    def poll_in_background(self, delay=0.05):
+        def poll():
+            time.sleep(delay)
+            self.poll_all()
+
+        thread = threading.Thread(target=poll)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def test_messages_are_stored_in_their_chat(self):
+        events = self.poll_all()
+        in_group = 0
+        for event_type, conversation, message in events:
+            self.assertEqual(event_type, LineClient.EVENT_NEW_MESSAGE)
+            if message.recipient_mid in self.generator.group_mids:
+                self.assertEqual(conversation.group, message.recipient_mid)
+            else:
+                self.assertEqual(conversation.group, message.sender_mid)
+            if conversation is self.conversation:
+                in_group += 1
+        self.assertGreater(in_group, 0)
+        self.assertEqual(len(self.conversation.last_messages()), in_group)
+
+    def test_subscribe(self):
+        received = []
+        self.conversation.subscribe(lambda *event: received.append(event))
+        events = self.poll_all()
+        self.assertEqual(received, [event for event in events
+                                    if event[1] is self.conversation])
+        self.assertGreater(len(received), 0)
+
+    def test_unsubscribe(self):
+        received = []
+
+        def callback(*event):
+            received.append(event)
+
+        self.conversation.subscribe(callback)
+        self.conversation.unsubscribe(callback)
+        self.poll_all()
+        self.assertEqual(received, [])
+        self.assertEqual(self.conversation._subscribers, ())
+
+    def test_subscriber_errors_are_ignored(self):
+        def callback(*event):
+            raise ValueError()
+
+        self.conversation.subscribe(callback)
+        self.assertGreater(len(self.poll_all()), 0)
+
+    def test_wait_for(self):
+        thread = self.poll_in_background()
+        event = self.client.wait_for(LineClient.EVENT_NEW_MESSAGE, timeout=5)
+        self.assertEqual(event[0], LineClient.EVENT_NEW_MESSAGE)
+        thread.join(5)
+        self.assertEqual(self.client._waiters, {})
+
+    def test_wait_for_timeout(self):
+        self.assertRaises(FutureTimeoutError, self.client.wait_for,
+                          LineClient.EVENT_READ, timeout=0.05)
+        self.assertEqual(self.client._waiters, {})
+
+    def test_wait_for_message(self):
+        thread = self.poll_in_background()
+        message = self.conversation.wait_for_message(
+            lambda message: message.sender_mid is not None, timeout=5)
+        self.assertEqual(message.recipient_mid, self.group)
+        thread.join(5)
+        self.assertEqual(self.conversation._subscribers, ())
+
+    def test_wait_for_message_timeout(self):
+        thread = self.poll_in_background()
+        self.assertRaises(FutureTimeoutError,
+                          self.conversation.wait_for_message,
+                          lambda message: False, timeout=0.2)
+        thread.join(5)
+        self.assertEqual(self.conversation._subscribers, ())
+
 
 if __name__ == '__main__':
     unittest.main()
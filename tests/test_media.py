@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_media
+----------------------------------
+
+Tests for `media` module, and the HttpPool it downloads with.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+
+from line.downloads import HttpPool, DownloadError, httplib
+from line import media
+
+
+BODY = bytes(bytearray(i % 251 for i in range(50000)))
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Serves BODY over keep-alive connections, honouring Range requests
+    unless the server ignores them. The first server.cut responses stop
+    after server.cut_at bytes of their body and close the connection.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.ranges.append(self.headers.get('Range'))
+            cut = server.cut > 0
+            if cut:
+                server.cut -= 1
+
+        if self.path != '/file':
+            self.send_response(404)
+            self.send_header('Content-Length', '9')
+            self.end_headers()
+            self.wfile.write(b'not found')
+            return
+
+        start = 0
+        requested = self.headers.get('Range')
+        if requested and not server.ignore_range:
+            start = int(requested.split('=')[1].rstrip('-'))
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+                start, len(BODY) - 1, len(BODY)))
+        else:
+            self.send_response(200)
+        body = BODY[start:]
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if cut:
+            self.wfile.write(body[:server.cut_at])
+            self.close_connection = True
+        else:
+            self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length'))
+        body = self.rfile.read(length)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.lock:
+            if self.server.drop_after_post:
+                # closed without telling the client, like an idle timeout
+                self.close_connection = True
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), Handler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.ranges = []
+        self.cut = 0
+        self.cut_at = 0
+        self.ignore_range = False
+        self.drop_after_post = False
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connections += 1
+        ThreadingMixIn.process_request(self, request, client_address)
+
+
+class ServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = Server()
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       args=(0.05,))
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{}/'.format(self.server.server_port)
+        self.pool = HttpPool(timeout=5)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestHttpPool(ServerTestCase):
+
+    def test_reuses_connection_after_full_read(self):
+        for i in range(3):
+            self.assertEqual(self.pool.fetch(self.url + 'file'), BODY)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_closes_connection_after_partial_read(self):
+        with self.pool.request(self.url + 'file') as response:
+            response.read(10)
+        self.assertEqual(self.pool.fetch(self.url + 'file'), BODY)
+        self.assertEqual(self.server.connections, 2)
+
+    def test_error_status(self):
+        with self.assertRaises(DownloadError) as raised:
+            self.pool.fetch(self.url + 'missing')
+        self.assertEqual(raised.exception.status, 404)
+        # the error body was read, so the connection is kept
+        self.assertEqual(self.pool.fetch(self.url + 'file'), BODY)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_retries_on_connection_closed_by_server(self):
+        self.server.drop_after_post = True
+        for body in (b'first', b'second'):
+            with self.pool.request(self.url + 'echo', method='POST',
+                                   body=body) as response:
+                self.assertEqual(response.read(), body)
+        self.assertEqual(self.server.connections, 2)
+
+
+class TestDownload(ServerTestCase):
+
+    def setUp(self):
+        ServerTestCase.setUp(self)
+        self.directory = tempfile.mkdtemp()
+        self.dest = os.path.join(self.directory, 'file')
+
+    def tearDown(self):
+        ServerTestCase.tearDown(self)
+        shutil.rmtree(self.directory)
+
+    def read_dest(self):
+        with open(self.dest, 'rb') as f:
+            return f.read()
+
+    def test_resumes_body_cut_short(self):
+        self.server.cut, self.server.cut_at = 2, 10000
+        media.download(self.pool, self.url + 'file', self.dest,
+                       chunk_size=4096)
+        self.assertEqual(self.read_dest(), BODY)
+        self.assertEqual(self.server.ranges,
+                         [None, 'bytes=10000-', 'bytes=20000-'])
+        self.assertFalse(os.path.exists(self.dest + '.part'))
+
+    def test_skips_when_range_is_ignored(self):
+        self.server.cut, self.server.cut_at = 1, 12345
+        self.server.ignore_range = True
+        chunks = list(media.iter_content(self.pool, self.url + 'file',
+                                         chunk_size=1000))
+        self.assertEqual(b''.join(chunks), BODY)
+        self.assertEqual(self.server.ranges, [None, 'bytes=12345-'])
+
+    def test_resumes_part_file(self):
+        with open(self.dest + '.part', 'wb') as f:
+            f.write(BODY[:30000])
+        media.download(self.pool, self.url + 'file', self.dest)
+        self.assertEqual(self.read_dest(), BODY)
+        self.assertEqual(self.server.ranges, ['bytes=30000-'])
+
+    def test_gives_up_after_retries(self):
+        self.server.cut, self.server.cut_at = 10, 100
+        # how a short body shows depends on the Python version
+        with self.assertRaises((DownloadError, httplib.IncompleteRead)):
+            media.download(self.pool, self.url + 'file', self.dest)
+        self.assertEqual(len(self.server.ranges), 4)
+        # what was received is kept for the next attempt
+        with open(self.dest + '.part', 'rb') as f:
+            self.assertEqual(f.read(), BODY[:400])
+
+        self.server.cut = 0
+        media.download(self.pool, self.url + 'file', self.dest)
+        self.assertEqual(self.read_dest(), BODY)
+        self.assertEqual(self.server.ranges[-1], 'bytes=400-')
+
+    def test_error_status(self):
+        with self.assertRaises(DownloadError) as raised:
+            list(media.iter_content(self.pool, self.url + 'missing'))
+        self.assertEqual(raised.exception.status, 404)
+
+    def test_file_object(self):
+        with open(self.dest, 'wb') as f:
+            self.assertIs(media.download(self.pool, self.url + 'file', f), f)
+        self.assertEqual(self.read_dest(), BODY)
+
+
+if __name__ == '__main__':
+    unittest.main()
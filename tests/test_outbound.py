@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_outbound
+----------------------------------
+
+Tests for `outbound` module.
+"""
+
+from contextlib import contextmanager
+import threading
+import unittest
+
+from line.outbound import (TokenBucket, OutboundScheduler, TalkException,
+                           TalkExceptionCode)
+
+
+class FakeExecutor(object):
+    """Hands out the same dummy client to every request."""
+
+    def __init__(self):
+        self.client = object()
+
+    @contextmanager
+    def connection(self):
+        yield self.client
+
+
+class Flaky(object):
+    """Callable raising the given exceptions in turn, then returning 'ok'."""
+
+    def __init__(self, *errors):
+        self._errors = list(errors)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, client):
+        with self._lock:
+            self.calls += 1
+            if self._errors:
+                raise self._errors.pop(0)
+        return 'ok'
+
+
+def _talk_exception(code):
+    return TalkException(code=code, reason='test')
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=2.0, burst=3)
+        now = bucket._last
+        for i in range(3):
+            self.assertEqual(bucket.delay(now), 0)
+            bucket.take()
+        self.assertAlmostEqual(bucket.delay(now), 0.5)
+        self.assertEqual(bucket.delay(now + 0.5), 0)
+
+    def test_refill_is_capped_at_burst(self):
+        bucket = TokenBucket(rate=10.0, burst=2)
+        now = bucket._last
+        bucket.take()
+        bucket.take()
+        self.assertFalse(bucket.full(now))
+        self.assertTrue(bucket.full(now + 100))
+        for i in range(2):
+            self.assertEqual(bucket.delay(now + 100), 0)
+            bucket.take()
+        self.assertGreater(bucket.delay(now + 100), 0)
+
+
+class TestOutboundScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = OutboundScheduler(
+            FakeExecutor(), workers=2, rate=(1000.0, 1000),
+            dest_rate=(1000.0, 1000), max_retries=3, backoff=0.001)
+
+    def tearDown(self):
+        self.scheduler.shutdown()
+
+    def test_retries_transient_codes(self):
+        fn = Flaky(_talk_exception(TalkExceptionCode.SYSTEM_ERROR),
+                   _talk_exception(TalkExceptionCode.EXCESSIVE_ACCESS))
+        future = self.scheduler.submit('u1', fn)
+        self.assertEqual(future.result(5), 'ok')
+        self.assertEqual(fn.calls, 3)
+
+    def test_fails_on_other_codes(self):
+        fn = Flaky(_talk_exception(TalkExceptionCode.NOT_FOUND))
+        future = self.scheduler.submit('u1', fn)
+        self.assertIsInstance(future.exception(5), TalkException)
+        self.assertEqual(fn.calls, 1)
+
+    def test_gives_up_after_max_retries(self):
+        fn = Flaky(*[_talk_exception(TalkExceptionCode.DB_FAILED)] * 10)
+        future = self.scheduler.submit('u1', fn)
+        self.assertIsInstance(future.exception(5), TalkException)
+        self.assertEqual(fn.calls, 4)
+
+    def test_transport_errors_only_retried_if_idempotent(self):
+        fn = Flaky(EOFError())
+        future = self.scheduler.submit('u1', fn)
+        self.assertIsInstance(future.exception(5), EOFError)
+        self.assertEqual(fn.calls, 1)
+
+        fn = Flaky(EOFError(), IOError())
+        future = self.scheduler.submit('u1', fn, idempotent=True)
+        self.assertEqual(future.result(5), 'ok')
+        self.assertEqual(fn.calls, 3)
+
+    def test_on_sent_failure_does_not_resend(self):
+        fn = Flaky()
+        sent = []
+
+        def on_sent(result):
+            sent.append(result)
+            raise IOError('storing the result failed')
+
+        future = self.scheduler.submit('u1', fn, on_sent=on_sent)
+        self.assertEqual(future.result(5), 'ok')
+        self.assertEqual(sent, ['ok'])
+        self.assertEqual(fn.calls, 1)
+
+    def test_pending_drains(self):
+        futures = [self.scheduler.submit('u{}'.format(i % 3), Flaky())
+                   for i in range(20)]
+        for future in futures:
+            self.assertEqual(future.result(5), 'ok')
+        self.assertEqual(self.scheduler.pending, 0)
+
+
+class TestBucketPruning(unittest.TestCase):
+
+    def setUp(self):
+        self._prune_size = OutboundScheduler.BUCKET_PRUNE_SIZE
+        OutboundScheduler.BUCKET_PRUNE_SIZE = 4
+
+    def tearDown(self):
+        OutboundScheduler.BUCKET_PRUNE_SIZE = self._prune_size
+
+    def test_full_buckets_are_pruned(self):
+        scheduler = OutboundScheduler(FakeExecutor(), workers=1,
+                                      rate=(1000.0, 1000),
+                                      dest_rate=(1e6, 1))
+        try:
+            for i in range(50):
+                scheduler.submit('u{}'.format(i), Flaky()).result(5)
+            self.assertLessEqual(len(scheduler._dest_buckets), 8)
+        finally:
+            scheduler.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
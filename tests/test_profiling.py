@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_profiling
+----------------------------------
+
+Tests for `profiling` module.
+"""
+
+import logging
+import unittest
+
+from line.line import LineClient
+from line.profiling import StageProfiler, NULL_PROFILER
+from line.synthetic import OperationGenerator, SyntheticService
+
+
+class ToggleService(SyntheticService):
+    """SyntheticService running on_call() while answering getProfile."""
+
+    on_call = None
+
+    def getProfile(self):
+        if self.on_call is not None:
+            self.on_call()
+        return SyntheticService.getProfile(self)
+
+
+class Records(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestStageProfiler(unittest.TestCase):
+
+    def test_nested_stages(self):
+        profiler = StageProfiler()
+        self.assertFalse(profiler.in_stage())
+        with profiler.stage('a'):
+            with profiler.stage('b'):
+                self.assertTrue(profiler.in_stage())
+            profiler.record('c', 0.5)
+        stats = profiler.stats()
+        self.assertEqual(sorted(stats),
+                         [('a',), ('a', 'b'), ('a', 'c')])
+        self.assertEqual(stats[('a', 'c')][:2], (1, 0.5))
+
+    def test_null_profiler(self):
+        self.assertFalse(NULL_PROFILER.enabled)
+        self.assertFalse(NULL_PROFILER.in_stage())
+        with NULL_PROFILER.stage('a'):
+            NULL_PROFILER.record('b', 1.0)
+
+
+class TestRuntimeSwitching(unittest.TestCase):
+
+    def setUp(self):
+        generator = OperationGenerator(seed=1, image_ratio=0)
+        self.service = ToggleService(generator)
+        self.client = LineClient(
+            'user', 'password',
+            transport_factory=self.service.transport_factory)
+        self.records = Records()
+        logging.getLogger('LineClient').addHandler(self.records)
+
+    def tearDown(self):
+        logging.getLogger('LineClient').removeHandler(self.records)
+
+    def call(self):
+        return self.client._executor.call('getProfile')
+
+    def test_disable_during_call(self):
+        profiler = self.client.enable_profiling()
+        self.service.on_call = self.client.disable_profiling
+        self.call()
+
+        self.assertEqual(self.records.records, [])
+        self.assertIn(('rpc:getProfile', 'network'), profiler.stats())
+        self.assertIsNone(self.client.profiler)
+
+    def test_enable_during_call(self):
+        profilers = []
+        self.service.on_call = \
+            lambda: profilers.append(self.client.enable_profiling())
+        self.call()
+        self.assertEqual(self.records.records, [])
+        self.assertEqual(profilers[0].stats(), {})
+
+        self.service.on_call = None
+        self.call()
+        self.assertIn(('rpc:getProfile', 'network'), profilers[0].stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_sharding
+----------------------------------
+
+Tests for `sharding` module.
+"""
+
+import unittest
+
+from line.line import LineClient
+from line.sharding import encode_event, decode_event, Line
+
+
+class Conversation(object):
+    def __init__(self, group):
+        self.group = group
+
+
+class Message(object):
+    def __init__(self, message):
+        self._message = message
+
+    def _to_thrift(self):
+        return self._message
+
+
+class TestEventRecords(unittest.TestCase):
+
+    def test_message_event(self):
+        message = Line.Message(frm='u1', to='c1', id='100', text=u'hello')
+        record = encode_event('a@example.com', (
+            LineClient.EVENT_NEW_MESSAGE, Conversation('c1'),
+            Message(message)))
+
+        email, type, group, decoded = decode_event(record)
+        self.assertEqual((email, type, group),
+                         ('a@example.com', LineClient.EVENT_NEW_MESSAGE,
+                          'c1'))
+        self.assertEqual(decoded, message)
+
+        raw = decode_event(record, decode_message=False)[3]
+        self.assertEqual(record[-len(raw):], raw)
+
+    def test_read_event(self):
+        record = encode_event('a@example.com', (
+            LineClient.EVENT_READ, Conversation('c1'), 'u2'))
+        self.assertEqual(decode_event(record),
+                         ('a@example.com', LineClient.EVENT_READ, 'c1',
+                          'u2'))
+
+
+if __name__ == '__main__':
+    unittest.main()
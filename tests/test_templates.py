@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_templates
+----------------------------------
+
+Tests for `templates` module.
+"""
+
+import unittest
+
+from thrift.transport import TTransport
+from thrift.protocol import TCompactProtocol
+
+from line.templates import MessageTemplate, Line
+from line.tracing import TracedClient, Interceptor
+from line.synthetic import OperationGenerator, SyntheticService
+
+
+def _client(transport, owner=None):
+    protocol = TCompactProtocol.TCompactProtocol(transport)
+    if owner is None:
+        return Line.Client(protocol)
+    return TracedClient(protocol, owner=owner)
+
+
+def _generated_bytes(message, seq, seqid):
+    buf = TTransport.TMemoryBuffer()
+    client = _client(buf)
+    client._seqid = seqid
+    client.send_sendMessage(seq, message)
+    return buf.getvalue()
+
+
+class Owner(object):
+    def __init__(self, *interceptors):
+        self._interceptors = interceptors
+
+
+class Recorder(Interceptor):
+    def __init__(self):
+        self.calls = []
+
+    def after(self, call):
+        self.calls.append(call)
+
+
+class TestMessageTemplate(unittest.TestCase):
+
+    def assertEncodesLikeGenerated(self, template, to, seq=0, seqid=0):
+        self.assertEqual(template.encode(to, seq, seqid),
+                         _generated_bytes(template.message(to), seq, seqid))
+
+    def test_text(self):
+        self.assertEncodesLikeGenerated(MessageTemplate(u'hello'), 'u1234')
+
+    def test_unicode_text(self):
+        self.assertEncodesLikeGenerated(
+            MessageTemplate(u'こんにちは'), 'c' * 33)
+
+    def test_seq_and_seqid(self):
+        template = MessageTemplate(u'hi')
+        for seq, seqid in ((1, 1), (-1, 300), (2 ** 31 - 1, 2 ** 20)):
+            self.assertEncodesLikeGenerated(template, 'u1', seq, seqid)
+
+    def test_other_fields(self):
+        template = MessageTemplate(
+            contentType=Line.ContentType.STICKER, toType=Line.ToType.USER,
+            contentMetadata={'STKID': '100', 'STKPKGID': '1',
+                             'STKVER': '100'})
+        self.assertEncodesLikeGenerated(template, 'u' * 33)
+
+    def test_rejects_recipient(self):
+        self.assertRaises(ValueError, MessageTemplate, u'x', to='u1')
+        self.assertRaises(ValueError, MessageTemplate, u'x', frm='u1')
+
+
+class TestTemplateSend(unittest.TestCase):
+
+    def setUp(self):
+        self.generator = OperationGenerator(seed=1, image_ratio=0)
+        self.service = SyntheticService(self.generator)
+
+    def _send(self, owner):
+        client = _client(self.service.transport_factory('/S4'), owner)
+        recipient = self.generator.contact_mids[0]
+        return recipient, MessageTemplate(u'hello').send(client, recipient)
+
+    def test_send(self):
+        recipient, sent = self._send(None)
+        self.assertEqual(sent.to, recipient)
+        self.assertEqual(sent.text, u'hello')
+
+    def test_interceptors_see_template_sends(self):
+        recorder = Recorder()
+        recipient, sent = self._send(Owner(recorder))
+        self.assertEqual(len(recorder.calls), 1)
+        call = recorder.calls[0]
+        self.assertEqual(call.method, 'sendMessage')
+        self.assertEqual(call.args[1].to, recipient)
+        self.assertIs(call.result, sent)
+
+
+if __name__ == '__main__':
+    unittest.main()